@@ -0,0 +1,191 @@
+"""
+Client-side Load Balancing
+
+Spreads an upstream's calls across its replicas with power-of-two-
+choices (two random replicas, the one with fewer outstanding requests
+wins) or plain least-outstanding-requests.
+
+Replicas are health-checked actively (periodic GET /health) and
+passively (outcomes of real calls). A replica with too many
+consecutive failures, a high error rate or latency well above its
+peers is ejected for a while; ejections grow with repeat offences and
+never take out more than a share of the replicas. If no replica is
+available the balancer falls back to all of them.
+"""
+
+import asyncio
+import logging
+import random
+import statistics
+import time
+from typing import Collection, Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Upstream statuses that count as replica failures
+FAILURE_STATUSES = frozenset({502, 503, 504})
+
+
+class Replica:
+    """One service endpoint and its health bookkeeping"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        parsed = httpx.URL(self.url)
+        self.scheme = parsed.scheme
+        self.host = parsed.host
+        self.port = parsed.port
+        self.outstanding = 0
+        self.latency = 0.0  # EWMA of response time, seconds
+        self.consecutive_failures = 0
+        self.window_requests = 0
+        self.window_failures = 0
+        self.healthy = True
+        self.ejected_until = 0.0
+        self.ejections = 0
+        self.last_ejection = 0.0
+
+    def available(self, now: float) -> bool:
+        return self.healthy and now >= self.ejected_until
+
+    def record(self, rtt: Optional[float], failed: bool):
+        if rtt is not None:
+            self.latency = rtt if self.latency == 0.0 else self.latency * 0.8 + rtt * 0.2
+        self.window_requests += 1
+        if failed:
+            self.window_failures += 1
+            self.consecutive_failures += 1
+        else:
+            self.consecutive_failures = 0
+
+    def get_stats(self, now: float) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "ejected": now < self.ejected_until,
+            "ejections": self.ejections,
+            "outstanding": self.outstanding,
+            "latency_ms": round(self.latency * 1000, 2),
+        }
+
+
+class ReplicaSet:
+    """
+    Replicas of one upstream with balancing and outlier ejection.
+
+    Args:
+        name: Upstream name, for logs
+        urls: Replica base URLs
+        policy: 'p2c' (power of two choices) or 'least_outstanding'
+        consecutive_failures: Failures in a row that eject a replica
+        error_rate: Failure ratio since the last sweep that ejects a replica
+        latency_factor: Eject a replica slower than this multiple of the median
+        min_requests: Requests since the last sweep before rate/latency checks apply
+        base_ejection: Seconds of the first ejection, multiplied on repeats
+        max_ejection: Longest ejection in seconds
+        max_ejected_share: Largest share of replicas ejected at once
+    """
+
+    def __init__(self, name: str, urls: List[str], policy: str = "p2c", consecutive_failures: int = 5,
+                 error_rate: float = 0.5, latency_factor: float = 3.0, min_requests: int = 10,
+                 base_ejection: float = 30.0, max_ejection: float = 300.0,
+                 max_ejected_share: float = 0.5):
+        if not urls:
+            raise ValueError(f"Upstream {name} needs at least one URL")
+        self.name = name
+        self.replicas = [Replica(url) for url in urls]
+        self.policy = policy
+        self.consecutive_failures = consecutive_failures
+        self.error_rate = error_rate
+        self.latency_factor = latency_factor
+        self.min_requests = min_requests
+        self.base_ejection = base_ejection
+        self.max_ejection = max_ejection
+        self.max_ejected_share = max_ejected_share
+
+    # ---------- selection ----------
+
+    def pick(self, exclude: Collection[Replica] = ()) -> Replica:
+        """Choose the replica for the next call, avoiding `exclude` while others are available"""
+        if len(self.replicas) == 1:
+            return self.replicas[0]
+        now = time.monotonic()
+        available = [r for r in self.replicas if r.available(now)]
+        candidates = [r for r in available if r not in exclude] or available or self.replicas
+        if len(candidates) == 1:
+            return candidates[0]
+        if self.policy == "least_outstanding":
+            fewest = min(r.outstanding for r in candidates)
+            return random.choice([r for r in candidates if r.outstanding == fewest])
+        first, second = random.sample(candidates, 2)
+        return first if first.outstanding <= second.outstanding else second
+
+    def has_untried(self, exclude: Collection[Replica]) -> bool:
+        """True if pick(exclude) would return a replica outside `exclude`"""
+        now = time.monotonic()
+        available = [r for r in self.replicas if r.available(now)] or self.replicas
+        return any(r not in exclude for r in available)
+
+    # ---------- passive checks ----------
+
+    def _ejected_count(self, now: float) -> int:
+        return sum(1 for r in self.replicas if now < r.ejected_until)
+
+    def _eject(self, replica: Replica, now: float, reason: str) -> bool:
+        if len(self.replicas) == 1 or now < replica.ejected_until:
+            return False
+        if (self._ejected_count(now) + 1) > len(self.replicas) * self.max_ejected_share:
+            return False
+        # Repeat offenders stay out longer; a clean stretch resets the count
+        if now - replica.last_ejection > self.max_ejection * 2:
+            replica.ejections = 0
+        replica.ejections += 1
+        duration = min(self.max_ejection, self.base_ejection * replica.ejections)
+        replica.ejected_until = now + duration
+        replica.last_ejection = now
+        replica.consecutive_failures = 0
+        logger.warning(f"Ejected {self.name} replica {replica.url} for {duration:.0f}s: {reason}")
+        return True
+
+    def record(self, replica: Replica, rtt: Optional[float], failed: bool):
+        """Feed the outcome of a call into the replica's health"""
+        replica.record(rtt, failed)
+        if failed and replica.consecutive_failures >= self.consecutive_failures:
+            self._eject(replica, time.monotonic(), f"{replica.consecutive_failures} consecutive failures")
+
+    def sweep(self):
+        """Eject replicas whose error rate or latency stood out since the last sweep"""
+        now = time.monotonic()
+        active = [r for r in self.replicas if r.window_requests >= self.min_requests]
+        latencies = [r.latency for r in active if r.latency > 0]
+        median = statistics.median(latencies) if len(latencies) >= 2 else None
+        for replica in active:
+            ratio = replica.window_failures / replica.window_requests
+            if ratio >= self.error_rate:
+                self._eject(replica, now, f"error rate {ratio:.0%}")
+            elif median and replica.latency > median * self.latency_factor:
+                self._eject(replica, now, f"latency {replica.latency * 1000:.0f}ms vs median {median * 1000:.0f}ms")
+        for replica in self.replicas:
+            replica.window_requests = replica.window_failures = 0
+
+    # ---------- active checks ----------
+
+    async def check_health(self, client: httpx.AsyncClient, timeout: float):
+        """Probe every replica's /health endpoint"""
+        async def probe(replica: Replica):
+            try:
+                response = await client.get(f"{replica.url}/health", timeout=timeout)
+                healthy = response.status_code < 500
+            except httpx.HTTPError:
+                healthy = False
+            if healthy != replica.healthy:
+                logger.warning(f"{self.name} replica {replica.url} is now {'healthy' if healthy else 'unhealthy'}")
+            replica.healthy = healthy
+
+        await asyncio.gather(*(probe(r) for r in self.replicas))
+
+    def get_stats(self) -> List[Dict]:
+        now = time.monotonic()
+        return [r.get_stats(now) for r in self.replicas]
@@ -0,0 +1,181 @@
+"""
+Batch Requests
+
+Runs a list of sub-requests concurrently by dispatching each one through
+the gateway's own ASGI app, so they take the normal proxy path (cache,
+coalescing, pools). The batch is authenticated once; sub-requests carry
+the verified user in their ASGI state instead of re-validating the token.
+
+Sub-request bodies from upstream JSON replies are embedded verbatim in
+the batch response rather than parsed and re-serialized.
+"""
+
+import asyncio
+import json
+from typing import Dict, List, Optional
+from urllib.parse import urlencode
+
+# Upstream response headers worth returning per item
+_ITEM_HEADERS = ("content-type", "etag", "x-cache", "retry-after")
+
+# Routes whose responses never end on their own (a sub-request to one would never finish)
+STREAMING_PATHS = frozenset({"/api/stream"})
+
+
+class BatchError(ValueError):
+    """Raised when the batch payload is malformed"""
+    pass
+
+
+def parse_batch(payload, max_requests: int) -> List[Dict]:
+    """
+    Validate a batch payload of the form {"requests": [{...}, ...]}.
+
+    Each item has 'path' (must start with /api/, not a streaming route),
+    optional 'method' (default GET), 'id', 'query' (dict) and 'body' (any JSON value).
+    """
+    if not isinstance(payload, dict) or not isinstance(payload.get("requests"), list):
+        raise BatchError("Body must be an object with a 'requests' list")
+    items = payload["requests"]
+    if not items:
+        raise BatchError("'requests' must not be empty")
+    if len(items) > max_requests:
+        raise BatchError(f"At most {max_requests} requests per batch")
+
+    parsed = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not isinstance(item.get("path"), str):
+            raise BatchError(f"Request {index} must be an object with a 'path'")
+        path = item["path"].split("?", 1)[0]
+        if not path.startswith("/api/") or path.rstrip("/") == "/api/batch":
+            raise BatchError(f"Request {index} has an invalid path: {path}")
+        if path.rstrip("/") in STREAMING_PATHS:
+            raise BatchError(f"Request {index}: streaming route {path} cannot be batched")
+        query = item.get("query") or {}
+        if not isinstance(query, dict):
+            raise BatchError(f"Request {index} 'query' must be an object")
+        parsed.append({
+            "id": item.get("id", index),
+            "method": str(item.get("method", "GET")).upper(),
+            "path": item["path"],
+            "query": query,
+            "body": item.get("body"),
+        })
+    return parsed
+
+
+def _build_scope(item: Dict, parent_scope: Dict, headers: List, user: Optional[Dict]) -> Dict:
+    path, _, raw_query = item["path"].partition("?")
+    query = "&".join(q for q in (raw_query, urlencode(item["query"], doseq=True)) if q)
+    return {
+        "type": "http",
+        "asgi": parent_scope.get("asgi", {"version": "3.0"}),
+        "http_version": parent_scope.get("http_version", "1.1"),
+        "method": item["method"],
+        "scheme": parent_scope.get("scheme", "http"),
+        "path": path,
+        "raw_path": path.encode("latin-1"),
+        "root_path": parent_scope.get("root_path", ""),
+        "query_string": query.encode("latin-1"),
+        "headers": headers,
+        "client": parent_scope.get("client"),
+        "server": parent_scope.get("server"),
+        "state": {"user": user, "batch_authenticated": True},
+    }
+
+
+async def dispatch(app, item: Dict, parent_scope: Dict, parent_headers: List,
+                   user: Optional[Dict]) -> Dict:
+    """Run one sub-request through the ASGI app and collect its response"""
+    body = b"" if item["body"] is None else json.dumps(item["body"]).encode("utf-8")
+    headers = list(parent_headers)
+    if body:
+        headers += [(b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1"))]
+
+    request_sent = False
+    response = {"status": 500, "headers": [], "body": []}
+    done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message.get("headers", [])
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+            if not message.get("more_body", False):
+                done.set()
+
+    try:
+        await app(_build_scope(item, parent_scope, headers, user), receive, send)
+    finally:
+        done.set()
+    return response
+
+
+def encode_item(item_id, response: Dict) -> bytes:
+    """Serialize one sub-response, embedding JSON bodies without re-parsing them"""
+    headers = {}
+    for k, v in response["headers"]:
+        name = k.decode("latin-1").lower()
+        if name in _ITEM_HEADERS:
+            headers[name] = v.decode("latin-1")
+    body = b"".join(response["body"])
+
+    if headers.get("content-type", "").startswith("application/json") and body:
+        encoded_body = body
+    elif body:
+        encoded_body = json.dumps(body.decode("utf-8", "replace")).encode("utf-8")
+    else:
+        encoded_body = b"null"
+
+    prefix = json.dumps({"id": item_id, "status": response["status"], "headers": headers})
+    return prefix[:-1].encode("utf-8") + b',"body":' + encoded_body + b"}"
+
+
+def _error_response(status: int, detail: str) -> Dict:
+    return {
+        "status": status,
+        "headers": [(b"content-type", b"application/json")],
+        "body": [json.dumps({"detail": detail}).encode("utf-8")]
+    }
+
+
+async def run_batch(app, items: List[Dict], parent_scope: Dict, user: Optional[Dict],
+                    max_concurrency: int, item_timeout: float) -> bytes:
+    """
+    Execute sub-requests concurrently and build the combined JSON body.
+    A sub-request still running after item_timeout seconds is answered with 504.
+
+    Returns:
+        Encoded {"responses": [...]} document, in request order
+    """
+    # Sub-requests inherit the caller's headers, minus the body-specific ones
+    parent_headers = [
+        (k, v) for k, v in parent_scope["headers"]
+        if k.lower() not in (b"content-type", b"content-length", b"transfer-encoding",
+                             b"accept-encoding", b"if-none-match")
+    ]
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_one(item):
+        async with semaphore:
+            try:
+                response = await asyncio.wait_for(
+                    dispatch(app, item, parent_scope, parent_headers, user), item_timeout)
+            except asyncio.TimeoutError:
+                response = _error_response(504, f"Sub-request timed out after {item_timeout}s")
+            except Exception as e:
+                response = _error_response(500, f"Sub-request failed: {e}")
+            return encode_item(item["id"], response)
+
+    encoded = await asyncio.gather(*(run_one(item) for item in items))
+    return b'{"responses":[' + b",".join(encoded) + b"]}"
@@ -0,0 +1,91 @@
+"""
+Gateway Load Benchmark
+
+Closed-loop load generator: `concurrency` clients each send GETs back to
+back for `duration` seconds, cycling through the given paths. Reports
+throughput, latency percentiles and status codes.
+
+    python benchmark.py --url http://localhost:8000 --token "$TOKEN" \\
+        --concurrency 64 --duration 30 /api/products /api/products/1 /health
+
+Run it from a separate machine (or at least separate cores) so the load
+generator does not compete with the gateway for CPU.
+"""
+
+import argparse
+import asyncio
+import time
+from collections import Counter
+from typing import Dict, List
+
+import httpx
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def client_loop(client: httpx.AsyncClient, paths: List[str], offset: int, stop_at: float,
+                      latencies: List[float], statuses: Counter):
+    i = offset
+    while time.perf_counter() < stop_at:
+        path = paths[i % len(paths)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            response = await client.get(path)
+            statuses[response.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[type(e).__name__] += 1
+            continue
+        latencies.append(time.perf_counter() - started)
+
+
+async def run(url: str, paths: List[str], concurrency: int, duration: float, warmup: float,
+              token: str = None) -> Dict:
+    headers = {"Authorization": f"Bearer {token}"} if token else {}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, headers=headers, limits=limits, timeout=30.0) as client:
+        if warmup > 0:
+            stop_at = time.perf_counter() + warmup
+            await asyncio.gather(*(client_loop(client, paths, n, stop_at, [], Counter())
+                                   for n in range(concurrency)))
+
+        latencies: List[float] = []
+        statuses: Counter = Counter()
+        started = time.perf_counter()
+        stop_at = started + duration
+        await asyncio.gather(*(client_loop(client, paths, n, stop_at, latencies, statuses)
+                               for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "latency_ms": {f"p{p}": round(percentile(latencies, p) * 1000, 2) for p in (50, 90, 99, 99.9)},
+        "statuses": {str(k): v for k, v in sorted(statuses.items(), key=lambda kv: str(kv[0]))},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the API gateway")
+    parser.add_argument("paths", nargs="+", help="Paths to request, cycled in order")
+    parser.add_argument("--url", default="http://localhost:8000", help="Gateway base URL")
+    parser.add_argument("--token", help="Bearer token for protected routes")
+    parser.add_argument("--concurrency", type=int, default=64, help="Concurrent clients")
+    parser.add_argument("--duration", type=float, default=30, help="Measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="Unmeasured seconds before measuring")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.paths, args.concurrency, args.duration, args.warmup, args.token))
+    print(f"{result['requests']} requests, {result['requests_per_second']} req/s")
+    print("latency " + ", ".join(f"{k}={v}ms" for k, v in result["latency_ms"].items()))
+    print("statuses " + ", ".join(f"{k}={v}" for k, v in result["statuses"].items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""
+Circuit Breaker and Bulkhead for Upstream Calls
+
+asyncio-native counterparts of message_queue.circuit_breaker for the
+gateway's event loop. No locks are needed: state only changes between
+awaits on a single loop.
+
+The circuit breaker stops calls to a service that keeps failing, so
+callers fail fast instead of each waiting out the connect timeout.
+After open_timeout a limited number of trial calls go through
+(HALF_OPEN); one success closes the circuit, one failure reopens it.
+
+The bulkhead caps the calls in progress to one service, so a slow
+service cannot tie up every request the gateway is handling.
+
+States:
+- CLOSED: Normal operation, calls pass through
+- OPEN: Failure threshold reached, calls are rejected immediately
+- HALF_OPEN: Trial calls allowed after the open timeout
+"""
+
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from enum import Enum
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitState(Enum):
+    CLOSED = "CLOSED"
+    OPEN = "OPEN"
+    HALF_OPEN = "HALF_OPEN"
+
+
+class UpstreamRejectedError(Exception):
+    """Raised when a call is refused before reaching the upstream"""
+
+    def __init__(self, upstream: str, message: str, retry_after: int):
+        super().__init__(message)
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class CircuitOpenError(UpstreamRejectedError):
+    """Raised when the upstream's circuit is OPEN"""
+
+    def __init__(self, upstream: str, retry_after: int):
+        super().__init__(upstream, f"Circuit for {upstream} is OPEN", retry_after)
+
+
+class BulkheadFullError(UpstreamRejectedError):
+    """Raised when the upstream already has its maximum calls in progress"""
+
+    def __init__(self, upstream: str, retry_after: int):
+        super().__init__(upstream, f"{upstream} has too many calls in progress", retry_after)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Args:
+        name: Upstream name, used in errors and logs
+        failure_threshold: Failures in a row that open the circuit
+        open_timeout: Seconds the circuit stays OPEN before trial calls
+        half_open_max_calls: Trial calls allowed at once while HALF_OPEN
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, open_timeout: float = 30.0,
+                 half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.open_timeout = open_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = CircuitState.CLOSED
+        self.failure_count = 0
+        self.opened_at = 0.0
+        self.trial_calls = 0
+        self.stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being rejected (OPEN and not yet due for a trial)"""
+        return self.state == CircuitState.OPEN and time.monotonic() - self.opened_at < self.open_timeout
+
+    def acquire(self):
+        """
+        Admit a call.
+
+        Raises:
+            CircuitOpenError: The circuit is OPEN, or HALF_OPEN with its trial calls taken
+        """
+        if self.state == CircuitState.CLOSED:
+            return
+        if self.state == CircuitState.OPEN:
+            remaining = self.open_timeout - (time.monotonic() - self.opened_at)
+            if remaining > 0:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError(self.name, max(1, math.ceil(remaining)))
+            self.state = CircuitState.HALF_OPEN
+            self.trial_calls = 0
+            logger.info(f"Circuit breaker '{self.name}' moved to HALF_OPEN state")
+        if self.trial_calls >= self.half_open_max_calls:
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(self.name, 1)
+        self.trial_calls += 1
+
+    def release(self, failed: Optional[bool]):
+        """
+        Record the outcome of an admitted call.
+
+        Args:
+            failed: True on failure, False on success, None if the call gave no verdict
+                    (cancelled, or never left the gateway)
+        """
+        if self.state == CircuitState.HALF_OPEN:
+            self.trial_calls = max(0, self.trial_calls - 1)
+        if failed is None:
+            return
+        if not failed:
+            if self.state != CircuitState.CLOSED:
+                logger.info(f"Circuit breaker '{self.name}' moved to CLOSED state")
+            self.state = CircuitState.CLOSED
+            self.failure_count = 0
+            return
+
+        self.failure_count += 1
+        if self.state == CircuitState.HALF_OPEN:
+            self._open()
+            logger.warning(f"Circuit breaker '{self.name}' moved back to OPEN state after failed trial call")
+        elif self.state == CircuitState.CLOSED and self.failure_count >= self.failure_threshold:
+            self._open()
+            logger.error(f"Circuit breaker '{self.name}' moved to OPEN state after {self.failure_count} failures")
+
+    def _open(self):
+        self.state = CircuitState.OPEN
+        self.opened_at = time.monotonic()
+        self.stats["opened"] += 1
+
+    def get_state(self) -> Dict:
+        return dict(
+            self.stats,
+            state=self.state.value,
+            failure_count=self.failure_count,
+        )
+
+
+class Bulkhead:
+    """
+    Cap on the calls in progress to one upstream.
+
+    Args:
+        name: Upstream name, used in errors
+        max_concurrent: Calls allowed in progress at once
+        max_wait: Seconds a call may wait for room (0 rejects immediately)
+        retry_after: Retry-After seconds sent with rejected calls
+    """
+
+    def __init__(self, name: str, max_concurrent: int = 50, max_wait: float = 0.0, retry_after: int = 1):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.retry_after = retry_after
+        self.active = 0
+        self._waiters = deque()
+        self.stats = {"rejected": 0}
+
+    def _reject(self) -> BulkheadFullError:
+        self.stats["rejected"] += 1
+        return BulkheadFullError(self.name, self.retry_after)
+
+    async def acquire(self):
+        """
+        Wait for room, at most max_wait seconds.
+
+        Raises:
+            BulkheadFullError: No room became free in time
+        """
+        if self.active < self.max_concurrent and not self._waiters:
+            self.active += 1
+            return
+        if self.max_wait <= 0:
+            raise self._reject()
+
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.max_wait)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                raise self._reject()
+        except asyncio.CancelledError:
+            # Room granted while the caller went away must be handed back
+            if future.done() and not future.cancelled():
+                self.release()
+            else:
+                future.cancel()
+            raise
+
+    def release(self):
+        self.active -= 1
+        while self._waiters:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+                return
+
+    def get_stats(self) -> Dict:
+        return dict(
+            self.stats,
+            active=self.active,
+            max_concurrent=self.max_concurrent,
+            waiting=sum(1 for f in self._waiters if not f.done()),
+        )
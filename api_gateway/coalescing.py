@@ -0,0 +1,55 @@
+"""
+Request Coalescing (single-flight)
+
+Concurrent callers asking for the same key share one in-flight
+upstream call instead of each issuing their own. The shared call runs
+as its own task, so a leader whose client disconnects does not cancel
+the work the followers are waiting on.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls by key.
+
+    Usage:
+        result = await single_flight.do(key, lambda: fetch(...))
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self.stats = {"leaders": 0, "coalesced": 0}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn once per key among concurrent callers.
+
+        Args:
+            key: Identity of the call (equal keys share a result)
+            fn: Zero-argument coroutine factory, only called by the leader
+
+        Returns:
+            The shared result; exceptions propagate to every caller
+        """
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(task)
+
+        self.stats["leaders"] += 1
+        task = asyncio.ensure_future(fn())
+        self._inflight[key] = task
+        task.add_done_callback(lambda t: self._done(key, t))
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Mark the exception retrieved in case every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, inflight=len(self._inflight))
@@ -0,0 +1,149 @@
+"""
+Response Compression
+
+Content negotiation and compression for gateway responses. gzip is
+always available; brotli and zstd are used when their packages are
+installed. Buffered (and cached) responses are compressed once per
+encoding and the result is kept with the cache entry; streamed
+responses are compressed chunk by chunk as they pass through.
+"""
+
+import asyncio
+import gzip
+import zlib
+from typing import AsyncIterator, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:  # optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4  # fast setting suited to dynamic responses
+ZSTD_LEVEL = 3
+
+# Bodies at least this large are compressed in a worker thread
+OFFLOAD_BYTES = 64 * 1024
+
+# Content types worth compressing (besides text/*)
+_COMPRESSIBLE_TYPES = frozenset({
+    "application/json", "application/javascript", "application/xml",
+    "application/x-www-form-urlencoded", "image/svg+xml",
+})
+# Streamed incrementally by design, compression would delay delivery
+_NEVER_COMPRESS = frozenset({"text/event-stream"})
+
+
+def supported_encodings() -> tuple:
+    """Encodings this process can produce, in default preference order"""
+    encodings = []
+    if zstandard is not None:
+        encodings.append("zstd")
+    if brotli is not None:
+        encodings.append("br")
+    encodings.append("gzip")
+    return tuple(encodings)
+
+
+def negotiate(accept_encoding: Optional[str], encodings: Iterable[str]) -> Optional[str]:
+    """
+    Pick a content coding from an Accept-Encoding header.
+
+    Args:
+        accept_encoding: Client header value
+        encodings: Encodings the server offers, most preferred first
+
+    Returns:
+        The chosen encoding, or None for identity
+    """
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if coding:
+            accepted[coding] = q
+
+    best, best_q = None, 0.0
+    for encoding in encodings:
+        q = accepted.get(encoding, accepted.get("*", 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    """Whether a body of this media type benefits from compression"""
+    if not content_type:
+        return False
+    media_type = content_type.split(";", 1)[0].strip().lower()
+    if media_type in _NEVER_COMPRESS:
+        return False
+    return (media_type.startswith("text/") or media_type in _COMPRESSIBLE_TYPES
+            or media_type.endswith("+json") or media_type.endswith("+xml"))
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a whole body"""
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+
+async def compress_async(body: bytes, encoding: str) -> bytes:
+    """Compress a body, off the event loop when it is large"""
+    if len(body) < OFFLOAD_BYTES:
+        return compress(body, encoding)
+    return await asyncio.get_event_loop().run_in_executor(None, compress, body, encoding)
+
+
+class StreamCompressor:
+    """Incremental compressor for a streamed body"""
+
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        elif encoding == "zstd":
+            self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+        else:
+            raise ValueError(f"Unsupported encoding: {encoding}")
+
+    def compress(self, chunk: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.process(chunk)
+        return self._compressor.compress(chunk)
+
+    def finish(self) -> bytes:
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+
+async def compress_stream(chunks: AsyncIterator[bytes], encoding: str) -> AsyncIterator[bytes]:
+    """Compress an async byte stream, yielding output as the compressor produces it"""
+    compressor = StreamCompressor(encoding)
+    async for chunk in chunks:
+        output = compressor.compress(chunk)
+        if output:
+            yield output
+    yield compressor.finish()
@@ -1,3 +1,4 @@
+import json
 import os
 
 # Microservice URLs - use container names in Docker network
@@ -8,3 +9,242 @@ CUSTOMER_SERVICE_URL = os.getenv("CUSTOMER_SERVICE_URL", "http://customer:5005")
 INVENTORY_SERVICE_URL = os.getenv("INVENTORY_SERVICE_URL", "http://inventory:5006")
 PROCUREMENT_SERVICE_URL = os.getenv("PROCUREMENT_SERVICE_URL", "http://procurement:5001")
 ORDER_SERVICE_URL = os.getenv("ORDER_SERVICE_URL", "http://order:5002")
+
+
+
+def _replicas(service: str, default_url: str) -> list:
+    """Replica URLs from <SERVICE>_SERVICE_URLS (comma-separated), else the single URL"""
+    urls = os.getenv(f"{service}_SERVICE_URLS")
+    return [u.strip() for u in urls.split(",") if u.strip()] if urls else [default_url]
+
+
+SERVICE_URLS = {
+    "auth": _replicas("AUTH", AUTH_SERVICE_URL),
+    "product": _replicas("PRODUCT", PRODUCT_SERVICE_URL),
+    "supplier": _replicas("SUPPLIER", SUPPLIER_SERVICE_URL),
+    "customer": _replicas("CUSTOMER", CUSTOMER_SERVICE_URL),
+    "inventory": _replicas("INVENTORY", INVENTORY_SERVICE_URL),
+    "procurement": _replicas("PROCUREMENT", PROCUREMENT_SERVICE_URL),
+    "order": _replicas("ORDER", ORDER_SERVICE_URL),
+}
+
+# Connection pool defaults, overridable per service with a <SERVICE>_ prefix
+# (e.g. ORDER_MAX_CONNECTIONS=50)
+UPSTREAM_POOL_DEFAULTS = {
+    "max_connections": int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 20)),
+    "max_keepalive": int(os.getenv("UPSTREAM_MAX_KEEPALIVE", 20)),
+    "keepalive_expiry": float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", 60)),
+    "connect_timeout": float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", 2)),
+    "read_timeout": float(os.getenv("UPSTREAM_READ_TIMEOUT", 30)),
+    "pool_timeout": float(os.getenv("UPSTREAM_POOL_TIMEOUT", 5)),
+    "warm_connections": int(os.getenv("UPSTREAM_WARM_CONNECTIONS", 2)),
+}
+
+
+def _service_settings(service: str, defaults: dict) -> dict:
+    settings = {}
+    for key, default in defaults.items():
+        value = os.getenv(f"{service.upper()}_{key.upper()}")
+        settings[key] = type(default)(value) if value is not None else default
+    return settings
+
+
+def upstream_pool_settings(service: str) -> dict:
+    """Connection pool settings for one service"""
+    return _service_settings(service, UPSTREAM_POOL_DEFAULTS)
+
+# Load balancing across replicas, overridable per service (e.g. ORDER_LB_POLICY)
+LOAD_BALANCING_DEFAULTS = {
+    "policy": os.getenv("LB_POLICY", "p2c"),  # or least_outstanding
+    "consecutive_failures": int(os.getenv("LB_CONSECUTIVE_FAILURES", 5)),
+    "error_rate": float(os.getenv("LB_ERROR_RATE", 0.5)),
+    "latency_factor": float(os.getenv("LB_LATENCY_FACTOR", 3)),
+    "min_requests": int(os.getenv("LB_MIN_REQUESTS", 10)),
+    "base_ejection": float(os.getenv("LB_BASE_EJECTION", 30)),
+    "max_ejection": float(os.getenv("LB_MAX_EJECTION", 300)),
+    "max_ejected_share": float(os.getenv("LB_MAX_EJECTED_SHARE", 0.5)),
+}
+LB_HEALTH_CHECK_INTERVAL = float(os.getenv("LB_HEALTH_CHECK_INTERVAL", 10))
+LB_HEALTH_CHECK_TIMEOUT = float(os.getenv("LB_HEALTH_CHECK_TIMEOUT", 2))
+
+
+def load_balancing_settings(service: str) -> dict:
+    """Replica balancing and outlier ejection settings for one service"""
+    settings = _service_settings(service, {f"lb_{k}": v for k, v in LOAD_BALANCING_DEFAULTS.items()})
+    return {key[len("lb_"):]: value for key, value in settings.items()}
+
+# Adaptive concurrency limits, overridable per service like the pool settings
+# (e.g. ORDER_MAX_LIMIT=40). The max limit defaults to the pool size.
+CONCURRENCY_LIMIT_ENABLED = os.getenv("CONCURRENCY_LIMIT_ENABLED", "true").lower() == "true"
+CONCURRENCY_LIMIT_DEFAULTS = {
+    "initial_limit": int(os.getenv("CONCURRENCY_INITIAL_LIMIT", 10)),
+    "min_limit": int(os.getenv("CONCURRENCY_MIN_LIMIT", 2)),
+    "max_limit": int(os.getenv("CONCURRENCY_MAX_LIMIT", UPSTREAM_POOL_DEFAULTS["max_connections"])),
+    "tolerance": float(os.getenv("CONCURRENCY_LATENCY_TOLERANCE", 1.5)),
+    "low_priority_share": float(os.getenv("CONCURRENCY_LOW_PRIORITY_SHARE", 0.75)),
+    "max_queue": int(os.getenv("CONCURRENCY_MAX_QUEUE", 100)),
+    "retry_after": int(os.getenv("LOAD_SHED_RETRY_AFTER", 1)),
+}
+
+# Seconds a request of each priority may wait for a slot before it is shed
+QUEUE_TIMEOUT_HIGH = float(os.getenv("QUEUE_TIMEOUT_HIGH", 5))
+QUEUE_TIMEOUT_NORMAL = float(os.getenv("QUEUE_TIMEOUT_NORMAL", 2))
+QUEUE_TIMEOUT_LOW = float(os.getenv("QUEUE_TIMEOUT_LOW", 0.5))
+
+
+def concurrency_limit_settings(service: str) -> dict:
+    """Adaptive concurrency limiter settings for one service"""
+    return _service_settings(service, CONCURRENCY_LIMIT_DEFAULTS)
+
+# Hedged GETs: a second attempt goes to another replica once the first runs past
+# the route's latency percentile
+HEDGING_ENABLED = os.getenv("HEDGING_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 95))
+HEDGE_MIN_DELAY = float(os.getenv("HEDGE_MIN_DELAY", 0.02))
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", 50))
+HEDGE_WINDOW = int(os.getenv("HEDGE_WINDOW", 500))
+
+# Connect-error retries for GETs; retries and hedges share one budget
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", 1))
+RETRY_BUDGET_RATIO = float(os.getenv("RETRY_BUDGET_RATIO", 0.1))
+RETRY_BUDGET_MIN_PER_SECOND = float(os.getenv("RETRY_BUDGET_MIN_PER_SECOND", 3))
+RETRY_BUDGET_WINDOW = int(os.getenv("RETRY_BUDGET_WINDOW", 10))
+
+# Absolute deadline (epoch seconds) sent to services in X-Request-Deadline: the
+# upstream read timeout from now, or the client's own deadline if that is sooner.
+# Services and gateway must have synchronized clocks.
+DEADLINE_PROPAGATION_ENABLED = os.getenv("DEADLINE_PROPAGATION_ENABLED", "true").lower() == "true"
+# A client's deadline is never taken as less than this many seconds from now, so an
+# already-passed (or bogus) deadline cannot make services answer 504 on purpose
+DEADLINE_MIN_CLIENT_BUDGET = float(os.getenv("DEADLINE_MIN_CLIENT_BUDGET", 1))
+
+# Circuit breaker and bulkhead per service, overridable per service like the pool
+# settings (e.g. ORDER_CIRCUIT_FAILURE_THRESHOLD=10, ORDER_BULKHEAD_MAX_CONCURRENT=100)
+CIRCUIT_BREAKER_ENABLED = os.getenv("CIRCUIT_BREAKER_ENABLED", "true").lower() == "true"
+CIRCUIT_BREAKER_DEFAULTS = {
+    "failure_threshold": int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", 5)),
+    "open_timeout": float(os.getenv("CIRCUIT_OPEN_TIMEOUT", 30)),
+    "half_open_max_calls": int(os.getenv("CIRCUIT_HALF_OPEN_MAX_CALLS", 1)),
+}
+BULKHEAD_DEFAULTS = {
+    "max_concurrent": int(os.getenv("BULKHEAD_MAX_CONCURRENT", 50)),
+    "max_wait": float(os.getenv("BULKHEAD_MAX_WAIT", 0)),
+}
+
+
+def circuit_breaker_settings(service: str) -> dict:
+    """Circuit breaker settings for one service"""
+    settings = _service_settings(service, {f"circuit_{k}": v for k, v in CIRCUIT_BREAKER_DEFAULTS.items()})
+    return {key[len("circuit_"):]: value for key, value in settings.items()}
+
+
+def bulkhead_settings(service: str) -> dict:
+    """Bulkhead settings for one service"""
+    settings = _service_settings(service, {f"bulkhead_{k}": v for k, v in BULKHEAD_DEFAULTS.items()})
+    return {key[len("bulkhead_"):]: value for key, value in settings.items()}
+
+# JWT verification - tokens are verified locally against auth's published keys
+AUTH_JWKS_URL = os.getenv("AUTH_JWKS_URL", f"{AUTH_SERVICE_URL}/auth/jwks")
+JWT_ALGORITHMS = os.getenv("JWT_ALGORITHMS", "RS256").split(",")
+JWKS_REFRESH_INTERVAL = int(os.getenv("JWKS_REFRESH_INTERVAL", 300))
+JWKS_MIN_REFRESH_INTERVAL = int(os.getenv("JWKS_MIN_REFRESH_INTERVAL", 30))
+
+# Validated-token cache; user revocations are remembered for a token's lifetime
+TOKEN_CACHE_ENABLED = os.getenv("TOKEN_CACHE_ENABLED", "true").lower() == "true"
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", 10000))
+TOKEN_LIFETIME = int(os.getenv("TOKEN_LIFETIME", 6 * 3600))
+
+# Redis (response cache tier and event subscriptions)
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD", None)
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 0.5))
+
+# Response cache for GET endpoints
+RESPONSE_CACHE_ENABLED = os.getenv("RESPONSE_CACHE_ENABLED", "true").lower() == "true"
+RESPONSE_CACHE_USE_REDIS = os.getenv("RESPONSE_CACHE_USE_REDIS", "true").lower() == "true"
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+RESPONSE_CACHE_MAX_BODY_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BODY_BYTES", 1024 * 1024))
+# Seconds an expired entry is kept to be served while its service's circuit is open
+RESPONSE_CACHE_STALE_TTL = int(os.getenv("RESPONSE_CACHE_STALE_TTL", 300))
+
+# Seconds a cached response stays fresh, per service
+RESPONSE_CACHE_TTLS = {
+    "product": int(os.getenv("CACHE_TTL_PRODUCT", 60)),
+    "supplier": int(os.getenv("CACHE_TTL_SUPPLIER", 300)),
+    "customer": int(os.getenv("CACHE_TTL_CUSTOMER", 300)),
+    "inventory": int(os.getenv("CACHE_TTL_INVENTORY", 10)),
+    "procurement": int(os.getenv("CACHE_TTL_PROCUREMENT", 30)),
+    "order": int(os.getenv("CACHE_TTL_ORDER", 30)),
+    "dashboard": int(os.getenv("CACHE_TTL_DASHBOARD", 5)),
+}
+
+# Single-entity GETs served from the services' cache:{type}:{id} Redis entries
+ENTITY_READ_THROUGH_ENABLED = os.getenv("ENTITY_READ_THROUGH_ENABLED", "true").lower() == "true"
+ENTITY_READ_THROUGH_TYPES = os.getenv("ENTITY_READ_THROUGH_TYPES", "product,supplier,customer").split(",")
+
+# Response compression, encodings in order of preference (unavailable ones are skipped)
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+COMPRESSION_ENCODINGS = os.getenv("COMPRESSION_ENCODINGS", "zstd,br,gzip").split(",")
+
+# Rate limiting (token buckets in Redis): capacity is the burst size,
+# rate the refill in requests per second
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+
+
+def _bucket(name: str, capacity: int, rate: float) -> tuple:
+    return (int(os.getenv(f"RATE_LIMIT_{name}_CAPACITY", capacity)),
+            float(os.getenv(f"RATE_LIMIT_{name}_RATE", rate)))
+
+
+RATE_LIMIT_USER = _bucket("USER", 200, 20)
+RATE_LIMIT_IP = _bucket("IP", 300, 50)
+
+# Per-caller buckets for specific routes: name -> ((method, route), ...), (capacity, rate)
+RATE_LIMIT_ROUTES = {
+    "create_order": ((("POST", "/api/orders"), ("POST", "/api/customertransactions")),
+                     _bucket("CREATE_ORDER", 30, 1)),
+    "create_procurement": ((("POST", "/api/procurements"), ("POST", "/api/supplytransactions")),
+                           _bucket("CREATE_PROCUREMENT", 30, 1)),
+    "login": ((("POST", "/api/auth/login"), ("POST", "/api/auth/register")),
+              _bucket("LOGIN", 10, 0.2)),
+    "batch": ((("POST", "/api/batch"),), _bucket("BATCH", 20, 2)),
+}
+
+RATE_LIMIT_LOCAL_FRACTION = float(os.getenv("RATE_LIMIT_LOCAL_FRACTION", 0.1))
+RATE_LIMIT_LOCAL_MAX_AGE = float(os.getenv("RATE_LIMIT_LOCAL_MAX_AGE", 1))
+RATE_LIMIT_FAIL_OPEN = os.getenv("RATE_LIMIT_FAIL_OPEN", "true").lower() == "true"
+# Reverse proxies in front of the gateway whose X-Forwarded-For entry is trusted
+RATE_LIMIT_TRUSTED_PROXIES = int(os.getenv("RATE_LIMIT_TRUSTED_PROXIES", 0))
+
+# Per-route policy overrides as JSON: route name -> RoutePolicy fields (see routes.py),
+# e.g. {"get_product": {"cache_ttl": 120, "priority": "high", "timeout": 5}}
+ROUTE_POLICIES = json.loads(os.getenv("ROUTE_POLICIES", "{}"))
+
+# Request coalescing: identical concurrent GETs share one upstream call
+COALESCING_ENABLED = os.getenv("COALESCING_ENABLED", "true").lower() == "true"
+
+# Metrics shared by the workers of one server (set by gunicorn.conf.py when there are
+# several); empty serves the calling worker's metrics only
+METRICS_DIR = os.getenv("GATEWAY_METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.getenv("GATEWAY_METRICS_FLUSH_INTERVAL", 1))
+
+# Server-Sent Events at /api/stream, fanned out from one Redis subscription per worker
+SSE_ENABLED = os.getenv("SSE_ENABLED", "true").lower() == "true"
+SSE_REPLAY_SIZE = int(os.getenv("SSE_REPLAY_SIZE", 1000))
+SSE_CLIENT_QUEUE_SIZE = int(os.getenv("SSE_CLIENT_QUEUE_SIZE", 256))
+SSE_HEARTBEAT = float(os.getenv("SSE_HEARTBEAT", 15))
+SSE_MAX_CLIENTS = int(os.getenv("SSE_MAX_CLIENTS", 1000))
+SSE_RETRY = int(os.getenv("SSE_RETRY", 3000))
+
+# /api/batch limits
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", 20))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 8))
+BATCH_ITEM_TIMEOUT = float(os.getenv("BATCH_ITEM_TIMEOUT", 30))
+
+# /api/dashboard aggregation
+DASHBOARD_SECTION_TIMEOUT = float(os.getenv("DASHBOARD_SECTION_TIMEOUT", 2))
+DASHBOARD_LOW_STOCK_THRESHOLD = int(os.getenv("DASHBOARD_LOW_STOCK_THRESHOLD", 10))
+DASHBOARD_RECENT_LIMIT = int(os.getenv("DASHBOARD_RECENT_LIMIT", 10))
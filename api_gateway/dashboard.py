@@ -0,0 +1,86 @@
+"""
+Dashboard Aggregation
+
+Builds the dashboard KPIs by fanning out to inventory, order,
+procurement and product in parallel. Every section has its own timeout
+and error handling, so a slow or failing service only blanks its own
+section and the rest of the dashboard is still returned.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from circuit_breaker import UpstreamRejectedError
+from load_shedding import LoadShedError
+
+logger = logging.getLogger(__name__)
+
+
+async def fetch_json(upstream, path: str, params: Optional[Dict] = None, key: Optional[str] = None,
+                     headers: Optional[Dict] = None):
+    """
+    GET a JSON document from an upstream service.
+
+    Args:
+        upstream: upstreams.Upstream to call
+        path: Service path
+        params: Query parameters
+        key: If set, return only this member of the response object
+        headers: Extra request headers
+    """
+    response = await upstream.send(upstream.build_request("GET", path, params=params, headers=headers))
+    response.raise_for_status()
+    data = response.json()
+    return data.get(key) if key else data
+
+
+async def run_section(name: str, fetch: Callable[[], Awaitable], timeout: float) -> Tuple[str, Dict]:
+    """Run one section with its own timeout, capturing failures instead of raising"""
+    try:
+        data = await asyncio.wait_for(fetch(), timeout)
+        return name, {"status": "ok", "data": data}
+    except asyncio.TimeoutError:
+        logger.warning(f"Dashboard section '{name}' timed out after {timeout}s")
+        return name, {"status": "timeout", "data": None}
+    except httpx.HTTPStatusError as e:
+        logger.warning(f"Dashboard section '{name}' failed: upstream returned {e.response.status_code}")
+        return name, {"status": "error", "data": None, "error": f"Upstream returned {e.response.status_code}"}
+    except (httpx.HTTPError, ValueError, LoadShedError, UpstreamRejectedError) as e:
+        logger.warning(f"Dashboard section '{name}' failed: {e}")
+        return name, {"status": "error", "data": None, "error": type(e).__name__}
+
+
+async def build_dashboard(upstreams, section_timeout: float, low_stock_threshold: int,
+                          recent_limit: int, propagate_deadline: bool = True) -> Dict:
+    """
+    Fetch all dashboard sections concurrently.
+    With propagate_deadline, services are told the section timeout as their deadline.
+
+    Returns:
+        {"generated_at": ..., "complete": bool, "sections": {name: {"status", "data"}}}
+    """
+    headers = {"X-Request-Deadline": f"{time.time() + section_timeout:.3f}"} if propagate_deadline else None
+    sections = {
+        "low_stock": lambda: fetch_json(
+            upstreams["inventory"], "/storages/low-stock",
+            {"threshold": low_stock_threshold}, key="storages", headers=headers),
+        "recent_orders": lambda: fetch_json(
+            upstreams["order"], "/orders/recent", {"limit": recent_limit}, key="orders", headers=headers),
+        "recent_procurements": lambda: fetch_json(
+            upstreams["procurement"], "/procurements/recent", {"limit": recent_limit}, key="procurements",
+            headers=headers),
+        "catalog": lambda: fetch_json(upstreams["product"], "/products/stats", headers=headers),
+    }
+    results = dict(await asyncio.gather(
+        *(run_section(name, fetch, section_timeout) for name, fetch in sections.items())
+    ))
+    return {
+        "generated_at": datetime.utcnow().isoformat(),
+        "complete": all(section["status"] == "ok" for section in results.values()),
+        "sections": results,
+    }
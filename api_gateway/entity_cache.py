@@ -0,0 +1,115 @@
+"""
+Edge Read-Through of the Shared Entity Cache
+
+The services keep their entities in Redis as cache:{type}:{id} (see
+message_queue/cache.py), the same dict their detail endpoints return.
+Single-entity GETs are answered from those entries, so a hot read is
+one Redis GET instead of an HTTP call plus a SQL query. A miss (or an
+entry whose embedded entities are missing) falls through to the
+service.
+
+Entries are decoded with the services' own codec (message_queue/codec.py,
+copied into the gateway image), so both sides always agree on the
+format. An entry this process cannot decode counts as a miss.
+
+Bodies are serialized the way Flask's jsonify does (sorted keys,
+compact separators, trailing newline), so a response and its ETag do
+not depend on which path served it.
+"""
+
+import json
+import logging
+import os
+import sys
+from typing import Dict, Iterable, Optional, Tuple
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from message_queue.codec import CacheCodec
+from metrics import ENTITY_CACHE_LOOKUPS
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Entity type -> (embedded entity type, foreign key field, response field), as the
+# service's detail endpoint enriches its response
+EMBEDS: Dict[str, Tuple[str, str, str]] = {
+    "product": ("supplier", "supplier_id", "supplier"),
+}
+
+
+# Same channel and payload as message_queue.local_cache, so the services drop their in-process copies
+INVALIDATION_CHANNEL = "cache_invalidation"
+
+
+def cache_key(entity_type: str, entity_id: int) -> str:
+    """Same key format as message_queue.cache.get_cache_key"""
+    return f"cache:{entity_type}:{entity_id}"
+
+
+def decode_entry(data: bytes):
+    """
+    Decode a cached value in any format the services write.
+
+    Raises:
+        ValueError: Unknown format, or its package is not installed
+    """
+    return CacheCodec.decode(data)
+
+
+def jsonify_body(data) -> bytes:
+    return (json.dumps(data, sort_keys=True, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+class EntityReadThrough:
+    """
+    Reads entity JSON from the services' Redis cache.
+
+    Args:
+        entity_types: Entity types served from the cache
+    """
+
+    def __init__(self, entity_types: Iterable[str] = ("product", "supplier", "customer")):
+        self.entity_types = frozenset(entity_types)
+
+    async def get(self, entity_type: str, entity_id: int) -> Optional[bytes]:
+        """
+        Response body for an entity, or None to ask the service.
+        Redis errors count as misses.
+        """
+        if entity_type not in self.entity_types:
+            return None
+        try:
+            data = await get_redis().get(cache_key(entity_type, entity_id))
+            if data is None:
+                ENTITY_CACHE_LOOKUPS.inc(entity_type, "miss")
+                return None
+            entity = decode_entry(data)
+            embed = EMBEDS.get(entity_type)
+            if embed is not None and entity.get(embed[1]):
+                embedded_type, foreign_key, field = embed
+                embedded = await get_redis().get(cache_key(embedded_type, entity[foreign_key]))
+                if embedded is None:
+                    # The service would embed it; let it fetch and cache the dependency
+                    ENTITY_CACHE_LOOKUPS.inc(entity_type, "miss")
+                    return None
+                entity[field] = decode_entry(embedded)
+        except Exception as e:
+            ENTITY_CACHE_LOOKUPS.inc(entity_type, "error")
+            logger.debug(f"Entity cache read failed for {entity_type}:{entity_id}: {e}")
+            return None
+        ENTITY_CACHE_LOOKUPS.inc(entity_type, "hit")
+        return jsonify_body(entity)
+
+    async def evict(self, entity_type: str, entity_id: int):
+        """Drop an entity after a write through the gateway, ahead of the services' own event handling"""
+        if entity_type not in self.entity_types:
+            return
+        try:
+            pipeline = get_redis().pipeline(transaction=False)
+            pipeline.delete(cache_key(entity_type, entity_id))
+            pipeline.publish(INVALIDATION_CHANNEL,
+                             json.dumps({"type": entity_type, "id": entity_id, "origin": "gateway"}))
+            await pipeline.execute()
+        except Exception as e:
+            logger.warning(f"Entity cache eviction failed for {entity_type}:{entity_id}: {e}")
@@ -0,0 +1,111 @@
+"""
+Gateway Event Listener
+
+Holds a single Redis pub/sub subscription per gateway worker and
+dispatches each event to the async handlers registered for its channel.
+Reconnects with backoff if Redis goes away; subscribe hooks run after
+every (re)subscription so state fed by events can discard what may have
+been missed meanwhile.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from redis_client import get_pubsub_redis
+
+logger = logging.getLogger(__name__)
+
+EventHandler = Callable[[str, Dict], Awaitable[None]]
+
+
+class EventListener:
+    """
+    Fan-out of Redis pub/sub events to in-process handlers.
+
+    Handlers receive (channel, event) where event is the decoded JSON
+    payload published by message_queue.event_system.EventPublisher.
+    """
+
+    def __init__(self, reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.handlers: Dict[str, List[EventHandler]] = {}
+        self.subscribe_hooks: List[Callable[[], Awaitable[None]]] = []
+        self.connected = False
+        self._task: Optional[asyncio.Task] = None
+
+    def add_handler(self, channels, handler: EventHandler):
+        """
+        Register a handler for one or more channels.
+        Must be called before start().
+        """
+        for channel in channels:
+            self.handlers.setdefault(channel, []).append(handler)
+
+    def add_subscribe_hook(self, hook: Callable[[], Awaitable[None]]):
+        """
+        Register a coroutine function run after each (re)subscription.
+        Must be called before start().
+        """
+        self.subscribe_hooks.append(hook)
+
+    async def _dispatch(self, channel: str, data: str):
+        try:
+            event = json.loads(data)
+        except ValueError:
+            logger.warning(f"Ignoring non-JSON event on {channel}")
+            return
+        for handler in self.handlers.get(channel, []):
+            try:
+                await handler(channel, event)
+            except Exception as e:
+                logger.error(f"Event handler failed for {channel}: {e}")
+
+    async def _run(self):
+        delay = self.reconnect_delay
+        while True:
+            client = get_pubsub_redis()
+            pubsub = client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(*self.handlers.keys())
+                delay = self.reconnect_delay
+                logger.info(f"Gateway subscribed to channels: {list(self.handlers.keys())}")
+                for hook in self.subscribe_hooks:
+                    try:
+                        await hook()
+                    except Exception as e:
+                        logger.error(f"Subscribe hook failed: {e}")
+                self.connected = True
+                async for message in pubsub.listen():
+                    if message["type"] == "message":
+                        await self._dispatch(message["channel"], message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Gateway event listener error: {e}. Reconnecting in {delay}s")
+            finally:
+                self.connected = False
+                try:
+                    await pubsub.close()
+                    await client.close()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    def start(self):
+        """Start the background subscription task"""
+        if self._task is None and self.handlers:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Cancel the background subscription task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
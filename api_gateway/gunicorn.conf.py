@@ -0,0 +1,49 @@
+"""
+Gunicorn settings for serving the gateway in production.
+
+Each worker is a separate process with its own event loop, upstream
+pools, caches and limiters. A worker runs the app's startup (pool
+warm-up, JWKS keys, event subscriptions) before it accepts connections,
+and on SIGTERM stops accepting, finishes in-flight requests for up to
+graceful_timeout seconds, then runs the app's shutdown.
+
+With several workers, /metrics would only show the worker that happened
+to take the scrape, so workers share their metrics through
+GATEWAY_METRICS_DIR (a fresh temporary directory unless set).
+"""
+
+import os
+import tempfile
+
+from metrics import clear_directory, mark_process_dead
+from workers import default_worker_count
+
+bind = f"0.0.0.0:{os.getenv('GATEWAY_PORT', 8000)}"
+worker_class = "workers.GatewayWorker"
+workers = int(os.getenv("GATEWAY_WORKERS", 0)) or default_worker_count()
+
+# Read by the workers' config.py, which they import after forking
+if workers > 1 and not os.getenv("GATEWAY_METRICS_DIR"):
+    os.environ["GATEWAY_METRICS_DIR"] = tempfile.mkdtemp(prefix="gateway-metrics-")
+
+# Longest request the gateway waits for is the upstream read timeout (30s)
+graceful_timeout = int(os.getenv("GATEWAY_GRACEFUL_TIMEOUT", 30))
+# A worker that stops heartbeating this long is restarted
+timeout = int(os.getenv("GATEWAY_WORKER_TIMEOUT", 60))
+keepalive = int(os.getenv("GATEWAY_KEEPALIVE", 5))
+backlog = int(os.getenv("GATEWAY_BACKLOG", 2048))
+
+accesslog = None
+errorlog = "-"
+loglevel = os.getenv("GATEWAY_LOG_LEVEL", "info")
+
+
+def on_starting(server):
+    if os.getenv("GATEWAY_METRICS_DIR"):
+        clear_directory(os.environ["GATEWAY_METRICS_DIR"])
+
+
+def child_exit(server, worker):
+    # Totals of a replaced worker still count; its gauges no longer describe anything
+    if os.getenv("GATEWAY_METRICS_DIR"):
+        mark_process_dead(os.environ["GATEWAY_METRICS_DIR"], worker.pid)
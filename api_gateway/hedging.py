@@ -0,0 +1,241 @@
+"""
+Hedged Requests and Retry Budget
+
+Idempotent GETs are hedged: when the first attempt has not returned its
+headers by the route's latency percentile, a second attempt goes to
+another replica and whichever answers first wins; the loser is
+cancelled. Attempts that fail to connect are retried on a different
+replica.
+
+Hedges and retries both draw from one retry budget, capped at a share
+of recent requests (plus a small floor per second), so extra attempts
+stop as soon as an outage would turn them into amplified load.
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from load_shedding import Priority
+from metrics import UPSTREAM_HEDGES, UPSTREAM_RETRIES
+
+logger = logging.getLogger(__name__)
+
+# Errors raised before the request reached the service, safe to retry elsewhere
+RETRYABLE_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+class RetryBudget:
+    """
+    Extra attempts allowed as a share of recent requests.
+
+    Args:
+        ratio: Retries allowed per request over the window
+        min_per_second: Retries always allowed per second, for low traffic
+        window: Seconds of history the budget is computed over
+    """
+
+    def __init__(self, ratio: float = 0.1, min_per_second: float = 3.0, window: int = 10):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window = window
+        # Per-second slots: [second, requests, retries]
+        self._slots = deque()
+        self.exhausted = 0
+
+    def _slot(self) -> list:
+        now = int(time.monotonic())
+        while self._slots and self._slots[0][0] <= now - self.window:
+            self._slots.popleft()
+        if not self._slots or self._slots[-1][0] != now:
+            self._slots.append([now, 0, 0])
+        return self._slots[-1]
+
+    def _totals(self) -> Tuple[int, int]:
+        self._slot()
+        return sum(s[1] for s in self._slots), sum(s[2] for s in self._slots)
+
+    def deposit(self):
+        """Count one request towards the budget"""
+        self._slot()[1] += 1
+
+    def withdraw(self) -> bool:
+        """Take one retry from the budget, False if it is spent"""
+        requests, retries = self._totals()
+        if retries >= self.min_per_second * self.window + self.ratio * requests:
+            self.exhausted += 1
+            return False
+        self._slots[-1][2] += 1
+        return True
+
+    def get_stats(self) -> Dict:
+        requests, retries = self._totals()
+        return {
+            "requests": requests,
+            "retries": retries,
+            "allowed": int(self.min_per_second * self.window + self.ratio * requests),
+            "exhausted": self.exhausted,
+        }
+
+
+class LatencyWindow:
+    """Recent response times of one route and their hedging percentile"""
+
+    def __init__(self, size: int):
+        self.samples = deque(maxlen=size)
+        self.threshold: Optional[float] = None
+        self._since_update = 0
+
+    def observe(self, rtt: float, percentile: float, min_samples: int):
+        self.samples.append(rtt)
+        self._since_update += 1
+        # Re-sorting on every sample is wasteful, refresh every tenth of the window
+        if len(self.samples) >= min_samples and self._since_update >= max(1, self.samples.maxlen // 10):
+            ordered = sorted(self.samples)
+            self.threshold = ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+            self._since_update = 0
+
+
+class Hedger:
+    """
+    Sends idempotent upstream requests with hedging and connect retries.
+
+    Args:
+        budget: Retry budget shared by hedges and retries
+        hedging: Send hedged attempts (retries still apply when False)
+        percentile: Route latency percentile after which a hedge is sent
+        min_delay: Never hedge sooner than this many seconds
+        min_samples: Samples a route needs before it is hedged
+        window: Latency samples kept per route
+        max_retries: Connect-error retries per attempt
+    """
+
+    def __init__(self, budget: RetryBudget, hedging: bool = True, percentile: float = 95.0,
+                 min_delay: float = 0.02, min_samples: int = 50, window: int = 500, max_retries: int = 1):
+        self.budget = budget
+        self.hedging = hedging
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.window = window
+        self.max_retries = max_retries
+        self._latencies: Dict[Tuple[str, str], LatencyWindow] = {}
+
+    def _window(self, key: Tuple[str, str]) -> LatencyWindow:
+        window = self._latencies.get(key)
+        if window is None:
+            window = self._latencies[key] = LatencyWindow(self.window)
+        return window
+
+    def hedge_delay(self, upstream: str, route: str) -> Optional[float]:
+        """Seconds to wait before hedging a call, None if the route is not hedged yet"""
+        if not self.hedging:
+            return None
+        window = self._latencies.get((upstream, route))
+        if window is None or window.threshold is None:
+            return None
+        return max(self.min_delay, window.threshold)
+
+    async def _attempt(self, upstream, build: Callable[[], httpx.Request], route: str,
+                       priority: Priority, tried: List) -> httpx.Response:
+        """One attempt, retried on another replica if it cannot connect"""
+        retries = 0
+        while True:
+            replica = upstream.replicas.pick(exclude=tried)
+            tried.append(replica)
+            started = time.monotonic()
+            try:
+                response = await upstream.send(build(), stream=True, priority=priority, replica=replica)
+            except RETRYABLE_ERRORS:
+                if retries >= self.max_retries:
+                    raise
+                if not upstream.replicas.has_untried(tried):
+                    UPSTREAM_RETRIES.inc(upstream.name, "no_replica")
+                    raise
+                if not self.budget.withdraw():
+                    UPSTREAM_RETRIES.inc(upstream.name, "budget_exhausted")
+                    raise
+                retries += 1
+                UPSTREAM_RETRIES.inc(upstream.name, "sent")
+                continue
+            except asyncio.CancelledError:
+                # A hedged-away attempt took at least this long, keep it in the distribution
+                self._window((upstream.name, route)).observe(
+                    time.monotonic() - started, self.percentile, self.min_samples)
+                raise
+            self._window((upstream.name, route)).observe(
+                time.monotonic() - started, self.percentile, self.min_samples)
+            return response
+
+    @staticmethod
+    def _discard(task: asyncio.Task):
+        """Close the response of an attempt that lost the race"""
+        if not task.cancelled() and task.exception() is None:
+            asyncio.ensure_future(task.result().aclose())
+
+    async def send(self, upstream, build: Callable[[], httpx.Request], route: str,
+                   priority: Priority = Priority.NORMAL, hedge: bool = True) -> httpx.Response:
+        """
+        Send a bodiless GET/HEAD, hedging it once it runs past the route's percentile.
+
+        Args:
+            upstream: upstreams.Upstream to call
+            build: Builds a fresh httpx.Request for each attempt
+            route: Route template the latency percentile is tracked for
+            priority: Admission priority of the first attempt (hedges are LOW)
+            hedge: False to only retry connect errors, never hedge
+
+        Returns:
+            The streamed response of the first attempt to answer
+
+        Raises:
+            httpx.RequestError: Every attempt failed (the first attempt's error)
+            LoadShedError: The first attempt was shed
+        """
+        self.budget.deposit()
+        tried = []
+        attempts = [asyncio.ensure_future(self._attempt(upstream, build, route, priority, tried))]
+        winner = None
+        try:
+            delay = self.hedge_delay(upstream.name, route) if hedge else None
+            done, pending = await asyncio.wait(attempts, timeout=delay)
+            if not done:
+                if not upstream.replicas.has_untried(tried):
+                    # A hedge to the replica already being waited on would only add load
+                    UPSTREAM_HEDGES.inc(upstream.name, "no_replica")
+                elif self.budget.withdraw():
+                    UPSTREAM_HEDGES.inc(upstream.name, "sent")
+                    hedge_task = asyncio.ensure_future(self._attempt(upstream, build, route, Priority.LOW, tried))
+                    attempts.append(hedge_task)
+                    pending.add(hedge_task)
+                else:
+                    UPSTREAM_HEDGES.inc(upstream.name, "budget_exhausted")
+            while True:
+                for task in done:
+                    if task.exception() is None:
+                        winner = task
+                        if task is not attempts[0]:
+                            UPSTREAM_HEDGES.inc(upstream.name, "won")
+                        return task.result()
+                if not pending:
+                    raise attempts[0].exception()
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in attempts:
+                if task is not winner:
+                    task.add_done_callback(self._discard)
+                    task.cancel()
+
+    def get_stats(self) -> Dict:
+        return {
+            "hedging": self.hedging,
+            "retry_budget": self.budget.get_stats(),
+            "hedge_delay_ms": {
+                f"{upstream} {route}": round(max(self.min_delay, window.threshold) * 1000, 2)
+                for (upstream, route), window in self._latencies.items() if window.threshold is not None
+            },
+        }
@@ -0,0 +1,127 @@
+"""
+JWKS Key Store
+
+Caches the auth service's public signing keys so the gateway can verify
+JWTs in-process. Keys are refreshed in the background and on demand when
+a token references an unknown key id (rate limited to avoid hammering
+auth with forged kids).
+"""
+
+import asyncio
+import json
+import logging
+import time
+from typing import Dict, Optional
+
+import httpx
+import jwt
+from jwt.algorithms import RSAAlgorithm
+
+logger = logging.getLogger(__name__)
+
+
+class KeysUnavailableError(Exception):
+    """Raised when no verification keys have been loaded yet"""
+    pass
+
+
+class JWKSKeyStore:
+    """
+    In-memory cache of JWT verification keys fetched from a JWKS URL.
+
+    Args:
+        jwks_url: URL of the auth service's JWKS document
+        algorithms: Accepted JWT algorithms
+        refresh_interval: Seconds between background refreshes
+        min_refresh_interval: Minimum seconds between on-demand refreshes
+    """
+
+    def __init__(self, jwks_url: str, algorithms=("RS256",), refresh_interval: int = 300,
+                 min_refresh_interval: int = 30):
+        self.jwks_url = jwks_url
+        self.algorithms = list(algorithms)
+        self.refresh_interval = refresh_interval
+        self.min_refresh_interval = min_refresh_interval
+        self.keys: Dict[str, object] = {}
+        self.last_refresh = 0.0
+        self._refresh_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def refresh(self, client: httpx.AsyncClient) -> bool:
+        """
+        Fetch the JWKS document and replace the cached keys.
+
+        Returns:
+            True if keys were loaded, False on failure (old keys are kept)
+        """
+        if self._refresh_lock is None:
+            # Created lazily so it binds to the server's running event loop
+            self._refresh_lock = asyncio.Lock()
+        async with self._refresh_lock:
+            try:
+                response = await client.get(self.jwks_url, timeout=5.0)
+                response.raise_for_status()
+                keys = {}
+                for jwk in response.json().get("keys", []):
+                    if jwk.get("kty") != "RSA" or "kid" not in jwk:
+                        continue
+                    keys[jwk["kid"]] = RSAAlgorithm.from_jwk(json.dumps(jwk))
+                self.keys = keys
+                self.last_refresh = time.monotonic()
+                logger.info(f"Loaded {len(keys)} JWT verification keys from {self.jwks_url}")
+                return True
+            except (httpx.HTTPError, ValueError, KeyError) as e:
+                self.last_refresh = time.monotonic()
+                logger.error(f"Failed to refresh JWKS from {self.jwks_url}: {e}")
+                return False
+
+    async def _get_key(self, kid: Optional[str], client: httpx.AsyncClient):
+        key = self.keys.get(kid) if kid else None
+        if key is None and time.monotonic() - self.last_refresh >= self.min_refresh_interval:
+            # Unknown kid usually means auth rotated keys since the last refresh
+            await self.refresh(client)
+            key = self.keys.get(kid) if kid else None
+        if not self.keys:
+            raise KeysUnavailableError("No JWT verification keys loaded")
+        return key
+
+    async def verify(self, token: str, client: httpx.AsyncClient) -> Dict:
+        """
+        Verify a JWT locally against the cached keys.
+
+        Args:
+            token: Encoded JWT
+            client: HTTP client used if a refresh is needed
+
+        Returns:
+            Decoded token payload
+
+        Raises:
+            KeysUnavailableError: If no keys could be loaded
+            jwt.InvalidTokenError: If the token is invalid or expired
+        """
+        kid = jwt.get_unverified_header(token).get("kid")
+        key = await self._get_key(kid, client)
+        if key is None:
+            raise jwt.InvalidTokenError("Unknown signing key")
+        return jwt.decode(token, key, algorithms=self.algorithms)
+
+    async def _refresh_loop(self, client: httpx.AsyncClient):
+        while True:
+            await asyncio.sleep(self.refresh_interval if self.keys else self.min_refresh_interval)
+            await self.refresh(client)
+
+    def start(self, client: httpx.AsyncClient):
+        """Start the background refresh task"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh_loop(client))
+
+    async def stop(self):
+        """Cancel the background refresh task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
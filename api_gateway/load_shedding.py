@@ -0,0 +1,202 @@
+"""
+Adaptive Concurrency Limiting and Load Shedding
+
+Each upstream gets a concurrency limit that follows its observed
+latency (a gradient limiter in the style of Netflix's Gradient2): while
+response times stay near the long-term baseline the limit grows, and
+when they rise the limit shrinks before the Flask service tips over.
+
+Requests over the limit wait in a priority queue. Writes that matter
+most (new orders and procurements) are admitted first, low-priority
+bulk reads only get a share of the limit, and whatever cannot be
+admitted in time is shed with 503 and Retry-After.
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+from enum import IntEnum
+from typing import Dict, Optional
+
+
+class Priority(IntEnum):
+    """Admission priority, lower value is admitted first"""
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class LoadShedError(Exception):
+    """Raised when a request is rejected to protect an overloaded upstream"""
+
+    def __init__(self, upstream: str, priority: Priority, retry_after: int):
+        super().__init__(f"{upstream} is overloaded, {priority.name.lower()} priority request shed")
+        self.upstream = upstream
+        self.priority = priority
+        self.retry_after = retry_after
+
+
+class AdaptiveLimiter:
+    """
+    Latency-driven concurrency limit with a priority wait queue.
+
+    Args:
+        name: Upstream name, used in errors
+        initial_limit: Starting concurrency limit
+        min_limit: Limit never drops below this
+        max_limit: Limit never grows above this (usually the pool size)
+        tolerance: Latency increase over the baseline tolerated before shrinking
+        smoothing: Weight of each new limit estimate (0-1)
+        low_priority_share: Fraction of the limit LOW requests may occupy
+        max_queue: Maximum requests waiting for a slot
+        queue_timeouts: Seconds each priority may wait before being shed
+        retry_after: Retry-After seconds sent with shed requests
+    """
+
+    LONG_WINDOW = 600
+    SHORT_WINDOW = 10
+
+    def __init__(self, name: str, initial_limit: int = 10, min_limit: int = 2, max_limit: int = 20,
+                 tolerance: float = 1.5, smoothing: float = 0.2, low_priority_share: float = 0.75,
+                 max_queue: int = 100, queue_timeouts: Optional[Dict[Priority, float]] = None,
+                 retry_after: int = 1):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.limit = float(min(max(initial_limit, min_limit), self.max_limit))
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self.low_priority_share = low_priority_share
+        self.max_queue = max_queue
+        self.queue_timeouts = queue_timeouts or {Priority.HIGH: 5.0, Priority.NORMAL: 2.0, Priority.LOW: 0.5}
+        self.retry_after = retry_after
+
+        self.in_flight = 0
+        self._long_rtt = 0.0
+        self._short_rtt = 0.0
+        self._waiters = []
+        self._sequence = itertools.count()
+        self.stats = {"admitted": 0, "queued": 0, "dropped": 0,
+                      "shed": {p.name.lower(): 0 for p in Priority}}
+
+    # ---------- admission ----------
+
+    def _capacity(self, priority: Priority) -> float:
+        if priority == Priority.LOW:
+            return max(1.0, self.limit * self.low_priority_share)
+        return self.limit
+
+    def _first_waiting(self) -> Optional[Priority]:
+        while self._waiters and self._waiters[0][2].done():
+            heapq.heappop(self._waiters)
+        return self._waiters[0][0] if self._waiters else None
+
+    def _shed(self, priority: Priority) -> LoadShedError:
+        self.stats["shed"][priority.name.lower()] += 1
+        return LoadShedError(self.name, priority, self.retry_after)
+
+    def _make_room(self, priority: Priority) -> bool:
+        """Shed the lowest-priority waiter to queue a more important request"""
+        pending = [w for w in self._waiters if not w[2].done()]
+        if len(pending) < self.max_queue:
+            return True
+        victim = max(pending, key=lambda w: (w[0], w[1]))
+        if victim[0] <= priority:
+            return False
+        victim[2].set_exception(self._shed(Priority(victim[0])))
+        return True
+
+    async def acquire(self, priority: Priority = Priority.NORMAL):
+        """
+        Wait for a slot, highest priority first.
+
+        Raises:
+            LoadShedError: No slot became free within the priority's queue timeout
+        """
+        first_waiting = self._first_waiting()
+        if self.in_flight < self._capacity(priority) and (first_waiting is None or first_waiting > priority):
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            return
+
+        timeout = self.queue_timeouts.get(priority, 0)
+        if timeout <= 0 or not self._make_room(priority):
+            raise self._shed(priority)
+
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._sequence), future])
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                raise self._shed(priority)
+        except asyncio.CancelledError:
+            # A slot granted while the caller went away must be handed back
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release(None)
+            else:
+                future.cancel()
+            raise
+        if future.exception() is not None:
+            raise future.exception()
+
+    def _wake(self):
+        while True:
+            priority = self._first_waiting()
+            if priority is None or self.in_flight >= self._capacity(priority):
+                return
+            _, _, future = heapq.heappop(self._waiters)
+            self.in_flight += 1
+            self.stats["admitted"] += 1
+            future.set_result(None)
+
+    def release(self, rtt: Optional[float], dropped: bool = False):
+        """
+        Free a slot and feed the latency sample into the limit.
+
+        Args:
+            rtt: Seconds the upstream took to answer (None: no sample)
+            dropped: The call timed out, back off the limit
+        """
+        self.in_flight -= 1
+        if dropped:
+            self.stats["dropped"] += 1
+            self.limit = max(self.min_limit, self.limit * 0.9)
+        elif rtt is not None:
+            self._update_limit(rtt)
+        self._wake()
+
+    # ---------- limit estimation ----------
+
+    def _update_limit(self, rtt: float):
+        if self._long_rtt == 0.0:
+            self._long_rtt = self._short_rtt = rtt
+            return
+        self._short_rtt += (rtt - self._short_rtt) / self.SHORT_WINDOW
+        self._long_rtt += (rtt - self._long_rtt) / self.LONG_WINDOW
+
+        # Let the baseline recover quickly after a sustained latency drop
+        if self._long_rtt / self._short_rtt > 2:
+            self._long_rtt *= 0.95
+
+        # Service is mostly idle, latency says nothing about the limit
+        if self.in_flight < self.limit / 2:
+            return
+
+        gradient = max(0.5, min(1.0, self.tolerance * self._long_rtt / self._short_rtt))
+        estimate = self.limit * gradient + math.sqrt(self.limit)
+        limit = self.limit * (1 - self.smoothing) + estimate * self.smoothing
+        self.limit = max(self.min_limit, min(self.max_limit, limit))
+
+    def get_stats(self) -> Dict:
+        return dict(
+            self.stats,
+            shed=dict(self.stats["shed"]),
+            limit=round(self.limit, 2),
+            in_flight=self.in_flight,
+            waiting=sum(1 for w in self._waiters if not w[2].done()),
+            latency_ms={"short": round(self._short_rtt * 1000, 2), "long": round(self._long_rtt * 1000, 2)},
+        )
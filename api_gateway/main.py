@@ -1,16 +1,101 @@
 from fastapi import FastAPI, HTTPException, Request, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
 import httpx
-from typing import Optional
+import inspect
+import json
+import math
+import jwt
+import time
+from typing import AsyncIterator, List, Optional, Tuple, Union
+from jwks import JWKSKeyStore, KeysUnavailableError
+from events import EventListener
+from token_cache import TokenCache, redis_revoked
+from entity_cache import EntityReadThrough
+from redis_client import close_redis
+from response_cache import ResponseCache, CachePolicy, CachedResponse, make_cache_key, etag_matches
+from coalescing import SingleFlight
+from upstreams import Upstream, UpstreamRegistry
+from load_shedding import AdaptiveLimiter, LoadShedError, Priority
+from circuit_breaker import Bulkhead, CircuitBreaker, UpstreamRejectedError
+from batch import parse_batch, run_batch
+from dashboard import build_dashboard
+from compression import supported_encodings, negotiate, is_compressible, compress_async, compress_stream
+from rate_limit import BucketSpec, RouteRule, RateLimiter, RateLimitHeadersMiddleware, client_ip
+from hedging import Hedger, RetryBudget
+from streaming import EventStream, StreamLimitError
+from workers import exit_callbacks
+from routes import Route, build_routes
+from metrics import REGISTRY, AUTH_LATENCY, MetricsMiddleware, SharedMetrics
 from config import (
-    AUTH_SERVICE_URL,
-    SUPPLIER_SERVICE_URL,
-    CUSTOMER_SERVICE_URL,
-    PRODUCT_SERVICE_URL,
-    INVENTORY_SERVICE_URL,
-    PROCUREMENT_SERVICE_URL,
-    ORDER_SERVICE_URL
+    SERVICE_URLS,
+    upstream_pool_settings,
+    load_balancing_settings,
+    LB_HEALTH_CHECK_INTERVAL,
+    LB_HEALTH_CHECK_TIMEOUT,
+    CONCURRENCY_LIMIT_ENABLED,
+    concurrency_limit_settings,
+    QUEUE_TIMEOUT_HIGH,
+    QUEUE_TIMEOUT_NORMAL,
+    QUEUE_TIMEOUT_LOW,
+    CIRCUIT_BREAKER_ENABLED,
+    circuit_breaker_settings,
+    bulkhead_settings,
+    HEDGING_ENABLED,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_DELAY,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_WINDOW,
+    RETRY_MAX_ATTEMPTS,
+    RETRY_BUDGET_RATIO,
+    RETRY_BUDGET_MIN_PER_SECOND,
+    RETRY_BUDGET_WINDOW,
+    DEADLINE_PROPAGATION_ENABLED,
+    DEADLINE_MIN_CLIENT_BUDGET,
+    AUTH_JWKS_URL,
+    JWT_ALGORITHMS,
+    JWKS_REFRESH_INTERVAL,
+    JWKS_MIN_REFRESH_INTERVAL,
+    TOKEN_CACHE_ENABLED,
+    TOKEN_CACHE_MAX_ENTRIES,
+    TOKEN_LIFETIME,
+    RESPONSE_CACHE_ENABLED,
+    RESPONSE_CACHE_USE_REDIS,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_MAX_BYTES,
+    RESPONSE_CACHE_MAX_BODY_BYTES,
+    RESPONSE_CACHE_STALE_TTL,
+    RESPONSE_CACHE_TTLS,
+    COALESCING_ENABLED,
+    ROUTE_POLICIES,
+    METRICS_DIR,
+    METRICS_FLUSH_INTERVAL,
+    ENTITY_READ_THROUGH_ENABLED,
+    ENTITY_READ_THROUGH_TYPES,
+    COMPRESSION_ENABLED,
+    COMPRESSION_MIN_SIZE,
+    COMPRESSION_ENCODINGS,
+    RATE_LIMIT_ENABLED,
+    RATE_LIMIT_USER,
+    RATE_LIMIT_IP,
+    RATE_LIMIT_ROUTES,
+    RATE_LIMIT_LOCAL_FRACTION,
+    RATE_LIMIT_LOCAL_MAX_AGE,
+    RATE_LIMIT_FAIL_OPEN,
+    RATE_LIMIT_TRUSTED_PROXIES,
+    SSE_ENABLED,
+    SSE_REPLAY_SIZE,
+    SSE_CLIENT_QUEUE_SIZE,
+    SSE_HEARTBEAT,
+    SSE_MAX_CLIENTS,
+    SSE_RETRY,
+    BATCH_MAX_REQUESTS,
+    BATCH_MAX_CONCURRENCY,
+    BATCH_ITEM_TIMEOUT,
+    DASHBOARD_SECTION_TIMEOUT,
+    DASHBOARD_LOW_STOCK_THRESHOLD,
+    DASHBOARD_RECENT_LIMIT
 )
 
 app = FastAPI(
@@ -19,6 +104,26 @@ app = FastAPI(
     version="2.0.0"
 )
 
+@app.exception_handler(LoadShedError)
+async def load_shed_handler(request: Request, exc: LoadShedError):
+    """Requests shed by an upstream's concurrency limiter get 503 with Retry-After"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Service overloaded, retry in {exc.retry_after}s"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+@app.exception_handler(UpstreamRejectedError)
+async def upstream_rejected_handler(request: Request, exc: UpstreamRejectedError):
+    """Calls refused by an open circuit or a full bulkhead fail fast with 503 and Retry-After"""
+    return JSONResponse(
+        status_code=503,
+        content={"detail": f"Service unavailable: {exc}"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -28,12 +133,115 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# HTTP client
-client = httpx.AsyncClient(timeout=30.0)
+# RateLimit-* headers on every rate-limited response
+app.add_middleware(RateLimitHeadersMiddleware)
+
+# Per-route request counts and latency (outermost, so it sees the final status)
+app.add_middleware(MetricsMiddleware)
+
+def build_limiter(name: str, max_connections: int) -> Optional[AdaptiveLimiter]:
+    """Adaptive concurrency limiter for one service, capped at its pool size"""
+    if not CONCURRENCY_LIMIT_ENABLED:
+        return None
+    settings = concurrency_limit_settings(name)
+    settings["max_limit"] = min(settings["max_limit"], max_connections)
+    return AdaptiveLimiter(
+        name,
+        queue_timeouts={
+            Priority.HIGH: QUEUE_TIMEOUT_HIGH,
+            Priority.NORMAL: QUEUE_TIMEOUT_NORMAL,
+            Priority.LOW: QUEUE_TIMEOUT_LOW,
+        },
+        **settings
+    )
+
+
+# One connection pool, concurrency limit, circuit breaker and bulkhead per backing
+# service, balanced over its replicas
+upstreams = UpstreamRegistry()
+for name, urls in SERVICE_URLS.items():
+    pool_settings = upstream_pool_settings(name)
+    upstreams[name] = Upstream(
+        name, urls,
+        limiter=build_limiter(name, pool_settings["max_connections"]),
+        balancing=load_balancing_settings(name),
+        breaker=CircuitBreaker(name, **circuit_breaker_settings(name)) if CIRCUIT_BREAKER_ENABLED else None,
+        bulkhead=Bulkhead(name, **bulkhead_settings(name)) if CIRCUIT_BREAKER_ENABLED else None,
+        **pool_settings
+    )
+auth_client = upstreams["auth"].client
+
+# Idempotent GETs are hedged past their route's latency percentile and retried on
+# connect errors, within a retry budget shared by all upstreams
+hedger = Hedger(
+    RetryBudget(ratio=RETRY_BUDGET_RATIO, min_per_second=RETRY_BUDGET_MIN_PER_SECOND, window=RETRY_BUDGET_WINDOW),
+    hedging=HEDGING_ENABLED,
+    percentile=HEDGE_PERCENTILE,
+    min_delay=HEDGE_MIN_DELAY,
+    min_samples=HEDGE_MIN_SAMPLES,
+    window=HEDGE_WINDOW,
+    max_retries=RETRY_MAX_ATTEMPTS
+)
+
+# Auth service public keys for local JWT verification
+key_store = JWKSKeyStore(
+    AUTH_JWKS_URL,
+    algorithms=JWT_ALGORITHMS,
+    refresh_interval=JWKS_REFRESH_INTERVAL,
+    min_refresh_interval=JWKS_MIN_REFRESH_INTERVAL
+)
 
+# Redis pub/sub subscription shared by gateway components
+event_listener = EventListener()
 
-async def verify_token(authorization: Optional[str] = Header(None)):
+# Cached GET responses, invalidated from the services' *_events channels
+response_cache = ResponseCache(
+    max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+    max_bytes=RESPONSE_CACHE_MAX_BYTES,
+    max_body_bytes=RESPONSE_CACHE_MAX_BODY_BYTES,
+    use_redis=RESPONSE_CACHE_USE_REDIS,
+    stale_ttl=RESPONSE_CACHE_STALE_TTL
+)
+if RESPONSE_CACHE_ENABLED:
+    event_listener.add_handler(response_cache.channels, response_cache.handle_event)
+
+# Validated bearer tokens, evicted on auth's revocation broadcasts
+token_cache = TokenCache(
+    max_entries=TOKEN_CACHE_MAX_ENTRIES,
+    user_revocation_ttl=TOKEN_LIFETIME
+) if TOKEN_CACHE_ENABLED else None
+if token_cache is not None:
+    event_listener.add_handler(token_cache.channels, token_cache.handle_event)
+    event_listener.add_subscribe_hook(token_cache.clear)
+
+# Live service events for /api/stream clients, from the same subscription
+event_stream = EventStream(
+    replay_size=SSE_REPLAY_SIZE,
+    client_queue_size=SSE_CLIENT_QUEUE_SIZE,
+    heartbeat=SSE_HEARTBEAT,
+    max_clients=SSE_MAX_CLIENTS,
+    retry=SSE_RETRY
+) if SSE_ENABLED else None
+if event_stream is not None:
+    event_listener.add_handler(event_stream.channels, event_stream.handle_event)
+    exit_callbacks.append(event_stream.shutdown)
+
+# Single-entity GETs answered from the services' own Redis entity cache
+entity_reader = EntityReadThrough(ENTITY_READ_THROUGH_TYPES) if ENTITY_READ_THROUGH_ENABLED else None
+
+# Identical concurrent GETs share one upstream call
+single_flight = SingleFlight()
+
+# Content codings offered to clients, most preferred first
+compression_encodings = tuple(e for e in COMPRESSION_ENCODINGS if e in supported_encodings())
+
+
+async def verify_token(request: Request, authorization: Optional[str] = Header(None)):
     """JWT token verification middleware"""
+    # Sub-requests of /api/batch were authenticated once for the whole batch
+    if getattr(request.state, "batch_authenticated", False):
+        return request.state.user
+    
     # Skip auth for public endpoints
     if not authorization:
         return None
@@ -43,226 +251,654 @@ async def verify_token(authorization: Optional[str] = Header(None)):
     
     token = authorization.split(" ")[1]
     
+    started = time.perf_counter()
+    # Cached tokens are only trusted while revocation announcements are being heard
+    if token_cache is not None and event_listener.connected:
+        payload = token_cache.get(token)
+        if payload is not None:
+            AUTH_LATENCY.observe(time.perf_counter() - started, "cached", "valid")
+            request.state.user = payload
+            return payload
+    
+    method = "local"
     try:
-        # Validate token with auth service
-        response = await client.post(
-            f"{AUTH_SERVICE_URL}/auth/validate",
-            json={"token": token},
-            timeout=5.0
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            if result.get("valid"):
-                return result.get("payload")
-        
+        payload = await key_store.verify(token, auth_client)
+    except KeysUnavailableError:
+        # Auth keys not loaded yet, fall back to remote validation
+        method = "remote"
+        try:
+            payload = await validate_token_remote(token)
+        except HTTPException:
+            AUTH_LATENCY.observe(time.perf_counter() - started, method, "invalid")
+            raise
+    except jwt.InvalidTokenError:
+        AUTH_LATENCY.observe(time.perf_counter() - started, method, "invalid")
         raise HTTPException(status_code=401, detail="Invalid or expired token")
-        
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=503, detail=f"Auth service unavailable: {str(e)}")
-
-
-async def proxy_request(service_url: str, path: str, request: Request, params: dict = None):
-    """Generic proxy function to forward requests to microservices"""
-    url = f"{service_url}{path}"
-    
-    # Forward Authorization header if present
-    headers = {}
-    if "authorization" in request.headers:
-        headers["Authorization"] = request.headers["authorization"]
+    if token_cache is not None:
+        revoked = not await token_cache.admit(token, payload)
+    else:
+        revoked = await redis_revoked(token, payload)
+    if revoked:
+        AUTH_LATENCY.observe(time.perf_counter() - started, method, "revoked")
+        raise HTTPException(status_code=401, detail="Token has been revoked")
+    AUTH_LATENCY.observe(time.perf_counter() - started, method, "valid")
     
-    try:
-        if request.method == "GET":
-            response = await client.get(url, params=params, headers=headers)
-        elif request.method == "POST":
-            body = await request.json()
-            response = await client.post(url, json=body, params=params, headers=headers)
-        elif request.method == "PUT":
-            body = await request.json()
-            response = await client.put(url, json=body, params=params, headers=headers)
-        elif request.method == "DELETE":
-            response = await client.delete(url, params=params, headers=headers)
-        else:
-            raise HTTPException(status_code=405, detail="Method not allowed")
-        
-        return JSONResponse(content=response.json(), status_code=response.status_code)
-    except httpx.RequestError as e:
-        raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
-
-
-# ==================== Health Check ====================
-@app.get("/health")
-async def health_check():
-    return {"status": "healthy", "service": "api_gateway", "version": "2.0.0"}
-
-
-# ==================== Auth Endpoints (Public - No Auth Required) ====================
-@app.post("/api/auth/register")
-async def register(request: Request):
-    return await proxy_request(AUTH_SERVICE_URL, "/auth/register", request)
-
-@app.post("/api/auth/login")
-async def login(request: Request):
-    return await proxy_request(AUTH_SERVICE_URL, "/auth/login", request)
-
-@app.post("/api/auth/validate")
-async def validate_token_endpoint(request: Request):
-    return await proxy_request(AUTH_SERVICE_URL, "/auth/validate", request)
-
-
-# ==================== Product Endpoints ====================
-@app.get("/api/products")
-async def get_products(request: Request, start: Optional[int] = 0, limit: Optional[int] = 50, user=Depends(verify_token)):
-    return await proxy_request(PRODUCT_SERVICE_URL, "/products", request, {"start": start, "limit": limit})
-
-@app.post("/api/products")
-async def create_product(request: Request, user=Depends(verify_token)):
-    return await proxy_request(PRODUCT_SERVICE_URL, "/products", request)
-
-@app.get("/api/products/{product_id}")
-async def get_product(product_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(PRODUCT_SERVICE_URL, f"/products/{product_id}", request)
-
-@app.put("/api/products/{product_id}")
-async def update_product(product_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(PRODUCT_SERVICE_URL, f"/products/{product_id}", request)
-
-@app.delete("/api/products/{product_id}")
-async def delete_product(product_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(PRODUCT_SERVICE_URL, f"/products/{product_id}", request)
-
-
-# ==================== Supplier Endpoints ====================
-@app.get("/api/suppliers")
-async def get_suppliers(request: Request, start: Optional[int] = 0, limit: Optional[int] = 50, user=Depends(verify_token)):
-    return await proxy_request(SUPPLIER_SERVICE_URL, "/suppliers", request, {"start": start, "limit": limit})
+    request.state.user = payload
+    return payload
 
-@app.post("/api/suppliers")
-async def create_supplier(request: Request, user=Depends(verify_token)):
-    return await proxy_request(SUPPLIER_SERVICE_URL, "/suppliers", request)
 
-@app.get("/api/suppliers/{supplier_id}")
-async def get_supplier(supplier_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(SUPPLIER_SERVICE_URL, f"/suppliers/{supplier_id}", request)
+# Per-user, per-IP and per-route token buckets shared by all replicas through Redis
+rate_limiter = RateLimiter(
+    user_bucket=BucketSpec(*RATE_LIMIT_USER),
+    ip_bucket=BucketSpec(*RATE_LIMIT_IP),
+    route_rules=[RouteRule(name, routes, BucketSpec(*bucket))
+                 for name, (routes, bucket) in RATE_LIMIT_ROUTES.items()],
+    local_fraction=RATE_LIMIT_LOCAL_FRACTION,
+    local_max_age=RATE_LIMIT_LOCAL_MAX_AGE,
+    fail_open=RATE_LIMIT_FAIL_OPEN
+) if RATE_LIMIT_ENABLED else None
 
-@app.put("/api/suppliers/{supplier_id}")
-async def update_supplier(supplier_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(SUPPLIER_SERVICE_URL, f"/suppliers/{supplier_id}", request)
+# Operational endpoints that are never rate limited
+RATE_LIMIT_EXEMPT_PATHS = frozenset({"/health", "/metrics"})
 
-@app.delete("/api/suppliers/{supplier_id}")
-async def delete_supplier(supplier_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(SUPPLIER_SERVICE_URL, f"/suppliers/{supplier_id}", request)
 
-@app.get("/api/suppliers/city/{city}")
-async def get_suppliers_by_city(city: str, request: Request, user=Depends(verify_token)):
-    return await proxy_request(SUPPLIER_SERVICE_URL, f"/suppliers/city/{city}", request)
+async def enforce_rate_limit(request: Request, user=Depends(verify_token)):
+    """Charge the request to the caller's buckets, rejecting it with 429 when one is empty"""
+    if rate_limiter is None or request.url.path in RATE_LIMIT_EXEMPT_PATHS:
+        return
+    route = getattr(request.scope.get("route"), "path", None)
+    result = await rate_limiter.check(
+        request.method, route, user, client_ip(request.scope, RATE_LIMIT_TRUSTED_PROXIES)
+    )
+    if not result.allowed:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded", headers=result.headers)
+    request.state.rate_limit_headers = result.headers
 
 
-# ==================== Customer Endpoints ====================
-@app.get("/api/customers")
-async def get_customers(request: Request, start: Optional[int] = 0, limit: Optional[int] = 50, user=Depends(verify_token)):
-    return await proxy_request(CUSTOMER_SERVICE_URL, "/customers", request, {"start": start, "limit": limit})
+# Applies to every route registered below
+app.router.dependencies.append(Depends(enforce_rate_limit))
 
-@app.post("/api/customers")
-async def create_customer(request: Request, user=Depends(verify_token)):
-    return await proxy_request(CUSTOMER_SERVICE_URL, "/customers", request)
 
-@app.get("/api/customers/{customer_id}")
-async def get_customer(customer_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(CUSTOMER_SERVICE_URL, f"/customers/{customer_id}", request)
+def auth_scope(request: Request) -> str:
+    """Identity class a response may be shared within (requests are authorized per role)"""
+    user = getattr(request.state, "user", None)
+    if not user:
+        return "anonymous"
+    return f"role:{user.get('role', 'user')}"
 
-@app.put("/api/customers/{customer_id}")
-async def update_customer(customer_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(CUSTOMER_SERVICE_URL, f"/customers/{customer_id}", request)
-
-@app.delete("/api/customers/{customer_id}")
-async def delete_customer(customer_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(CUSTOMER_SERVICE_URL, f"/customers/{customer_id}", request)
-
-@app.get("/api/customers/city/{city}")
-async def get_customers_by_city(city: str, request: Request, user=Depends(verify_token)):
-    return await proxy_request(CUSTOMER_SERVICE_URL, f"/customers/city/{city}", request)
 
+async def validate_token_remote(token: str):
+    """Validate token with the auth service (used until JWKS keys are loaded)"""
+    try:
+        # Validate token with auth service
+        auth = upstreams["auth"]
+        response = await auth.send(auth.build_request(
+            "POST", "/auth/validate", json={"token": token}, timeout=5.0
+        ))
+        
+        if response.status_code == 200:
+            result = response.json()
+            if result.get("valid"):
+                return result.get("payload")
+        
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+        
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Auth service unavailable: {str(e)}")
 
-# ==================== Inventory Endpoints ====================
-@app.get("/api/inventory")
-@app.get("/api/storages")
-async def get_inventory(request: Request, start: Optional[int] = 0, limit: Optional[int] = 50, user=Depends(verify_token)):
-    return await proxy_request(INVENTORY_SERVICE_URL, "/storages", request, {"start": start, "limit": limit})
 
-@app.post("/api/inventory")
-@app.post("/api/storages")
-async def create_storage(request: Request, user=Depends(verify_token)):
-    return await proxy_request(INVENTORY_SERVICE_URL, "/storages", request)
+# Connection-level headers that must not be forwarded by a proxy (RFC 7230 section 6.1)
+HOP_BY_HOP_HEADERS = frozenset({
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "transfer-encoding", "upgrade", "host"
+})
 
-@app.get("/api/inventory/{storage_id}")
-@app.get("/api/storages/{storage_id}")
-async def get_storage(storage_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(INVENTORY_SERVICE_URL, f"/storages/{storage_id}", request)
 
-@app.put("/api/inventory/{storage_id}")
-@app.put("/api/storages/{storage_id}")
-async def update_storage(storage_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(INVENTORY_SERVICE_URL, f"/storages/{storage_id}", request)
+def filter_headers(raw_headers) -> list:
+    """Drop hop-by-hop headers from raw (bytes) header pairs, keeping repeated headers intact"""
+    return [(k, v) for k, v in raw_headers if k.decode("latin-1").lower() not in HOP_BY_HOP_HEADERS]
 
-@app.get("/api/inventory/product/{product_id}")
-@app.get("/api/storages/product/{product_id}")
-async def get_storage_by_product(product_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(INVENTORY_SERVICE_URL, f"/storages/product/{product_id}", request)
 
+def cache_policy(namespace: str, entity_id: int = None, ttl: int = None) -> Optional[CachePolicy]:
+    """Caching rules for a GET route of the given service namespace (ttl 0 disables caching)"""
+    if ttl is None:
+        ttl = RESPONSE_CACHE_TTLS[namespace]
+    if not RESPONSE_CACHE_ENABLED or ttl <= 0:
+        return None
+    return CachePolicy(namespace, ttl, entity_id)
 
-# ==================== Procurement Endpoints ====================
-@app.get("/api/procurements")
-@app.get("/api/supplytransactions")
-async def get_procurements(request: Request, start: Optional[int] = 0, limit: Optional[int] = 50, user=Depends(verify_token)):
-    return await proxy_request(PROCUREMENT_SERVICE_URL, "/procurements", request, {"start": start, "limit": limit})
 
-@app.post("/api/procurements")
-@app.post("/api/supplytransactions")
-async def create_procurement(request: Request, user=Depends(verify_token)):
-    return await proxy_request(PROCUREMENT_SERVICE_URL, "/procurements", request)
+def response_encoding(request: Request, content_type: Optional[str], content_encoding: Optional[str],
+                      length: Optional[int]) -> Optional[str]:
+    """
+    Content coding to apply to a response, or None to send it as is.
+    Already-encoded, small (below COMPRESSION_MIN_SIZE) and binary bodies are skipped.
+    """
+    if not COMPRESSION_ENABLED or content_encoding or not is_compressible(content_type):
+        return None
+    if length is not None and length < COMPRESSION_MIN_SIZE:
+        return None
+    return negotiate(request.headers.get("accept-encoding"), compression_encodings)
+
+
+async def buffered_response(entry: CachedResponse, request: Request, cache_status: Optional[str]) -> Response:
+    """
+    Build a response from a buffered upstream reply or cache entry.
+    For cached routes, answers 304 if the client's copy is current.
+    Compressed bodies are kept on the entry and reused by later requests.
+    """
+    body, etag, extra = entry.body, entry.etag, []
+    content_type = entry.header("content-type")
+    if entry.status_code not in (204, 304) and COMPRESSION_ENABLED and is_compressible(content_type):
+        extra.append((b"vary", b"Accept-Encoding"))
+        encoding = response_encoding(request, content_type, entry.header("content-encoding"), len(entry.body))
+        if encoding is not None:
+            body = entry.variants.get(encoding)
+            if body is None:
+                body = entry.variants[encoding] = await compress_async(entry.body, encoding)
+            # Each representation gets its own validator
+            etag = f'{entry.etag[:-1]}-{encoding}"'
+            extra.append((b"content-encoding", encoding.encode("latin-1")))
+    
+    if cache_status is None:
+        response = Response(content=body, status_code=entry.status_code)
+        response.raw_headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in entry.headers]
+        response.raw_headers += extra + [(b"content-length", str(len(body)).encode("latin-1"))]
+        return response
+    
+    validators = [
+        (b"etag", etag.encode("latin-1")),
+        (b"cache-control", b"private, no-cache"),
+        (b"x-cache", cache_status.encode("latin-1")),
+    ]
+    if entry.status_code == 200 and etag_matches(request.headers.get("if-none-match"), etag):
+        response = Response(status_code=304)
+        response.raw_headers = validators + [h for h in extra if h[0] == b"vary"]
+        return response
+    
+    response = Response(content=body, status_code=entry.status_code)
+    response.raw_headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in entry.headers]
+    response.raw_headers += validators + extra + [(b"content-length", str(len(body)).encode("latin-1"))]
+    return response
 
-@app.get("/api/procurements/product/{product_id}")
-@app.get("/api/supplytransactions/product/{product_id}")
-async def get_procurements_by_product(product_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(PROCUREMENT_SERVICE_URL, f"/procurements/product/{product_id}", request)
 
-@app.get("/api/procurements/supplier/{supplier_id}")
-@app.get("/api/supplytransactions/supplier/{supplier_id}")
-async def get_procurements_by_supplier(supplier_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(PROCUREMENT_SERVICE_URL, f"/procurements/supplier/{supplier_id}", request)
+def has_body(request: Request) -> bool:
+    return "content-length" in request.headers or "transfer-encoding" in request.headers
 
 
-# ==================== Order Endpoints ====================
-@app.get("/api/orders")
-@app.get("/api/customertransactions")
-async def get_orders(request: Request, start: Optional[int] = 0, limit: Optional[int] = 50, user=Depends(verify_token)):
-    return await proxy_request(ORDER_SERVICE_URL, "/orders", request, {"start": start, "limit": limit})
-
-@app.post("/api/orders")
-@app.post("/api/customertransactions")
-async def create_order(request: Request, user=Depends(verify_token)):
-    return await proxy_request(ORDER_SERVICE_URL, "/orders", request)
+DEADLINE_HEADER = b"x-request-deadline"
 
-@app.get("/api/orders/product/{product_id}")
-@app.get("/api/customertransactions/product/{product_id}")
-async def get_orders_by_product(product_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(ORDER_SERVICE_URL, f"/orders/product/{product_id}", request)
 
-@app.get("/api/orders/customer/{customer_id}")
-@app.get("/api/customertransactions/customer/{customer_id}")
-async def get_orders_by_customer(customer_id: int, request: Request, user=Depends(verify_token)):
-    return await proxy_request(ORDER_SERVICE_URL, f"/orders/customer/{customer_id}", request)
+def request_deadline(read_timeout: float, request: Request) -> float:
+    """
+    When the gateway stops waiting for the upstream, or the client's deadline if sooner.
+    The client's value is untrusted: it is ignored unless it is a finite number and never
+    leaves less than DEADLINE_MIN_CLIENT_BUDGET seconds.
+    """
+    now = time.time()
+    deadline = now + read_timeout
+    value = request.headers.get(DEADLINE_HEADER.decode())
+    if value is None:
+        return deadline
+    try:
+        client_deadline = float(value)
+    except ValueError:
+        return deadline
+    if not math.isfinite(client_deadline):
+        return deadline
+    return min(deadline, max(client_deadline, now + DEADLINE_MIN_CLIENT_BUDGET))
+
+
+def build_upstream_request(upstream: Upstream, path: str, request: Request, params,
+                           timeout: Optional[float] = None) -> httpx.Request:
+    """
+    Copy the client request for the upstream, streaming the body if one was sent.
+    Upstreams are asked for identity bodies; the gateway negotiates compression itself,
+    and told when the gateway will stop waiting for them (`timeout`, if set, replaces
+    the upstream's read timeout).
+    """
+    headers = [(k, v) for k, v in filter_headers(request.headers.raw)
+               if k.lower() not in (b"accept-encoding", DEADLINE_HEADER)]
+    headers.append((b"accept-encoding", b"identity"))
+    if DEADLINE_PROPAGATION_ENABLED:
+        deadline = request_deadline(timeout or upstream.read_timeout, request)
+        headers.append((DEADLINE_HEADER, f"{deadline:.3f}".encode()))
+    extra = {"timeout": upstream.timeout(timeout)} if timeout is not None else {}
+    return upstream.build_request(
+        request.method,
+        path,
+        params=params,
+        headers=headers,
+        content=request.stream() if has_body(request) else None,
+        **extra
+    )
+
+
+async def send_upstream(upstream: Upstream, path: str, request: Request, params,
+                        priority: Priority = Priority.NORMAL, timeout: Optional[float] = None,
+                        hedge: bool = True) -> httpx.Response:
+    """
+    Send the client request upstream and return the streamed reply.
+    Bodiless GET/HEADs can be replayed, so they are hedged and retried on connect errors.
+    """
+    if request.method in ("GET", "HEAD") and not has_body(request):
+        route = getattr(request.scope.get("route"), "path", path)
+        return await hedger.send(upstream, lambda: build_upstream_request(upstream, path, request, params, timeout),
+                                 route, priority, hedge=hedge)
+    return await upstream.send(build_upstream_request(upstream, path, request, params, timeout),
+                               stream=True, priority=priority)
+
+
+class UnbufferedReply:
+    """An upstream reply too large to buffer: the chunks read so far and the live stream"""
+    __slots__ = ("response", "head", "claimed")
+
+    def __init__(self, response: httpx.Response, head: List[bytes]):
+        self.response = response
+        self.head = head
+        self.claimed = False
+
+    def claim(self) -> bool:
+        """True for the one caller that may stream it; coalesced callers fetch their own"""
+        if self.claimed:
+            return False
+        self.claimed = True
+        return True
+
+
+async def fetch_buffered(upstream: Upstream, path: str, request: Request, params,
+                         cache: Optional[CachePolicy], cache_key: str,
+                         priority: Priority = Priority.NORMAL, timeout: Optional[float] = None,
+                         hedge: bool = True) -> Union[CachedResponse, UnbufferedReply]:
+    """
+    Send a request and buffer the raw reply, storing it if the route is cacheable.
+    Replies larger than the response cache accepts are not buffered but handed back
+    as an UnbufferedReply to be streamed.
+    """
+    response = await send_upstream(upstream, path, request, params, priority, timeout, hedge)
+    limit = response_cache.max_body_bytes
+    content_length = response.headers.get("content-length")
+    if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+        return UnbufferedReply(response, [])
+    chunks, size = [], 0
+    try:
+        async for chunk in response.aiter_raw():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size > limit:
+                return UnbufferedReply(response, chunks)
+    except BaseException:
+        await response.aclose()
+        raise
+    await response.aclose()
+    body = b"".join(chunks)
+    
+    entry = CachedResponse.build(response.status_code, response.headers.raw, body, cache)
+    if (cache is not None and response.status_code == 200
+            and "set-cookie" not in response.headers):
+        await response_cache.set(cache_key, entry, cache.ttl)
+    return entry
+
+
+async def _prepend(head: List[bytes], rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    for chunk in head:
+        yield chunk
+    async for chunk in rest:
+        yield chunk
+
+
+def stream_reply(request: Request, response: httpx.Response, head: List[bytes] = ()) -> StreamingResponse:
+    """Stream an upstream reply to the client (after `head`, chunks already read from it)"""
+    headers = filter_headers(response.headers.raw)
+    body = _prepend(head, response.aiter_raw()) if head else response.aiter_raw()
+    content_length = response.headers.get("content-length")
+    encoding = None
+    if request.method != "HEAD" and response.status_code not in (204, 304):
+        encoding = response_encoding(request, response.headers.get("content-type"),
+                                     response.headers.get("content-encoding"),
+                                     int(content_length) if content_length else None)
+    if encoding is not None:
+        headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+        headers += [(b"content-encoding", encoding.encode("latin-1")), (b"vary", b"Accept-Encoding")]
+        body = compress_stream(body, encoding)
+    
+    proxied = StreamingResponse(
+        body,
+        status_code=response.status_code,
+        background=BackgroundTask(response.aclose)
+    )
+    proxied.raw_headers = headers
+    return proxied
+
+
+async def proxy_request(upstream: Upstream, path: str, request: Request, params: dict = None,
+                        cache: CachePolicy = None, invalidates: tuple = (), coalesce: bool = True,
+                        priority: Priority = None, entity: Tuple[str, int] = None,
+                        timeout: Optional[float] = None, hedge: bool = True):
+    """
+    Generic proxy function to forward requests to microservices.
+
+    Request and response bodies are streamed through as raw bytes without
+    being parsed, so any method and content type passes through unchanged.
+    If params is given it replaces the client's query string.
+
+    GET/HEAD requests with a cache policy are served from the response
+    cache when possible, and concurrent identical ones (same path,
+    normalized query and auth scope) share one upstream call. Replies too
+    large to cache are streamed instead of buffered. Routes without a cache
+    policy always stream. Successful writes evict the `invalidates` namespaces.
+
+    Routes for a single `entity` (type, id) are read from the services'
+    Redis entity cache before calling the service; writes evict it.
+
+    Upstream calls are admitted by priority (default: NORMAL for writes,
+    LOW for reads); requests the upstream cannot take are shed with 503.
+    GETs are hedged on slow replies (unless `hedge` is False) and retried
+    on connect errors. `timeout` replaces the upstream's read timeout.
+    While the upstream's circuit is open (or its bulkhead is full), cached
+    routes are answered from a stale entry if one is left, others fail fast.
+    """
+    if params is None:
+        params = request.url.query.encode("latin-1")
+    if priority is None:
+        priority = Priority.LOW if request.method in ("GET", "HEAD") else Priority.NORMAL
+    
+    cacheable = cache is not None and request.method in ("GET", "HEAD")
+    # Only replies that are buffered anyway (for the cache) are shared
+    coalesce = coalesce and COALESCING_ENABLED and cacheable and request.method == "GET"
+    if cacheable or coalesce:
+        request_key = make_cache_key(path, params)
+    
+    if cacheable:
+        entry = await response_cache.get(request_key)
+        if entry is not None:
+            return await buffered_response(entry, request, "HIT")
+    
+    read_through = entity is not None and entity_reader is not None
+    if request.method == "GET" and (cacheable or coalesce or read_through):
+        # Buffered path: the reply is stored and shared with coalesced callers
+        async def fetch():
+            if read_through:
+                body = await entity_reader.get(*entity)
+                if body is not None:
+                    entry = CachedResponse.build(200, [(b"content-type", b"application/json")], body, cache)
+                    if cacheable:
+                        await response_cache.set(request_key, entry, cache.ttl)
+                    return entry
+                if not cacheable:
+                    # Nothing to store: stream the service's reply with its own headers
+                    return None
+            return await fetch_buffered(upstream, path, request, params, cache,
+                                        request_key if cacheable else None, priority, timeout, hedge)
+        
+        try:
+            if coalesce:
+                entry = await single_flight.do(("GET", request_key, auth_scope(request)), fetch)
+            else:
+                entry = await fetch()
+        except httpx.RequestError as e:
+            raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+        except UpstreamRejectedError:
+            stale = await response_cache.get_stale(request_key) if cacheable else None
+            if stale is None:
+                raise
+            return await buffered_response(stale, request, "STALE")
+        if isinstance(entry, CachedResponse):
+            return await buffered_response(entry, request, "MISS" if cacheable else None)
+        if entry is not None and entry.claim():
+            return stream_reply(request, entry.response, entry.head)
+        # Not buffered, or a coalesced caller is already streaming that reply: fetch our own below
+    
+    try:
+        response = await send_upstream(upstream, path, request, params, priority, timeout, hedge)
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Service unavailable: {str(e)}")
+    
+    if invalidates and RESPONSE_CACHE_ENABLED and response.status_code < 400:
+        await response_cache.invalidate_namespaces(invalidates)
+    if entity is not None and entity_reader is not None and response.status_code < 400:
+        await entity_reader.evict(*entity)
+    
+    return stream_reply(request, response)
 
 
-# Health check endpoint
+# ==================== Health Check ====================
 @app.get("/health")
-async def health():
-    return {"status": "healthy", "service": "api_gateway"}
+async def health_check():
+    open_circuits = [name for name, u in upstreams.items() if u.breaker is not None and u.breaker.is_open]
+    return {
+        "status": "degraded" if open_circuits else "healthy",
+        "open_circuits": open_circuits,
+        "service": "api_gateway",
+        "version": "2.0.0",
+        "upstreams": upstreams.get_stats(),
+        "response_cache": response_cache.get_stats(),
+        "coalescing": single_flight.get_stats(),
+        "token_cache": token_cache.get_stats() if token_cache is not None else None,
+        "hedging": hedger.get_stats(),
+        "event_stream": event_stream.get_stats() if event_stream is not None else None,
+        "rate_limit": rate_limiter.get_stats() if rate_limiter is not None else None
+    }
+
+
+# ==================== Metrics ====================
+def collect_upstreams():
+    """Pool occupancy and concurrency limits, read at scrape time"""
+    for name, stats in upstreams.get_stats().items():
+        labels = {"upstream": name}
+        yield "gateway_upstream_in_flight", labels, stats["in_flight"]
+        yield "gateway_upstream_max_connections", labels, stats["max_connections"]
+        if "open_connections" in stats:
+            yield "gateway_upstream_open_connections", labels, stats["open_connections"]
+            yield "gateway_upstream_idle_connections", labels, stats["idle_connections"]
+        if len(stats["replicas"]) > 1:
+            for replica in stats["replicas"]:
+                replica_labels = {"upstream": name, "replica": replica["url"]}
+                available = replica["healthy"] and not replica["ejected"]
+                yield "gateway_upstream_replica_available", replica_labels, int(available)
+                yield "gateway_upstream_replica_outstanding", replica_labels, replica["outstanding"]
+        concurrency = stats.get("concurrency")
+        if concurrency is not None:
+            yield "gateway_upstream_concurrency_limit", labels, concurrency["limit"]
+            yield "gateway_upstream_queued_requests", labels, concurrency["waiting"]
+        circuit = stats.get("circuit")
+        if circuit is not None:
+            for state in ("CLOSED", "OPEN", "HALF_OPEN"):
+                yield "gateway_upstream_circuit_state", {"upstream": name, "state": state.lower()}, \
+                    int(circuit["state"] == state)
+        bulkhead = stats.get("bulkhead")
+        if bulkhead is not None:
+            yield "gateway_upstream_bulkhead_active", labels, bulkhead["active"]
+
+
+def collect_caches():
+    """Response cache and coalescing totals"""
+    cache_stats = response_cache.get_stats()
+    for result in ("local_hits", "redis_hits", "misses", "stale_hits"):
+        yield "gateway_response_cache_lookups_total", {"result": result}, cache_stats[result]
+    coalescing = single_flight.get_stats()
+    yield "gateway_coalesced_requests_total", {"role": "leader"}, coalescing["leaders"]
+    yield "gateway_coalesced_requests_total", {"role": "follower"}, coalescing["coalesced"]
+
+
+REGISTRY.add_collector(collect_upstreams, {
+    "gateway_upstream_in_flight": "Calls currently outstanding to the service",
+    "gateway_upstream_max_connections": "Connection pool size",
+    "gateway_upstream_open_connections": "Open pooled connections",
+    "gateway_upstream_idle_connections": "Idle pooled connections",
+    "gateway_upstream_replica_available": "1 if the replica is healthy and not ejected",
+    "gateway_upstream_replica_outstanding": "Calls outstanding to the replica",
+    "gateway_upstream_concurrency_limit": "Current adaptive concurrency limit",
+    "gateway_upstream_queued_requests": "Requests waiting for a concurrency slot",
+    "gateway_upstream_circuit_state": "1 for the circuit breaker's current state",
+    "gateway_upstream_bulkhead_active": "Calls in progress counted by the bulkhead",
+})
+REGISTRY.add_collector(collect_caches, {
+    "gateway_response_cache_lookups_total": "Response cache lookups by result",
+    "gateway_coalesced_requests_total": "GETs that led or joined a shared upstream call",
+}, metric_type="counter")
+
+
+shared_metrics = SharedMetrics(REGISTRY, METRICS_DIR, METRICS_FLUSH_INTERVAL) if METRICS_DIR else None
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus text exposition of the gateway's metrics, merged across workers"""
+    body = shared_metrics.render() if shared_metrics is not None else REGISTRY.render()
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
+# ==================== Batch Endpoint ====================
+@app.post("/api/batch")
+async def batch(request: Request, user=Depends(verify_token)):
+    """Run several /api sub-requests concurrently and return all results in one response"""
+    try:
+        items = parse_batch(await request.json(), BATCH_MAX_REQUESTS)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    body = await run_batch(app, items, request.scope, user, BATCH_MAX_CONCURRENCY, BATCH_ITEM_TIMEOUT)
+    entry = CachedResponse.build(200, [(b"content-type", b"application/json")], body)
+    return await buffered_response(entry, request, None)
+
+
+# ==================== Dashboard Endpoint ====================
+@app.api_route("/api/dashboard", methods=["GET", "HEAD"])
+async def dashboard(request: Request, user=Depends(verify_token)):
+    """Dashboard KPIs composed from inventory, order, procurement and product in parallel"""
+    cache = cache_policy("dashboard")
+    if cache is not None:
+        entry = await response_cache.get("/dashboard")
+        if entry is not None:
+            return await buffered_response(entry, request, "HIT")
+    
+    async def compose():
+        result = await build_dashboard(
+            upstreams,
+            section_timeout=DASHBOARD_SECTION_TIMEOUT,
+            low_stock_threshold=DASHBOARD_LOW_STOCK_THRESHOLD,
+            recent_limit=DASHBOARD_RECENT_LIMIT,
+            propagate_deadline=DEADLINE_PROPAGATION_ENABLED
+        )
+        body = json.dumps(result).encode("utf-8")
+        entry = CachedResponse.build(200, [(b"content-type", b"application/json")], body, cache)
+        # A partial dashboard is served to the callers that waited for it, but not kept
+        if cache is not None and result["complete"]:
+            await response_cache.set("/dashboard", entry, cache.ttl)
+        return entry
+    
+    # The dashboard does not depend on the caller, so the fan-out is shared like the cache entry
+    entry = await single_flight.do(("dashboard",), compose)
+    return await buffered_response(entry, request, "MISS" if cache is not None else None)
+
+
+# ==================== Event Stream ====================
+@app.get("/api/stream")
+async def stream(request: Request, topics: Optional[str] = None, access_token: Optional[str] = None,
+                 user=Depends(verify_token)):
+    """
+    Server-Sent Events with live service events. `topics` is a comma-separated subset of
+    storage, alerts, orders and procurements (default: all). EventSource cannot send
+    headers, so browsers may pass their token as `access_token`.
+    Reconnects resume after the Last-Event-ID header when this worker still has the events.
+    """
+    if event_stream is None:
+        raise HTTPException(status_code=404, detail="Event stream is disabled")
+    if user is None and access_token:
+        user = await verify_token(request, f"Bearer {access_token}")
+    
+    wanted = frozenset(t.strip() for t in topics.split(",") if t.strip()) if topics else event_stream.topics
+    unknown = wanted - event_stream.topics
+    if unknown or not wanted:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown topics {sorted(unknown)}, expected {sorted(event_stream.topics)}")
+    try:
+        event_stream.check_capacity()
+    except StreamLimitError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    
+    return StreamingResponse(
+        event_stream.events(wanted, request.headers.get("last-event-id")),
+        media_type="text/event-stream",
+        # Proxies must pass events through as they come
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+# ==================== Proxied Routes ====================
+async def require_token(user=Depends(verify_token)):
+    """Reject requests without a bearer token on routes whose policy requires one"""
+    if user is None:
+        raise HTTPException(status_code=401, detail="Authentication required")
+    return user
+
+
+def route_handler(route: Route):
+    """
+    Handler proxying one route of the table to its service with the route's policy.
+    The signature is built from the route so FastAPI validates and documents its
+    path (ids are ints) and paging parameters.
+    """
+    upstream = upstreams[route.service]
+    policy = route.policy
+    
+    async def handler(request: Request, **values):
+        values.pop("user", None)
+        entity_id = values.get(route.id_param) if route.id_param else None
+        params = {"start": values["start"], "limit": values["limit"]} if route.paging else None
+        return await proxy_request(
+            upstream, route.target.format(**values), request, params,
+            cache=cache_policy(route.cache, entity_id, policy.cache_ttl) if route.cache else None,
+            invalidates=route.invalidates,
+            coalesce=policy.coalesce,
+            priority=policy.priority,
+            entity=(route.entity, entity_id) if route.entity else None,
+            timeout=policy.timeout,
+            hedge=policy.hedge
+        )
+    
+    keyword = inspect.Parameter.KEYWORD_ONLY
+    parameters = [inspect.Parameter("request", inspect.Parameter.POSITIONAL_OR_KEYWORD, annotation=Request)]
+    parameters += [inspect.Parameter(name, keyword, annotation=int if name.endswith("_id") else str)
+                   for name in route.path_params]
+    if route.paging:
+        parameters += [inspect.Parameter("start", keyword, default=0, annotation=Optional[int]),
+                       inspect.Parameter("limit", keyword, default=50, annotation=Optional[int])]
+    parameters.append(inspect.Parameter("user", keyword, default=Depends(require_token if policy.auth else verify_token)))
+    handler.__signature__ = inspect.Signature(parameters)
+    handler.__name__ = route.name
+    return handler
+
+
+for route in build_routes(ROUTE_POLICIES):
+    handler = route_handler(route)
+    for path in route.paths:
+        app.add_api_route(path, handler, methods=route.methods, name=route.name)
+
+
+# Load auth keys on startup
+@app.on_event("startup")
+async def startup_event():
+    await upstreams.warm_all()
+    upstreams.start_health_checks(LB_HEALTH_CHECK_INTERVAL, LB_HEALTH_CHECK_TIMEOUT)
+    await key_store.refresh(auth_client)
+    key_store.start(auth_client)
+    event_listener.start()
+    if shared_metrics is not None:
+        shared_metrics.start()
 
 
 # Cleanup on shutdown
 @app.on_event("shutdown")
 async def shutdown_event():
-    await client.aclose()
+    if event_stream is not None:
+        event_stream.shutdown()
+    await key_store.stop()
+    await event_listener.stop()
+    await upstreams.stop_health_checks()
+    await upstreams.close_all()
+    await close_redis()
+    if shared_metrics is not None:
+        await shared_metrics.stop()
 
@@ -0,0 +1,354 @@
+"""
+Gateway Metrics
+
+Minimal Prometheus-compatible counters and histograms rendered in the
+text exposition format at /metrics. Recording is a dict lookup and an
+integer increment (plus a bisect for histograms), with no locking since
+the gateway runs on a single event loop per worker.
+
+Values that already live elsewhere (pool occupancy, concurrency limits,
+cache stats) are read through collector callbacks at scrape time
+instead of being recorded on the hot path.
+
+Under gunicorn every worker process has its own registry. SharedMetrics
+has each worker write its samples to a directory shared by the server,
+and a scrape of any worker merges them: counters and histograms are
+summed over all workers, including exited ones so totals never go back
+when a worker is replaced, and gauges are reported per live worker.
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Request latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+AUTH_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05, 0.1, 0.5)
+
+# A collected sample: (metric name, labels, value)
+Sample = Tuple[str, Dict[str, str], float]
+# A metric family: (name, type, HELP text, samples)
+Family = Tuple[str, str, str, List[Sample]]
+
+
+def _format_labels(names: Sequence[str], values: Sequence) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values"""
+
+    type = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self) -> List[Sample]:
+        return [(self.name, dict(zip(self.labelnames, map(str, labels))), value)
+                for labels, value in self._values.items()]
+
+
+class Gauge(Counter):
+    """Value that goes up and down, keyed by a tuple of label values"""
+
+    type = "gauge"
+
+    def dec(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+
+class Histogram:
+    """Fixed-bucket histogram keyed by a tuple of label values"""
+
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last one is +Inf), sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        entry = self._values.get(labels)
+        if entry is None:
+            entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def collect(self) -> List[Sample]:
+        samples = []
+        bounds = self.buckets + (float("inf"),)
+        for labels, (counts, total) in self._values.items():
+            base = dict(zip(self.labelnames, map(str, labels)))
+            cumulative = 0
+            for bound, count in zip(bounds, counts):
+                cumulative += count
+                samples.append((f"{self.name}_bucket", dict(base, le=_format_value(bound)), cumulative))
+            samples.append((f"{self.name}_sum", base, total))
+            samples.append((f"{self.name}_count", base, cumulative))
+        return samples
+
+
+class Registry:
+    """Recorded metrics plus scrape-time gauge collectors"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors: List[Tuple[Callable[[], Iterable[Sample]], Dict[str, str], str]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect: Callable[[], Iterable[Sample]], descriptions: Dict[str, str],
+                      metric_type: str = "gauge"):
+        """
+        Register metrics read at scrape time.
+
+        Args:
+            collect: Returns (name, labels, value) samples
+            descriptions: HELP text per metric name
+            metric_type: 'gauge', or 'counter' for totals kept by the component
+        """
+        self._collectors.append((collect, descriptions, metric_type))
+
+    def collect(self) -> List[Family]:
+        families = [(metric.name, metric.type, metric.documentation, metric.collect())
+                    for metric in self._metrics]
+        for collect, descriptions, metric_type in self._collectors:
+            collected: Dict[str, List[Sample]] = {}
+            for name, labels, value in collect():
+                collected.setdefault(name, []).append((name, labels, value))
+            families.extend((name, metric_type, descriptions.get(name, name), samples)
+                            for name, samples in collected.items())
+        return families
+
+    def render(self) -> str:
+        return render_families(self.collect())
+
+
+def render_families(families: Iterable[Family]) -> str:
+    lines = []
+    for name, metric_type, documentation, samples in families:
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(f"{sample}{_format_labels(tuple(labels), tuple(labels.values()))} {_format_value(value)}"
+                     for sample, labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+
+def _snapshot_path(directory: str, pid: int) -> str:
+    return os.path.join(directory, f"{pid}.json")
+
+
+def _write_snapshot(path: str, families: List[Family]):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(families, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def mark_process_dead(directory: str, pid: int):
+    """
+    Drop the gauges of an exited worker, keeping its counters and histograms.
+    Called from gunicorn's child_exit hook.
+    """
+    path = _snapshot_path(directory, pid)
+    try:
+        with open(path) as f:
+            families = json.load(f)
+    except (OSError, ValueError):
+        return
+    _write_snapshot(path, [family for family in families if family[1] != "gauge"])
+
+
+def clear_directory(directory: str):
+    """Remove the snapshots of a previous server run (gunicorn's on_starting hook)"""
+    for path in glob.glob(os.path.join(directory, "*.json*")):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class SharedMetrics:
+    """
+    A worker's side of metrics shared through a directory.
+
+    The worker writes its registry to <directory>/<pid>.json every
+    `interval` seconds and before answering a scrape; render() merges the
+    snapshots of all workers. Counters lag by at most `interval` for the
+    other workers but never decrease.
+
+    Args:
+        registry: This worker's registry
+        directory: Directory shared by the workers of one server
+        interval: Seconds between snapshots
+    """
+
+    def __init__(self, registry: Registry, directory: str, interval: float = 1.0):
+        self.registry = registry
+        self.directory = directory
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self):
+        _write_snapshot(_snapshot_path(self.directory, os.getpid()), self.registry.collect())
+
+    def render(self) -> str:
+        self.write()
+        merged: Dict[str, Tuple[str, str, Dict[tuple, float]]] = {}
+        for path in sorted(glob.glob(os.path.join(self.directory, "*.json"))):
+            worker = os.path.basename(path)[:-len(".json")]
+            try:
+                with open(path) as f:
+                    families = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping metrics snapshot {path}: {e}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                values = merged.setdefault(name, (metric_type, documentation, {}))[2]
+                for sample, labels, value in samples:
+                    if metric_type == "gauge":
+                        labels = dict(labels, worker=worker)
+                    key = (sample, tuple(labels.items()))
+                    values[key] = values.get(key, 0) + value
+        return render_families(
+            (name, metric_type, documentation,
+             [(sample, dict(labels), value) for (sample, labels), value in values.items()])
+            for name, (metric_type, documentation, values) in merged.items())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.write()
+            except OSError as e:
+                logger.warning(f"Metrics snapshot failed: {e}")
+
+    def start(self):
+        """Start writing snapshots in the background"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the background task and write a final snapshot"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.write()
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.counter(
+    "gateway_http_requests_total", "Requests handled by the gateway",
+    ("route", "method", "status"))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "gateway_http_requests_in_flight", "Requests currently being handled")
+HTTP_LATENCY = REGISTRY.histogram(
+    "gateway_http_request_duration_seconds", "Time to send the full response",
+    ("route", "method"))
+UPSTREAM_REQUESTS = REGISTRY.counter(
+    "gateway_upstream_requests_total", "Calls to backing services by outcome",
+    ("upstream", "status"))
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "gateway_upstream_request_duration_seconds", "Time until a backing service returned its headers",
+    ("upstream",))
+UPSTREAM_HEDGES = REGISTRY.counter(
+    "gateway_upstream_hedges_total", "Hedged GET attempts by outcome",
+    ("upstream", "result"))
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "gateway_upstream_retries_total", "Retries after connection errors by outcome",
+    ("upstream", "result"))
+ENTITY_CACHE_LOOKUPS = REGISTRY.counter(
+    "gateway_entity_cache_lookups_total", "Entity GETs looked up in the services' Redis cache",
+    ("entity", "result"))
+AUTH_LATENCY = REGISTRY.histogram(
+    "gateway_auth_validation_duration_seconds", "Time spent validating bearer tokens",
+    ("method", "result"), buckets=AUTH_BUCKETS)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route request counts and latency.
+
+    The route label is the matched route template (e.g.
+    /api/products/{product_id}), so label cardinality stays bounded.
+    """
+
+    def __init__(self, app, exclude_paths: Sequence[str] = ("/metrics",)):
+        self.app = app
+        self.exclude_paths = frozenset(exclude_paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in self.exclude_paths:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            route = scope.get("route")
+            route = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            HTTP_LATENCY.observe(time.perf_counter() - started, route, method)
+            HTTP_REQUESTS.inc(route, method, status)
@@ -0,0 +1,309 @@
+"""
+Distributed Rate Limiting
+
+Token buckets kept in Redis, so every gateway replica enforces the
+same limits. All buckets that apply to a request (per user, per IP,
+per route) are checked and charged together by one Lua script in a
+single round trip, using the Redis server clock.
+
+Callers that are clearly under their limits are admitted from a local
+estimate without touching Redis; the tokens they used are charged to
+Redis as debt on the next synced request for the same bucket.
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "gw:rl:"
+
+# KEYS: bucket keys. ARGV: cost, then (capacity, rate per second, debt) per key.
+# Debt (tokens already spent on local admits) is always charged; the request
+# itself is charged only if every bucket can afford it.
+# Returns: allowed flag, then (remaining, ms until full, ms until affordable) per key.
+_TOKEN_BUCKET_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + math.floor(tonumber(time[2]) / 1000)
+local cost = tonumber(ARGV[1])
+local state = {}
+local allowed = 1
+
+for i, key in ipairs(KEYS) do
+    local capacity = tonumber(ARGV[i * 3 - 1])
+    local rate = tonumber(ARGV[i * 3]) / 1000
+    local debt = tonumber(ARGV[i * 3 + 1])
+    local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+    local tokens = tonumber(bucket[1]) or capacity
+    local ts = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    tokens = math.max(0, tokens - debt)
+    if tokens < cost then
+        allowed = 0
+    end
+    state[i] = {tokens, capacity, rate}
+end
+
+local result = {allowed}
+for i, key in ipairs(KEYS) do
+    local tokens, capacity, rate = state[i][1], state[i][2], state[i][3]
+    if allowed == 1 then
+        tokens = tokens - cost
+    end
+    local ttl = math.ceil((capacity - tokens) / rate) + 1000
+    redis.call('HSET', key, 'tokens', tokens, 'ts', now)
+    redis.call('PEXPIRE', key, ttl)
+    local wait = 0
+    if tokens < cost then
+        wait = math.ceil((cost - tokens) / rate)
+    end
+    table.insert(result, math.floor(tokens))
+    table.insert(result, math.ceil((capacity - tokens) / rate))
+    table.insert(result, wait)
+end
+return result
+"""
+
+
+class BucketSpec(NamedTuple):
+    """Token bucket size (burst) and refill rate in tokens per second"""
+    capacity: int
+    rate: float
+
+
+class RouteRule(NamedTuple):
+    """
+    A bucket for a set of routes, kept per caller.
+
+    name: Bucket name (routes of one rule share a bucket)
+    routes: (method, route template) pairs, e.g. ("POST", "/api/orders")
+    bucket: Size and refill rate
+    """
+    name: str
+    routes: Tuple[Tuple[str, str], ...]
+    bucket: BucketSpec
+
+
+class BucketState(NamedTuple):
+    """State of one bucket after a check"""
+    policy: str
+    capacity: int
+    rate: float
+    remaining: int
+    reset: float
+    retry_after: float
+
+
+class RateLimitResult(NamedTuple):
+    allowed: bool
+    buckets: List[BucketState]
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """
+        RateLimit headers (IETF draft) for the most restrictive bucket,
+        plus Retry-After when the request was rejected.
+        """
+        if not self.buckets:
+            return {}
+        tightest = min(self.buckets, key=lambda b: (b.remaining / b.capacity, -b.reset))
+        window = max(1, round(tightest.capacity / tightest.rate))
+        headers = {
+            "RateLimit-Limit": str(tightest.capacity),
+            "RateLimit-Remaining": str(max(0, tightest.remaining)),
+            "RateLimit-Reset": str(max(0, round(tightest.reset))),
+            "RateLimit-Policy": f"{tightest.capacity};w={window};burst={tightest.capacity};policy={tightest.policy}",
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, round(max(b.retry_after for b in self.buckets))))
+        return headers
+
+
+class _LocalBucket:
+    """Last Redis view of a bucket plus tokens spent locally since"""
+
+    __slots__ = ("remaining", "rate", "synced_at", "debt")
+
+    def __init__(self):
+        self.remaining = 0.0
+        self.rate = 0.0
+        self.synced_at = 0.0
+        self.debt = 0
+
+
+class RateLimiter:
+    """
+    Per-user, per-IP and per-route token buckets in Redis.
+
+    Args:
+        user_bucket: Bucket per authenticated user (JWT subject)
+        ip_bucket: Bucket per client IP
+        route_rules: Additional per-caller buckets for specific routes
+        local_fraction: Share of a bucket's last known remaining tokens
+            that may be spent locally before syncing with Redis (0 disables)
+        local_max_age: Seconds a local estimate may be used
+        max_local_keys: Buckets remembered in process
+        fail_open: Admit requests when Redis is unreachable
+    """
+
+    def __init__(self, user_bucket: Optional[BucketSpec], ip_bucket: Optional[BucketSpec],
+                 route_rules: Sequence[RouteRule] = (), local_fraction: float = 0.1,
+                 local_max_age: float = 1.0, max_local_keys: int = 10000, fail_open: bool = True):
+        self.user_bucket = user_bucket
+        self.ip_bucket = ip_bucket
+        self.routes = {route: rule for rule in route_rules for route in rule.routes}
+        self.local_fraction = local_fraction
+        self.local_max_age = local_max_age
+        self.max_local_keys = max_local_keys
+        self.fail_open = fail_open
+        self._local: "OrderedDict[str, _LocalBucket]" = OrderedDict()
+        self._script = None
+        self.stats = {"local": 0, "redis": 0, "rejected": 0, "redis_errors": 0}
+
+    def buckets_for(self, method: str, route: Optional[str], user: Optional[Dict],
+                    client_ip: str) -> List[Tuple[str, str, BucketSpec]]:
+        """(policy, Redis key, spec) for every bucket that applies to a request"""
+        subject = (user.get("sub") or user.get("user_id")) if user else None
+        caller = f"user:{subject}" if subject is not None else f"ip:{client_ip}"
+        buckets = []
+        if subject is not None and self.user_bucket is not None:
+            buckets.append(("user", f"{KEY_PREFIX}user:{subject}", self.user_bucket))
+        if self.ip_bucket is not None:
+            buckets.append(("ip", f"{KEY_PREFIX}ip:{client_ip}", self.ip_bucket))
+        rule = self.routes.get((method, route))
+        if rule is not None:
+            buckets.append((rule.name, f"{KEY_PREFIX}route:{rule.name}:{caller}", rule.bucket))
+        return buckets
+
+    def _local_check(self, buckets, now: float) -> Optional[RateLimitResult]:
+        """Admit without Redis if every bucket has plenty of tokens left"""
+        if self.local_fraction <= 0:
+            return None
+        states = []
+        for policy, key, spec in buckets:
+            local = self._local.get(key)
+            if local is None or now - local.synced_at > self.local_max_age:
+                return None
+            if local.debt + 1 > local.remaining * self.local_fraction:
+                return None
+            states.append((local, policy, spec))
+
+        result = []
+        for local, policy, spec in states:
+            local.debt += 1
+            remaining = int(local.remaining) - local.debt
+            result.append(BucketState(policy, spec.capacity, spec.rate, remaining,
+                                      (spec.capacity - remaining) / spec.rate, 0))
+        return RateLimitResult(True, result)
+
+    def _remember(self, key: str, remaining: float, rate: float, now: float, charged_debt: int):
+        local = self._local.get(key)
+        if local is None:
+            local = self._local[key] = _LocalBucket()
+            while len(self._local) > self.max_local_keys:
+                self._local.popitem(last=False)
+        else:
+            self._local.move_to_end(key)
+        local.remaining = remaining
+        local.rate = rate
+        local.synced_at = now
+        # Local admits made while the call was in flight are still owed
+        local.debt = max(0, local.debt - charged_debt)
+
+    async def check(self, method: str, route: Optional[str], user: Optional[Dict],
+                    client_ip: str, cost: int = 1) -> RateLimitResult:
+        """
+        Charge a request against all of its buckets.
+
+        Returns:
+            Whether the request is allowed and the state of each bucket
+        """
+        buckets = self.buckets_for(method, route, user, client_ip)
+        if not buckets:
+            return RateLimitResult(True, [])
+
+        now = time.monotonic()
+        result = self._local_check(buckets, now) if cost == 1 else None
+        if result is not None:
+            self.stats["local"] += 1
+            return result
+
+        keys, args, debts = [], [cost], []
+        for _, key, spec in buckets:
+            local = self._local.get(key)
+            debts.append(local.debt if local is not None else 0)
+            keys.append(key)
+            args += [spec.capacity, spec.rate, debts[-1]]
+
+        try:
+            redis_client = get_redis()
+            if self._script is None:
+                self._script = redis_client.register_script(_TOKEN_BUCKET_SCRIPT)
+            reply = await self._script(keys=keys, args=args)
+        except Exception as e:
+            self.stats["redis_errors"] += 1
+            logger.warning(f"Rate limiter Redis call failed: {e}")
+            return RateLimitResult(self.fail_open, [])
+
+        self.stats["redis"] += 1
+        allowed = bool(int(reply[0]))
+        states = []
+        for i, (policy, key, spec) in enumerate(buckets):
+            remaining, reset_ms, wait_ms = (int(v) for v in reply[1 + i * 3: 4 + i * 3])
+            self._remember(key, remaining, spec.rate, now, debts[i])
+            states.append(BucketState(policy, spec.capacity, spec.rate, remaining,
+                                      reset_ms / 1000, wait_ms / 1000))
+        if not allowed:
+            self.stats["rejected"] += 1
+        return RateLimitResult(allowed, states)
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, local_buckets=len(self._local))
+
+
+def client_ip(scope: Dict, trusted_proxies: int = 0) -> str:
+    """
+    Address of the calling client.
+
+    Args:
+        scope: ASGI scope
+        trusted_proxies: Number of reverse proxies in front of the gateway
+            whose X-Forwarded-For entries can be trusted
+    """
+    if trusted_proxies > 0:
+        for name, value in scope.get("headers", ()):
+            if name == b"x-forwarded-for":
+                hops = [h.strip() for h in value.decode("latin-1").split(",") if h.strip()]
+                if hops:
+                    return hops[max(0, len(hops) - trusted_proxies)]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RateLimitHeadersMiddleware:
+    """Adds the RateLimit headers computed for a request to its response"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = scope.get("state", {}).get("rate_limit_headers")
+                if headers:
+                    message = dict(message)
+                    message["headers"] = list(message.get("headers", [])) + [
+                        (k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()
+                    ]
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,51 @@
+"""
+Async Redis Clients for the Gateway
+
+Shared connection pool for cache reads/writes plus a factory for the
+long-lived pub/sub connection (no socket timeout, blocking reads).
+"""
+
+from typing import Optional
+
+import redis.asyncio as redis
+
+from config import REDIS_HOST, REDIS_PORT, REDIS_PASSWORD, REDIS_SOCKET_TIMEOUT
+
+_redis: Optional[redis.Redis] = None
+
+
+def get_redis() -> redis.Redis:
+    """
+    Get the shared async Redis client (bytes responses).
+    Creates the connection pool on first call.
+    """
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            password=REDIS_PASSWORD,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_TIMEOUT
+        )
+    return _redis
+
+
+def get_pubsub_redis() -> redis.Redis:
+    """Get a Redis client for pub/sub (no socket timeout, decoded strings)"""
+    return redis.Redis(
+        host=REDIS_HOST,
+        port=REDIS_PORT,
+        password=REDIS_PASSWORD,
+        decode_responses=True,
+        socket_timeout=None,
+        socket_connect_timeout=30
+    )
+
+
+async def close_redis():
+    """Close the shared client's connection pool"""
+    global _redis
+    if _redis is not None:
+        await _redis.close()
+        _redis = None
@@ -0,0 +1,352 @@
+"""
+Gateway Response Cache
+
+Two-tier cache for upstream GET responses: a bounded in-process LRU in
+front of Redis (shared by all gateway replicas). Entries carry a strong
+ETag so conditional requests can be answered with 304 Not Modified.
+
+Entries are tagged by namespace (e.g. 'product') and, for detail
+routes, by entity ('product:5'). Tags are evicted when the services
+publish on their *_events channels, and when a write goes through the
+gateway. Gateway-originated invalidations are broadcast on
+INVALIDATION_CHANNEL so every replica drops its local copy.
+
+Expired entries are kept for stale_ttl more seconds, so a response can
+still be served while its service is unreachable.
+"""
+
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode
+
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "gateway_cache_invalidation"
+
+# Event channel -> (namespace of the changed entity, namespaces whose responses embed it)
+EVENT_INVALIDATIONS = {
+    "product_events": ("product", ("inventory", "order", "procurement")),
+    "supplier_events": ("supplier", ("product", "procurement")),
+    "customer_events": ("customer", ("order",)),
+    "procurement_stock_in": (None, ("inventory", "procurement")),
+    "order_stock_out": (None, ("inventory", "order")),
+    "inventory_events": ("inventory", ()),
+    "inventory_alert": (None, ("inventory",)),
+}
+
+KEY_PREFIX = "gw:resp:"
+TAG_PREFIX = "gw:tag:"
+
+# Deletes every key recorded under the given tag sets, then the sets themselves
+_INVALIDATE_SCRIPT = """
+local deleted = 0
+for _, tag in ipairs(KEYS) do
+    local members = redis.call('SMEMBERS', tag)
+    for _, key in ipairs(members) do
+        deleted = deleted + redis.call('DEL', key)
+    end
+    redis.call('DEL', tag)
+end
+return deleted
+"""
+
+# Response headers that are recomputed or must not be replayed from cache
+_UNCACHED_HEADERS = frozenset({"content-length", "etag", "date", "set-cookie", "cache-control"})
+
+
+class CachePolicy(NamedTuple):
+    """
+    Caching rules for one route.
+
+    namespace: Tag shared by all responses of the owning service
+    ttl: Seconds an entry stays fresh
+    entity_id: Set on detail routes so entity events evict only that entry
+    """
+    namespace: str
+    ttl: int
+    entity_id: Optional[int] = None
+
+    @property
+    def tags(self) -> Tuple[str, ...]:
+        if self.entity_id is not None:
+            return (self.namespace, f"{self.namespace}:{self.entity_id}")
+        return (self.namespace, f"{self.namespace}:collection")
+
+
+class CachedResponse:
+    """
+    A fully buffered upstream response.
+
+    `variants` holds compressed copies of the body by content coding,
+    filled on demand and kept in process only.
+    """
+
+    __slots__ = ("status_code", "headers", "body", "etag", "expires_at", "tags", "variants")
+
+    def __init__(self, status_code: int, headers: List[Tuple[str, str]], body: bytes,
+                 etag: str, expires_at: float, tags: Tuple[str, ...]):
+        self.status_code = status_code
+        self.headers = headers
+        self.body = body
+        self.etag = etag
+        self.expires_at = expires_at
+        self.tags = tags
+        self.variants: Dict[str, bytes] = {}
+
+    @classmethod
+    def build(cls, status_code: int, raw_headers, body: bytes,
+              policy: Optional[CachePolicy] = None) -> "CachedResponse":
+        """Create an entry from upstream raw (bytes) headers and body (no policy: already stale)"""
+        headers = []
+        for k, v in raw_headers:
+            name = k.decode("latin-1").lower()
+            if name not in _UNCACHED_HEADERS:
+                headers.append((name, v.decode("latin-1")))
+        if policy is None:
+            return cls(status_code, headers, body, make_etag(body), time.time(), ())
+        return cls(status_code, headers, body, make_etag(body), time.time() + policy.ttl, policy.tags)
+
+    def header(self, name: str) -> Optional[str]:
+        """First value of a (lowercase) header name"""
+        for k, v in self.headers:
+            if k == name:
+                return v
+        return None
+
+    @property
+    def fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def usable(self, stale_ttl: float) -> bool:
+        """Fresh, or expired less than stale_ttl seconds ago"""
+        return time.time() < self.expires_at + stale_ttl
+
+    def dumps(self) -> bytes:
+        meta = {"s": self.status_code, "h": self.headers, "e": self.etag,
+                "x": self.expires_at, "t": list(self.tags)}
+        return json.dumps(meta, separators=(",", ":")).encode("utf-8") + b"\n" + self.body
+
+    @classmethod
+    def loads(cls, data: bytes) -> "CachedResponse":
+        meta, body = data.split(b"\n", 1)
+        meta = json.loads(meta)
+        return cls(meta["s"], [tuple(h) for h in meta["h"]], body, meta["e"], meta["x"], tuple(meta["t"]))
+
+
+def make_etag(body: bytes) -> str:
+    """Strong ETag derived from the response body"""
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against an ETag (weak comparison, RFC 7232)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def make_cache_key(path: str, query) -> str:
+    """
+    Build a cache key from the upstream path and a normalized query.
+
+    Args:
+        path: Upstream path (e.g. '/products')
+        query: Params dict or raw query string (bytes/str)
+    """
+    if isinstance(query, dict):
+        pairs = [(k, str(v)) for k, v in query.items() if v is not None]
+    else:
+        if isinstance(query, bytes):
+            query = query.decode("latin-1")
+        pairs = parse_qsl(query or "", keep_blank_values=True)
+    normalized = urlencode(sorted(pairs))
+    return f"{path}?{normalized}" if normalized else path
+
+
+class ResponseCache:
+    """
+    In-process LRU tier in front of a Redis tier.
+
+    Args:
+        max_entries: Maximum entries held in process
+        max_bytes: Maximum total body bytes held in process
+        max_body_bytes: Responses larger than this are never cached
+        use_redis: Disable to keep the cache purely in process
+        stale_ttl: Seconds expired entries are kept for get_stale()
+    """
+
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024,
+                 max_body_bytes: int = 1024 * 1024, use_redis: bool = True, stale_ttl: int = 0):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_body_bytes = max_body_bytes
+        self.use_redis = use_redis
+        self.stale_ttl = stale_ttl
+        self._local: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._local_bytes = 0
+        self._tag_index: Dict[str, set] = {}
+        self._invalidate_script = None
+        self.stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "stale_hits": 0, "invalidations": 0}
+
+    # ---------- local tier ----------
+
+    def _local_get(self, key: str, stale: bool = False) -> Optional[CachedResponse]:
+        entry = self._local.get(key)
+        if entry is None:
+            return None
+        if not entry.usable(self.stale_ttl):
+            self._local_delete(key)
+            return None
+        if not (stale or entry.fresh):
+            return None
+        self._local.move_to_end(key)
+        return entry
+
+    def _local_set(self, key: str, entry: CachedResponse):
+        self._local_delete(key)
+        self._local[key] = entry
+        self._local_bytes += len(entry.body)
+        for tag in entry.tags:
+            self._tag_index.setdefault(tag, set()).add(key)
+        while self._local and (len(self._local) > self.max_entries or self._local_bytes > self.max_bytes):
+            oldest = next(iter(self._local))
+            self._local_delete(oldest)
+
+    def _local_delete(self, key: str):
+        entry = self._local.pop(key, None)
+        if entry is None:
+            return
+        self._local_bytes -= len(entry.body)
+        for tag in entry.tags:
+            keys = self._tag_index.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tag_index[tag]
+
+    def _local_invalidate(self, tags: Iterable[str]):
+        for tag in tags:
+            for key in list(self._tag_index.get(tag, ())):
+                self._local_delete(key)
+
+    # ---------- public API ----------
+
+    async def get(self, key: str) -> Optional[CachedResponse]:
+        """Look up a fresh entry, local tier first"""
+        entry = self._local_get(key)
+        if entry is not None:
+            self.stats["local_hits"] += 1
+            return entry
+
+        if self.use_redis:
+            try:
+                data = await get_redis().get(KEY_PREFIX + key)
+                if data:
+                    entry = CachedResponse.loads(data)
+                    if entry.fresh:
+                        self._local_set(key, entry)
+                        self.stats["redis_hits"] += 1
+                        return entry
+            except Exception as e:
+                logger.debug(f"Response cache Redis read failed for {key}: {e}")
+
+        self.stats["misses"] += 1
+        return None
+
+    async def get_stale(self, key: str) -> Optional[CachedResponse]:
+        """Look up an entry that may have expired within the stale window"""
+        entry = self._local_get(key, stale=True)
+        if entry is None and self.use_redis:
+            try:
+                data = await get_redis().get(KEY_PREFIX + key)
+                if data:
+                    entry = CachedResponse.loads(data)
+                    if not entry.usable(self.stale_ttl):
+                        entry = None
+            except Exception as e:
+                logger.debug(f"Response cache Redis read failed for {key}: {e}")
+        if entry is not None:
+            self.stats["stale_hits"] += 1
+        return entry
+
+    async def set(self, key: str, entry: CachedResponse, ttl: int):
+        """Store an entry in both tiers"""
+        self._local_set(key, entry)
+        if not self.use_redis:
+            return
+        try:
+            redis_key = KEY_PREFIX + key
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.set(redis_key, entry.dumps(), ex=ttl + self.stale_ttl)
+            for tag in entry.tags:
+                pipe.sadd(TAG_PREFIX + tag, redis_key)
+                pipe.expire(TAG_PREFIX + tag, max(ttl + self.stale_ttl, 60))
+            await pipe.execute()
+        except Exception as e:
+            logger.debug(f"Response cache Redis write failed for {key}: {e}")
+
+    async def invalidate(self, tags: Iterable[str], broadcast: bool = False):
+        """
+        Evict all entries carrying any of the tags.
+
+        Args:
+            tags: Tags to evict
+            broadcast: Also notify other gateway replicas
+        """
+        tags = list(tags)
+        if not tags:
+            return
+        self.stats["invalidations"] += 1
+        self._local_invalidate(tags)
+        if not self.use_redis:
+            return
+        try:
+            redis_client = get_redis()
+            if self._invalidate_script is None:
+                self._invalidate_script = redis_client.register_script(_INVALIDATE_SCRIPT)
+            await self._invalidate_script(keys=[TAG_PREFIX + t for t in tags])
+            if broadcast:
+                await redis_client.publish(INVALIDATION_CHANNEL, json.dumps({"tags": tags}))
+        except Exception as e:
+            logger.warning(f"Response cache Redis invalidation failed for {tags}: {e}")
+
+    async def invalidate_namespaces(self, namespaces: Iterable[str]):
+        """Evict whole namespaces after a write through the gateway"""
+        await self.invalidate(namespaces, broadcast=True)
+
+    async def handle_event(self, channel: str, event: Dict):
+        """EventListener handler for service events and peer invalidations"""
+        if channel == INVALIDATION_CHANNEL:
+            self._local_invalidate(event.get("tags", []))
+            return
+
+        namespace, dependents = EVENT_INVALIDATIONS.get(channel, (None, ()))
+        tags = list(dependents)
+        entity_id = event.get("entity_id")
+        if namespace is not None:
+            if entity_id is not None:
+                tags += [f"{namespace}:{entity_id}", f"{namespace}:collection"]
+            else:
+                tags.append(namespace)
+        await self.invalidate(tags)
+
+    @property
+    def channels(self) -> List[str]:
+        return list(EVENT_INVALIDATIONS) + [INVALIDATION_CHANNEL]
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, local_entries=len(self._local), local_bytes=self._local_bytes)
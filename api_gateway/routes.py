@@ -0,0 +1,197 @@
+"""
+Declarative Route Table
+
+Every proxied /api route is one Route: the gateway paths that reach one
+service path (aliases such as /api/storages and /api/inventory
+included), what it caches or invalidates, and its RoutePolicy. main.py
+registers one handler per route at import time, so each path is
+compiled to its matcher once and requests only pay for matching.
+
+Policies can be tuned per route without code changes: ROUTE_POLICIES
+(see config.py) maps route names to field overrides, e.g.
+{"get_product": {"cache_ttl": 120, "priority": "high", "timeout": 5}}.
+"""
+
+import re
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from load_shedding import Priority
+
+PATH_PARAM = re.compile(r"{(\w+)}")
+
+
+class RoutePolicy(NamedTuple):
+    """
+    Performance knobs of one route.
+
+    timeout: Seconds to wait for the service's response, None for the upstream's read timeout
+    cache_ttl: Seconds GET responses stay fresh, None for the namespace default, 0 to not cache
+    coalesce: Share one upstream call between identical concurrent GETs
+    priority: Admission priority, None for LOW on reads and NORMAL on writes
+    hedge: Hedge slow GETs on another replica (connect-error retries apply regardless)
+    auth: Require a bearer token; otherwise a token is verified only if one is sent
+    """
+    timeout: Optional[float] = None
+    cache_ttl: Optional[int] = None
+    coalesce: bool = True
+    priority: Optional[Priority] = None
+    hedge: bool = True
+    auth: bool = False
+
+
+class Route(NamedTuple):
+    """
+    One proxied route.
+
+    name: Unique name, used for the handler and ROUTE_POLICIES overrides
+    method: HTTP method (GET routes also answer HEAD)
+    paths: Gateway paths, all with the same path parameters
+    service: Upstream service name
+    target: Service path, formatted with the path parameters
+    cache: Response cache namespace of a GET route, None to not cache
+    invalidates: Response cache namespaces evicted by a successful write
+    id_param: Path parameter holding the id of the single entity the route reads or writes
+    entity: Entity type for the shared entity cache (read-through on GET, eviction on writes)
+    paging: Forward start/limit query parameters (defaults 0 and 50)
+    policy: Performance policy
+    """
+    name: str
+    method: str
+    paths: Tuple[str, ...]
+    service: str
+    target: str
+    cache: Optional[str] = None
+    invalidates: Tuple[str, ...] = ()
+    id_param: Optional[str] = None
+    entity: Optional[str] = None
+    paging: bool = False
+    policy: RoutePolicy = RoutePolicy()
+
+    @property
+    def methods(self) -> List[str]:
+        return ["GET", "HEAD"] if self.method == "GET" else [self.method]
+
+    @property
+    def path_params(self) -> List[str]:
+        return PATH_PARAM.findall(self.paths[0])
+
+
+def _collection(name: str, service: str, paths: Tuple[str, ...], target: str, namespace: str) -> List[Route]:
+    """List and create routes of a service collection"""
+    return [
+        Route(f"get_{name}s", "GET", paths, service, target, cache=namespace, paging=True),
+        Route(f"create_{name}", "POST", paths, service, target, invalidates=(namespace,)),
+    ]
+
+
+def _item(name: str, service: str, paths: Tuple[str, ...], target: str, namespace: str, id_param: str,
+          entity: Optional[str] = None, methods: Iterable[str] = ("PUT", "DELETE")) -> List[Route]:
+    """Detail read and write routes of one entity"""
+    write_names = {"PUT": "update", "DELETE": "delete"}
+    return [
+        Route(f"get_{name}", "GET", paths, service, target, cache=namespace, id_param=id_param,
+              entity=entity, policy=RoutePolicy(priority=Priority.NORMAL))
+    ] + [
+        Route(f"{write_names[method]}_{name}", method, paths, service, target, invalidates=(namespace,),
+              id_param=id_param, entity=entity)
+        for method in methods
+    ]
+
+
+ROUTES: List[Route] = [
+    # Auth (public)
+    Route("register", "POST", ("/api/auth/register",), "auth", "/auth/register"),
+    Route("login", "POST", ("/api/auth/login",), "auth", "/auth/login"),
+    Route("validate_token", "POST", ("/api/auth/validate",), "auth", "/auth/validate"),
+    Route("logout", "POST", ("/api/auth/logout",), "auth", "/auth/logout"),
+    Route("update_user", "PUT", ("/api/auth/users/{user_id}",), "auth", "/auth/users/{user_id}"),
+    Route("jwks", "GET", ("/api/auth/jwks",), "auth", "/auth/jwks"),
+
+    # Products
+    *_collection("product", "product", ("/api/products",), "/products", "product"),
+    *_item("product", "product", ("/api/products/{product_id}",), "/products/{product_id}",
+           "product", "product_id", entity="product"),
+
+    # Suppliers
+    *_collection("supplier", "supplier", ("/api/suppliers",), "/suppliers", "supplier"),
+    *_item("supplier", "supplier", ("/api/suppliers/{supplier_id}",), "/suppliers/{supplier_id}",
+           "supplier", "supplier_id", entity="supplier"),
+    Route("get_suppliers_by_city", "GET", ("/api/suppliers/city/{city}",), "supplier",
+          "/suppliers/city/{city}", cache="supplier"),
+
+    # Customers
+    *_collection("customer", "customer", ("/api/customers",), "/customers", "customer"),
+    *_item("customer", "customer", ("/api/customers/{customer_id}",), "/customers/{customer_id}",
+           "customer", "customer_id", entity="customer"),
+    Route("get_customers_by_city", "GET", ("/api/customers/city/{city}",), "customer",
+          "/customers/city/{city}", cache="customer"),
+
+    # Inventory
+    *_collection("storage", "inventory", ("/api/inventory", "/api/storages"), "/storages", "inventory"),
+    *_item("storage", "inventory", ("/api/inventory/{storage_id}", "/api/storages/{storage_id}"),
+           "/storages/{storage_id}", "inventory", "storage_id", methods=("PUT",)),
+    Route("get_storage_by_product", "GET",
+          ("/api/inventory/product/{product_id}", "/api/storages/product/{product_id}"),
+          "inventory", "/storages/product/{product_id}", cache="inventory"),
+
+    # Procurements (stock in)
+    Route("get_procurements", "GET", ("/api/procurements", "/api/supplytransactions"), "procurement",
+          "/procurements", cache="procurement", paging=True),
+    Route("create_procurement", "POST", ("/api/procurements", "/api/supplytransactions"), "procurement",
+          "/procurements", invalidates=("procurement",), policy=RoutePolicy(priority=Priority.HIGH)),
+    Route("get_procurements_by_product", "GET",
+          ("/api/procurements/product/{product_id}", "/api/supplytransactions/product/{product_id}"),
+          "procurement", "/procurements/product/{product_id}", cache="procurement"),
+    Route("get_procurements_by_supplier", "GET",
+          ("/api/procurements/supplier/{supplier_id}", "/api/supplytransactions/supplier/{supplier_id}"),
+          "procurement", "/procurements/supplier/{supplier_id}", cache="procurement"),
+
+    # Orders (stock out)
+    Route("get_orders", "GET", ("/api/orders", "/api/customertransactions"), "order",
+          "/orders", cache="order", paging=True),
+    Route("create_order", "POST", ("/api/orders", "/api/customertransactions"), "order",
+          "/orders", invalidates=("order",), policy=RoutePolicy(priority=Priority.HIGH)),
+    Route("get_orders_by_product", "GET",
+          ("/api/orders/product/{product_id}", "/api/customertransactions/product/{product_id}"),
+          "order", "/orders/product/{product_id}", cache="order"),
+    Route("get_orders_by_customer", "GET",
+          ("/api/orders/customer/{customer_id}", "/api/customertransactions/customer/{customer_id}"),
+          "order", "/orders/customer/{customer_id}", cache="order"),
+]
+
+
+def _policy_override(name: str, fields: Dict) -> Dict:
+    unknown = set(fields) - set(RoutePolicy._fields)
+    if unknown:
+        raise ValueError(f"ROUTE_POLICIES[{name!r}]: unknown fields {sorted(unknown)}")
+    fields = dict(fields)
+    if isinstance(fields.get("priority"), str):
+        fields["priority"] = Priority[fields["priority"].upper()]
+    return fields
+
+
+def build_routes(overrides: Optional[Dict[str, Dict]] = None) -> List[Route]:
+    """
+    The route table with ROUTE_POLICIES overrides applied, validated.
+
+    Raises:
+        ValueError: Duplicate names, aliases with different parameters, or overrides
+                    naming unknown routes or fields
+    """
+    overrides = overrides or {}
+    names = [route.name for route in ROUTES]
+    duplicates = {name for name in names if names.count(name) > 1}
+    if duplicates:
+        raise ValueError(f"Duplicate route names: {sorted(duplicates)}")
+    unknown = set(overrides) - set(names)
+    if unknown:
+        raise ValueError(f"ROUTE_POLICIES names unknown routes: {sorted(unknown)}")
+
+    routes = []
+    for route in ROUTES:
+        if any(PATH_PARAM.findall(path) != route.path_params for path in route.paths):
+            raise ValueError(f"Route {route.name}: aliases must share path parameters")
+        if route.name in overrides:
+            route = route._replace(policy=route.policy._replace(**_policy_override(route.name, overrides[route.name])))
+        routes.append(route)
+    return routes
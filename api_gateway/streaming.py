@@ -0,0 +1,196 @@
+"""
+Server-Sent Events Fan-Out
+
+Browsers subscribe to /api/stream for a set of topics. Service events
+reach each gateway worker through its single EventListener subscription;
+EventStream numbers them, formats each SSE message once and hands it to
+every connected client that wants the topic.
+
+Each client has a bounded queue. A client that falls behind is
+disconnected rather than buffered without limit; its browser reconnects
+with Last-Event-ID and catches up from the replay buffer, which holds
+the most recent events of this worker.
+
+Event ids are "<stream id>-<sequence>", the stream id being random per
+worker process. A Last-Event-ID from another worker (or one older than
+the replay buffer) cannot be resumed; the client then gets a `reset`
+event and should re-fetch its lists before applying live events again.
+"""
+
+import asyncio
+import json
+import logging
+import time
+import uuid
+from collections import deque
+from typing import AsyncIterator, Dict, FrozenSet, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Topic -> service channels it carries
+TOPICS: Dict[str, Tuple[str, ...]] = {
+    "storage": ("inventory_events",),
+    "alerts": ("inventory_alert",),
+    "orders": ("order_stock_out",),
+    "procurements": ("procurement_stock_in",),
+}
+
+_CLOSE = object()
+
+
+class StreamLimitError(Exception):
+    """Raised when a worker already serves its maximum number of streams"""
+
+
+class _Client:
+    __slots__ = ("topics", "queue", "dropped", "since")
+
+    def __init__(self, topics: FrozenSet[str], queue_size: int, since: int):
+        self.topics = topics
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.dropped = False
+        # Later events are queued for it, earlier ones can only be replayed
+        self.since = since
+
+
+class EventStream:
+    """
+    Topic fan-out of service events to SSE clients.
+
+    Args:
+        replay_size: Recent events kept for Last-Event-ID resumption
+        client_queue_size: Events a client may fall behind before it is disconnected
+        heartbeat: Seconds between keep-alive comments on an idle stream
+        max_clients: Streams this worker serves at once
+        retry: Reconnect delay suggested to browsers (milliseconds)
+    """
+
+    def __init__(self, replay_size: int = 1000, client_queue_size: int = 256, heartbeat: float = 15.0,
+                 max_clients: int = 1000, retry: int = 3000):
+        self.heartbeat = heartbeat
+        self.client_queue_size = client_queue_size
+        self.max_clients = max_clients
+        self.retry = retry
+        self.stream_id = uuid.uuid4().hex[:8]
+        self._sequence = 0
+        # (sequence, topic, formatted message)
+        self._replay: deque = deque(maxlen=replay_size)
+        self._clients: List[_Client] = []
+        self._routes: Dict[str, List[str]] = {}
+        for topic, channels in TOPICS.items():
+            for channel in channels:
+                self._routes.setdefault(channel, []).append(topic)
+        self.stats = {"events": 0, "delivered": 0, "dropped_clients": 0, "resumed": 0, "reset": 0}
+        # Set by shutdown(): streams end, and new ones end right after the retry hint
+        self.closing = False
+
+    @property
+    def channels(self) -> List[str]:
+        return list(self._routes)
+
+    @property
+    def topics(self) -> FrozenSet[str]:
+        return frozenset(TOPICS)
+
+    def _format(self, sequence: int, topic: str, event: Dict) -> bytes:
+        data = json.dumps(event, separators=(",", ":"))
+        return f"id: {self.stream_id}-{sequence}\nevent: {topic}\ndata: {data}\n\n".encode("utf-8")
+
+    async def handle_event(self, channel: str, event: Dict):
+        """EventListener handler: number, format and fan out one service event"""
+        for topic in self._routes.get(channel, ()):
+            self._sequence += 1
+            message = self._format(self._sequence, topic, event)
+            self._replay.append((self._sequence, topic, message))
+            self.stats["events"] += 1
+            for client in self._clients:
+                if topic not in client.topics or client.dropped:
+                    continue
+                try:
+                    client.queue.put_nowait((self._sequence, message))
+                    self.stats["delivered"] += 1
+                except asyncio.QueueFull:
+                    # Too slow: drop it, the browser resumes from the replay buffer
+                    client.dropped = True
+                    self.stats["dropped_clients"] += 1
+                    self._close(client)
+
+    @staticmethod
+    def _close(client: _Client):
+        # Queued events are discarded too, so the client resumes after the last one it got
+        while not client.queue.empty():
+            client.queue.get_nowait()
+        client.queue.put_nowait((None, _CLOSE))
+
+    def _resume_point(self, last_event_id: str, until: int) -> Optional[int]:
+        """Sequence to replay after, or None if the id cannot be resumed here"""
+        stream_id, _, sequence = last_event_id.partition("-")
+        if stream_id != self.stream_id or not sequence.isdigit() or int(sequence) > until:
+            return None
+        sequence = int(sequence)
+        oldest = self._replay[0][0] if self._replay else until + 1
+        # Events after `sequence`, up to `until`, must all still be in the buffer
+        if sequence < until and sequence + 1 < oldest:
+            return None
+        return sequence
+
+    def check_capacity(self):
+        """
+        Raises:
+            StreamLimitError: max_clients streams are already open
+        """
+        if len(self._clients) >= self.max_clients:
+            raise StreamLimitError(f"{self.max_clients} event streams already open")
+
+    async def events(self, topics: FrozenSet[str], last_event_id: Optional[str] = None) -> AsyncIterator[bytes]:
+        """
+        SSE body for a client of the given topics: replay or reset, then live events and
+        heartbeats. The client is registered while the iterator runs.
+        """
+        client = _Client(topics, self.client_queue_size, self._sequence)
+        self._clients.append(client)
+        try:
+            yield f"retry: {self.retry}\n\n".encode("utf-8")
+            if self.closing:
+                return
+            if last_event_id:
+                resume = self._resume_point(last_event_id, client.since)
+                if resume is None:
+                    self.stats["reset"] += 1
+                    reset = {"reason": "cannot resume", "timestamp": time.time()}
+                    yield (f"id: {self.stream_id}-{client.since}\nevent: reset\n"
+                           f"data: {json.dumps(reset)}\n\n").encode("utf-8")
+                else:
+                    self.stats["resumed"] += 1
+                    for sequence, topic, message in list(self._replay):
+                        if resume < sequence <= client.since and topic in client.topics:
+                            yield message
+            while not self.closing:
+                try:
+                    sequence, message = await asyncio.wait_for(client.queue.get(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    yield b": heartbeat\n\n"
+                    continue
+                if message is _CLOSE:
+                    return
+                yield message
+        finally:
+            if client in self._clients:
+                self._clients.remove(client)
+
+    def close_all(self):
+        """End every open stream (the browsers reconnect and resume)"""
+        for client in list(self._clients):
+            self._close(client)
+
+    def shutdown(self):
+        """
+        End every stream for good, as the worker starts draining. The server waits for
+        open connections before the app's shutdown runs, so streams must end first.
+        """
+        self.closing = True
+        self.close_all()
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, clients=len(self._clients), sequence=self._sequence,
+                    stream_id=self.stream_id)
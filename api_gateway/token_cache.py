@@ -0,0 +1,151 @@
+"""
+Validated-Token Cache
+
+Bearer tokens that passed validation are kept in a bounded in-process
+LRU keyed by the token's SHA-256 and expire at the token's exp claim,
+so an active session's repeat requests skip verification entirely.
+
+Before a token is cached it is checked against the revocation records
+auth keeps in Redis (redis_revoked, which the gateway also uses when the
+cache is disabled). Auth announces revocations (logout, role change,
+account disabled) on REVOCATION_CHANNEL; every gateway replica evicts
+the affected entries and remembers the revocation until the tokens it
+covers have expired. Announcements made while the subscription is down
+are missed, so the cache is cleared whenever it (re)subscribes.
+"""
+
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Channel and keys written by auth/revocations.py
+REVOCATION_CHANNEL = "auth_revocations"
+TOKEN_KEY_PREFIX = "auth:revoked:token:"
+USER_KEY_PREFIX = "auth:revoked:user:"
+
+
+def token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _subject(payload: Dict) -> str:
+    return str(payload.get("sub") or payload.get("user_id"))
+
+
+async def redis_revoked(token: str, payload: Dict) -> bool:
+    """True if auth's revocation records in Redis cover a validated token"""
+    try:
+        token_revoked, revoked_before = await get_redis().mget(
+            TOKEN_KEY_PREFIX + token_hash(token), USER_KEY_PREFIX + _subject(payload))
+    except Exception as e:
+        # Broadcast revocations still apply; Redis-only ones are missed until it is back
+        logger.warning(f"Token revocation lookup failed: {e}")
+        return False
+    if token_revoked is not None:
+        return True
+    return revoked_before is not None and payload.get("iat", 0) < int(revoked_before)
+
+
+class TokenCache:
+    """
+    LRU of validated token payloads with revocation handling.
+
+    Args:
+        max_entries: Maximum tokens held
+        user_revocation_ttl: Seconds a user revocation is remembered (the token lifetime)
+    """
+
+    def __init__(self, max_entries: int = 10000, user_revocation_ttl: int = 6 * 3600):
+        self.max_entries = max_entries
+        self.user_revocation_ttl = user_revocation_ttl
+        # token hash -> (payload, expires at)
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        # Revocations heard on the channel: token hash -> exp, subject -> (revoked before, forget at)
+        self._revoked_tokens: Dict[str, float] = {}
+        self._revoked_users: Dict[str, Tuple[int, float]] = {}
+        self.stats = {"hits": 0, "misses": 0, "revoked": 0, "evictions": 0}
+
+    def get(self, token: str) -> Optional[Dict]:
+        """Payload of a cached, unexpired token"""
+        key = token_hash(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        payload, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            self.stats["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return payload
+
+    def _locally_revoked(self, key: str, payload: Dict) -> bool:
+        if key in self._revoked_tokens:
+            return True
+        revoked = self._revoked_users.get(_subject(payload))
+        return revoked is not None and payload.get("iat", 0) < revoked[0]
+
+    async def admit(self, token: str, payload: Dict) -> bool:
+        """
+        Check a freshly validated token for revocation and cache it.
+
+        Returns:
+            False if the token has been revoked
+        """
+        key = token_hash(token)
+        if self._locally_revoked(key, payload) or await redis_revoked(token, payload):
+            self.stats["revoked"] += 1
+            return False
+        exp = payload.get("exp")
+        # A revocation may have arrived while Redis was being asked
+        if exp is None or self._locally_revoked(key, payload):
+            return True
+        self._entries[key] = (payload, float(exp))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return True
+
+    async def clear(self):
+        """Forget all cached tokens (EventListener subscribe hook: revocations may have been missed)"""
+        self._entries.clear()
+
+    def _prune(self, now: float):
+        self._revoked_tokens = {k: exp for k, exp in self._revoked_tokens.items() if exp > now}
+        self._revoked_users = {k: v for k, v in self._revoked_users.items() if v[1] > now}
+
+    async def handle_event(self, channel: str, event: Dict):
+        """EventListener handler for auth's revocation announcements"""
+        now = time.time()
+        self._prune(now)
+        data = event.get("data") or {}
+        if event.get("event_type") == "token_revoked":
+            key = data.get("token_hash")
+            if key:
+                self._revoked_tokens[key] = float(data.get("exp", now + self.user_revocation_ttl))
+                if self._entries.pop(key, None) is not None:
+                    self.stats["evictions"] += 1
+        elif event.get("event_type") == "user_revoked":
+            subject = str(event.get("entity_id"))
+            revoked_before = int(data.get("revoked_before", now + 1))
+            self._revoked_users[subject] = (revoked_before, now + self.user_revocation_ttl)
+            for key, (payload, _) in list(self._entries.items()):
+                if _subject(payload) == subject and payload.get("iat", 0) < revoked_before:
+                    del self._entries[key]
+                    self.stats["evictions"] += 1
+
+    @property
+    def channels(self):
+        return [REVOCATION_CHANNEL]
+
+    def get_stats(self) -> Dict:
+        return dict(self.stats, entries=len(self._entries),
+                    revoked_tokens=len(self._revoked_tokens), revoked_users=len(self._revoked_users))
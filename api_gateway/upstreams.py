@@ -0,0 +1,262 @@
+"""
+Upstream Connection Pools
+
+Each backing service gets its own httpx client, with its own connection
+limits, keep-alive expiry and timeouts, so a slow service can only
+exhaust its own pool. Pools are pre-warmed at startup and track their
+occupancy for the health and metrics endpoints.
+
+Calls pass the upstream's circuit breaker and bulkhead (see
+circuit_breaker.py), are admitted through its adaptive concurrency
+limiter (see load_shedding.py) when one is configured, and are spread
+over the service's replicas by its ReplicaSet (see balancer.py).
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+from balancer import FAILURE_STATUSES, Replica, ReplicaSet
+from circuit_breaker import Bulkhead, CircuitBreaker, UpstreamRejectedError
+from load_shedding import AdaptiveLimiter, LoadShedError, Priority
+from metrics import UPSTREAM_LATENCY, UPSTREAM_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+# Marks a service's 504 for a request whose own deadline ran out (message_queue/deadline.py)
+DEADLINE_EXCEEDED_HEADER = "x-deadline-exceeded"
+
+
+class Upstream:
+    """
+    A backing service and its dedicated connection pool.
+
+    Args:
+        name: Service name (e.g. 'product')
+        urls: Base URLs of the service's replicas
+        max_connections: Maximum open connections to the service
+        max_keepalive: Maximum idle connections kept open
+        keepalive_expiry: Seconds an idle connection is kept
+        connect_timeout: Seconds to establish a connection
+        read_timeout: Seconds to wait for response data
+        pool_timeout: Seconds to wait for a free connection
+        warm_connections: Connections opened at startup
+        limiter: Adaptive concurrency limiter, None to send unrestricted
+        balancing: Keyword arguments for the ReplicaSet
+        breaker: Circuit breaker, None to always send
+        bulkhead: Cap on calls in progress, None for no cap
+    """
+
+    def __init__(self, name: str, urls: List[str], max_connections: int = 20, max_keepalive: int = 20,
+                 keepalive_expiry: float = 60.0, connect_timeout: float = 2.0,
+                 read_timeout: float = 30.0, pool_timeout: float = 5.0, warm_connections: int = 2,
+                 limiter: Optional[AdaptiveLimiter] = None, balancing: Optional[Dict] = None,
+                 breaker: Optional[CircuitBreaker] = None, bulkhead: Optional[Bulkhead] = None):
+        self.name = name
+        self.replicas = ReplicaSet(name, urls, **(balancing or {}))
+        # Requests are built against the first replica and retargeted when sent
+        self.url = self.replicas.replicas[0].url
+        self.max_connections = max_connections
+        self.read_timeout = read_timeout
+        self.warm_connections = min(warm_connections, max_keepalive)
+        self.limiter = limiter
+        self.breaker = breaker
+        self.bulkhead = bulkhead
+        self.client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_keepalive,
+                keepalive_expiry=keepalive_expiry
+            ),
+            timeout=httpx.Timeout(
+                connect=connect_timeout,
+                read=read_timeout,
+                write=read_timeout,
+                pool=pool_timeout
+            )
+        )
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.pool_timeouts = 0
+
+    async def send(self, request: httpx.Request, stream: bool = False,
+                   priority: Priority = Priority.NORMAL, replica: Optional[Replica] = None) -> httpx.Response:
+        """
+        Send a request through this upstream's pool, tracking occupancy.
+        The balancer picks the replica unless one is given.
+
+        Raises:
+            CircuitOpenError: The circuit is open, the call failed fast
+            BulkheadFullError: Too many calls to this upstream are in progress
+            LoadShedError: The limiter rejected the request
+        """
+        try:
+            if self.breaker is not None:
+                self.breaker.acquire()
+        except UpstreamRejectedError:
+            UPSTREAM_REQUESTS.inc(self.name, "circuit_open")
+            raise
+        try:
+            if self.bulkhead is not None:
+                await self.bulkhead.acquire()
+        except BaseException as e:
+            if self.breaker is not None:
+                self.breaker.release(None)
+            if isinstance(e, UpstreamRejectedError):
+                UPSTREAM_REQUESTS.inc(self.name, "bulkhead_full")
+            raise
+        try:
+            return await self._send(request, stream, priority, replica)
+        finally:
+            if self.bulkhead is not None:
+                self.bulkhead.release()
+
+    async def _send(self, request: httpx.Request, stream: bool, priority: Priority,
+                    replica: Optional[Replica]) -> httpx.Response:
+        if self.limiter is not None:
+            try:
+                await self.limiter.acquire(priority)
+            except BaseException as e:
+                if self.breaker is not None:
+                    self.breaker.release(None)
+                if isinstance(e, LoadShedError):
+                    UPSTREAM_REQUESTS.inc(self.name, "shed")
+                raise
+        if replica is None:
+            replica = self.replicas.pick()
+        if replica.url != self.url:
+            request.url = request.url.copy_with(scheme=replica.scheme, host=replica.host, port=replica.port)
+            request.headers["host"] = request.url.netloc.decode("ascii")
+        replica.outstanding += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        started = time.monotonic()
+        rtt, dropped, failed, verdict = None, False, False, True
+        try:
+            response = await self.client.send(request, stream=stream)
+            rtt = time.monotonic() - started
+            failed = response.status_code in FAILURE_STATUSES
+            if failed and DEADLINE_EXCEEDED_HEADER in response.headers:
+                # The caller's deadline ran out; says nothing about the service's health
+                failed = verdict = False
+            UPSTREAM_LATENCY.observe(rtt, self.name)
+            UPSTREAM_REQUESTS.inc(self.name, response.status_code)
+            return response
+        except httpx.PoolTimeout:
+            self.pool_timeouts += 1
+            dropped = True
+            UPSTREAM_REQUESTS.inc(self.name, "pool_timeout")
+            raise
+        except httpx.TimeoutException:
+            dropped = failed = True
+            UPSTREAM_REQUESTS.inc(self.name, "timeout")
+            raise
+        except httpx.RequestError:
+            failed = True
+            UPSTREAM_REQUESTS.inc(self.name, "error")
+            raise
+        finally:
+            self.in_flight -= 1
+            replica.outstanding -= 1
+            if verdict:
+                self.replicas.record(replica, rtt, failed)
+            if self.breaker is not None:
+                self.breaker.release(
+                    True if failed else (False if rtt is not None and verdict else None))
+            if self.limiter is not None:
+                self.limiter.release(rtt, dropped)
+
+    def build_request(self, method: str, path: str, **kwargs) -> httpx.Request:
+        return self.client.build_request(method, f"{self.url}{path}", **kwargs)
+
+    def timeout(self, read_timeout: float) -> httpx.Timeout:
+        """The pool's timeouts with a different read (and write) timeout, for one route"""
+        return httpx.Timeout(connect=self.client.timeout.connect, read=read_timeout,
+                             write=read_timeout, pool=self.client.timeout.pool)
+
+    async def warm(self):
+        """Open keep-alive connections to every replica ahead of the first real request"""
+        if self.warm_connections <= 0:
+            return
+        results = await asyncio.gather(
+            *(self.client.get(f"{replica.url}/health")
+              for replica in self.replicas.replicas for _ in range(self.warm_connections)),
+            return_exceptions=True
+        )
+        failures = [r for r in results if isinstance(r, Exception)]
+        if failures:
+            logger.warning(f"Pre-warming {self.name} pool: {len(failures)} connection(s) failed: {failures[0]}")
+        else:
+            logger.info(f"Pre-warmed {self.warm_connections} connection(s) to {self.name}")
+
+    def _pool_connections(self):
+        # httpcore keeps its connection list on the transport's pool (not public API)
+        pool = getattr(getattr(self.client, "_transport", None), "_pool", None)
+        return getattr(pool, "connections", None)
+
+    def get_stats(self) -> Dict:
+        connections = self._pool_connections()
+        stats = {
+            "url": self.url,
+            "max_connections": self.max_connections,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "pool_timeouts": self.pool_timeouts,
+        }
+        if connections is not None:
+            stats["open_connections"] = len(connections)
+            stats["idle_connections"] = sum(1 for c in connections if c.is_idle())
+        if self.limiter is not None:
+            stats["concurrency"] = self.limiter.get_stats()
+        if self.breaker is not None:
+            stats["circuit"] = self.breaker.get_state()
+        if self.bulkhead is not None:
+            stats["bulkhead"] = self.bulkhead.get_stats()
+        stats["replicas"] = self.replicas.get_stats()
+        return stats
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class UpstreamRegistry(dict):
+    """Upstreams by service name, with the replica health-check loop"""
+
+    _health_task: Optional[asyncio.Task] = None
+
+    async def _health_loop(self, interval: float, timeout: float):
+        while True:
+            await asyncio.sleep(interval)
+            balanced = [u for u in self.values() if len(u.replicas.replicas) > 1]
+            try:
+                await asyncio.gather(*(u.replicas.check_health(u.client, timeout) for u in balanced))
+            except Exception as e:
+                logger.warning(f"Replica health check failed: {e}")
+            for upstream in balanced:
+                upstream.replicas.sweep()
+
+    def start_health_checks(self, interval: float, timeout: float):
+        """Probe replicas and sweep for outliers every `interval` seconds"""
+        if self._health_task is None and any(len(u.replicas.replicas) > 1 for u in self.values()):
+            self._health_task = asyncio.ensure_future(self._health_loop(interval, timeout))
+
+    async def stop_health_checks(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+
+    async def warm_all(self):
+        await asyncio.gather(*(u.warm() for u in self.values()))
+
+    async def close_all(self):
+        await asyncio.gather(*(u.aclose() for u in self.values()))
+
+    def get_stats(self) -> Dict:
+        return {name: u.get_stats() for name, u in self.items()}
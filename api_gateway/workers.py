@@ -0,0 +1,82 @@
+"""
+Production Worker Processes
+
+Gunicorn manages the worker processes (sizing, restarts, graceful
+drain); each worker serves the app with uvicorn on uvloop and the
+httptools HTTP parser. Startup is required to succeed, so a worker that
+cannot start never takes traffic.
+
+On SIGTERM uvicorn waits for open connections to finish before it runs
+the app's shutdown, so connections that never finish on their own (event
+streams) are ended by exit callbacks the app registers in
+`exit_callbacks`, which run as soon as the signal arrives.
+"""
+
+import logging
+import math
+import os
+import sys
+from typing import Callable, List
+
+from gunicorn.arbiter import Arbiter
+from uvicorn.server import Server
+from uvicorn.workers import UvicornWorker
+
+logger = logging.getLogger(__name__)
+
+# Run once when the worker is told to exit, before it drains connections
+exit_callbacks: List[Callable[[], None]] = []
+
+
+class GatewayServer(Server):
+    def handle_exit(self, sig, frame):
+        if not self.should_exit:
+            for callback in exit_callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logger.error(f"Exit callback failed: {e}")
+        super().handle_exit(sig, frame)
+
+
+class GatewayWorker(UvicornWorker):
+    CONFIG_KWARGS = {"loop": "uvloop", "http": "httptools", "lifespan": "on"}
+
+    async def _serve(self):
+        # UvicornWorker._serve with GatewayServer in place of Server
+        self.config.app = self.wsgi
+        server = GatewayServer(config=self.config)
+        self._install_sigquit_handler()
+        await server.serve(sockets=self.sockets)
+        if not server.started:
+            sys.exit(Arbiter.WORKER_BOOT_ERROR)
+
+
+def _cgroup_cpu_limit():
+    """CPUs allowed by the container's CPU quota (cgroup v2, then v1), None if unlimited"""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()[:2]
+        if quota != "max":
+            return int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return quota / period
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def default_worker_count() -> int:
+    """One worker per CPU available to this process (affinity and container quota)"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else (os.cpu_count() or 1)
+    limit = _cgroup_cpu_limit()
+    if limit is not None:
+        cpus = min(cpus, math.ceil(limit))
+    return max(1, cpus)
@@ -22,10 +22,14 @@ class Config:
     REDIS_HOST = os.getenv('REDIS_HOST', 'localhost')
     REDIS_PORT = int(os.getenv('REDIS_PORT', 6379))
     
-    # JWT configuration
-    JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
-    JWT_ALGORITHM = 'HS256'
+    # JWT configuration (asymmetric signing, public keys served as JWKS)
+    JWT_ALGORITHM = 'RS256'
     JWT_EXPIRY_HOURS = 6
+    JWT_PRIVATE_KEY_PATH = os.getenv('JWT_PRIVATE_KEY_PATH')
+    JWT_PREVIOUS_PUBLIC_KEY_PATHS = [
+        p for p in os.getenv('JWT_PREVIOUS_PUBLIC_KEY_PATHS', '').split(',') if p
+    ]
+    JWKS_MAX_AGE = int(os.getenv('JWKS_MAX_AGE', 300))
     
     # Service configuration
     SERVICE_NAME = 'auth'
@@ -0,0 +1,110 @@
+"""
+JWT Signing Keys
+
+Loads (or generates) the RSA key pair used to sign access tokens and
+exposes the public half as a JSON Web Key Set so the API gateway can
+verify tokens locally instead of calling /auth/validate.
+"""
+
+import base64
+import hashlib
+import json
+import logging
+from typing import Dict, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+logger = logging.getLogger(__name__)
+
+
+def _b64url_uint(value: int) -> str:
+    """Encode an unsigned integer as unpadded base64url (RFC 7518)."""
+    raw = value.to_bytes((value.bit_length() + 7) // 8 or 1, 'big')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _public_jwk(public_key) -> Dict:
+    numbers = public_key.public_numbers()
+    return {'kty': 'RSA', 'n': _b64url_uint(numbers.n), 'e': _b64url_uint(numbers.e)}
+
+
+def compute_key_id(public_key) -> str:
+    """
+    Compute the RFC 7638 thumbprint of an RSA public key.
+
+    Args:
+        public_key: RSA public key
+
+    Returns:
+        Base64url SHA-256 thumbprint used as the JWT 'kid' header
+    """
+    jwk = _public_jwk(public_key)
+    canonical = json.dumps(
+        {'e': jwk['e'], 'kty': jwk['kty'], 'n': jwk['n']},
+        separators=(',', ':'),
+        sort_keys=True
+    )
+    digest = hashlib.sha256(canonical.encode('utf-8')).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode('ascii')
+
+
+class SigningKeySet:
+    """
+    Active RSA signing key plus any retired public keys still accepted.
+
+    Args:
+        private_key_path: PEM file with the active private key. If not set,
+            an ephemeral key is generated (tokens do not survive a restart).
+        previous_public_key_paths: PEM files with retired public keys that
+            are still published so tokens signed before a rotation verify
+    """
+
+    def __init__(self, private_key_path: Optional[str] = None, previous_public_key_paths=None):
+        if private_key_path:
+            with open(private_key_path, 'rb') as f:
+                self.private_key = serialization.load_pem_private_key(f.read(), password=None)
+            logger.info(f"Loaded JWT signing key from {private_key_path}")
+        else:
+            self.private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+            logger.warning(
+                "JWT_PRIVATE_KEY_PATH not set, generated an ephemeral signing key. "
+                "Issued tokens will be invalid after a restart."
+            )
+
+        self.kid = compute_key_id(self.private_key.public_key())
+        self.private_pem = self.private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+
+        # kid -> public key, active key first
+        self.public_keys = {self.kid: self.private_key.public_key()}
+        for path in previous_public_key_paths or []:
+            with open(path, 'rb') as f:
+                public_key = serialization.load_pem_public_key(f.read())
+            self.public_keys[compute_key_id(public_key)] = public_key
+
+    def get_public_key(self, kid: Optional[str]):
+        """Return the public key for a kid (active key when kid is missing)."""
+        if kid is None:
+            return self.public_keys[self.kid]
+        return self.public_keys.get(kid)
+
+    def to_jwks(self, algorithm: str) -> Dict:
+        """
+        Build the JSON Web Key Set document.
+
+        Args:
+            algorithm: JWT algorithm advertised in each key's 'alg' member
+
+        Returns:
+            Dictionary of the form {'keys': [...]}
+        """
+        keys = []
+        for kid, public_key in self.public_keys.items():
+            jwk = _public_jwk(public_key)
+            jwk.update({'kid': kid, 'use': 'sig', 'alg': algorithm})
+            keys.append(jwk)
+        return {'keys': keys}
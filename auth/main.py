@@ -13,8 +13,11 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
 from db import db
 from models import User
+from keys import SigningKeySet
+from revocations import revoke_token, revoke_user, is_revoked
 from message_queue.event_system import EventPublisher
 from message_queue.cache import warm_cache_sync, cache_entity
+from message_queue import deadline
 
 # Configure logging
 logging.basicConfig(
@@ -26,6 +29,7 @@ logger = logging.getLogger(__name__)
 # Global variables
 event_publisher = None
 cache_warmed = False
+signing_keys = SigningKeySet(Config.JWT_PRIVATE_KEY_PATH, Config.JWT_PREVIOUS_PUBLIC_KEY_PATHS)
 
 
 def create_app():
@@ -33,6 +37,7 @@ def create_app():
     flask_app = Flask(__name__)
     flask_app.config.from_object(Config)
     db.init_app(flask_app)
+    deadline.init_app(flask_app, db)
     register_routes(flask_app)
     return flask_app
 
@@ -50,19 +55,36 @@ def verify_password(password: str, password_hash: str) -> bool:
 def generate_token(user_id: int, username: str, role: str) -> str:
     """Generate JWT token with 6-hour expiry"""
     payload = {
+        'sub': str(user_id),
         'user_id': user_id,
         'username': username,
         'role': role,
         'exp': datetime.utcnow() + timedelta(hours=Config.JWT_EXPIRY_HOURS),
         'iat': datetime.utcnow()
     }
-    return jwt.encode(payload, Config.JWT_SECRET_KEY, algorithm=Config.JWT_ALGORITHM)
+    return jwt.encode(
+        payload,
+        signing_keys.private_pem,
+        algorithm=Config.JWT_ALGORITHM,
+        headers={'kid': signing_keys.kid}
+    )
 
 
 def decode_token(token: str) -> dict:
     """Decode and validate JWT token"""
     try:
-        payload = jwt.decode(token, Config.JWT_SECRET_KEY, algorithms=[Config.JWT_ALGORITHM])
+        kid = jwt.get_unverified_header(token).get('kid')
+        public_key = signing_keys.get_public_key(kid)
+        if public_key is None:
+            return {'valid': False, 'error': 'Unknown signing key'}
+        payload = jwt.decode(token, public_key, algorithms=[Config.JWT_ALGORITHM])
+        try:
+            revoked = is_revoked(token, payload)
+        except Exception as e:
+            logger.warning(f"Revocation check failed, accepting token: {e}")
+            revoked = None
+        if revoked:
+            return {'valid': False, 'error': revoked}
         return {'valid': True, 'payload': payload}
     except jwt.ExpiredSignatureError:
         return {'valid': False, 'error': 'Token has expired'}
@@ -70,6 +92,16 @@ def decode_token(token: str) -> dict:
         return {'valid': False, 'error': str(e)}
 
 
+def request_token(data: dict = None):
+    """Token from the JSON body or the Authorization header"""
+    token = (data or {}).get('token')
+    if not token:
+        auth_header = request.headers.get('Authorization')
+        if auth_header and auth_header.startswith('Bearer '):
+            token = auth_header.split(' ')[1]
+    return token
+
+
 def register_routes(app):
     """Register all routes on the Flask app"""
     
@@ -83,6 +115,14 @@ def register_routes(app):
             'timestamp': datetime.utcnow().isoformat()
         }), 200
 
+    @app.route('/auth/jwks', methods=['GET'])
+    @app.route('/.well-known/jwks.json', methods=['GET'])
+    def jwks():
+        """Publish token verification keys as a JSON Web Key Set"""
+        response = jsonify(signing_keys.to_jwks(Config.JWT_ALGORITHM))
+        response.headers['Cache-Control'] = f'public, max-age={Config.JWKS_MAX_AGE}'
+        return response, 200
+
     @app.route('/auth/register', methods=['POST'])
     def register():
         """Register new user"""
@@ -148,6 +188,9 @@ def register_routes(app):
             if not user or not verify_password(password, user.password_hash):
                 return jsonify({'error': 'Invalid username or password'}), 401
             
+            if not user.is_active:
+                return jsonify({'error': 'Account is disabled'}), 403
+            
             token = generate_token(user.id, user.username, user.role)
             
             logger.info(f"User logged in: {username}")
@@ -166,13 +209,8 @@ def register_routes(app):
     def validate_token():
         """Validate JWT token"""
         try:
-            data = request.get_json()
-            token = data.get('token')
-            
-            if not token:
-                auth_header = request.headers.get('Authorization')
-                if auth_header and auth_header.startswith('Bearer '):
-                    token = auth_header.split(' ')[1]
+            data = request.get_json(silent=True)
+            token = request_token(data)
             
             if not token:
                 return jsonify({'valid': False, 'error': 'Token is required'}), 400
@@ -188,6 +226,78 @@ def register_routes(app):
             logger.error(f"Token validation error: {e}")
             return jsonify({'valid': False, 'error': 'Validation failed'}), 500
 
+    @app.route('/auth/logout', methods=['POST'])
+    def logout():
+        """Revoke the caller's token, or all of the user's tokens with {"all": true}"""
+        try:
+            data = request.get_json(silent=True) or {}
+            token = request_token(data)
+            
+            if not token:
+                return jsonify({'error': 'Token is required'}), 400
+            
+            result = decode_token(token)
+            if not result['valid']:
+                return jsonify({'error': result['error']}), 401
+            
+            payload = result['payload']
+            if data.get('all'):
+                revoke_user(payload['user_id'], Config.JWT_EXPIRY_HOURS * 3600, 'logout_all', event_publisher)
+            else:
+                revoke_token(token, payload['user_id'], payload['exp'], event_publisher)
+            
+            return jsonify({'message': 'Logged out'}), 200
+            
+        except Exception as e:
+            logger.error(f"Logout error: {e}")
+            return jsonify({'error': 'Logout failed'}), 500
+
+    @app.route('/auth/users/<int:user_id>', methods=['PUT'])
+    def update_user(user_id):
+        """Change a user's role or enable/disable the account (admin only)"""
+        try:
+            token = request_token()
+            result = decode_token(token) if token else {'valid': False}
+            if not result['valid']:
+                return jsonify({'error': 'Authentication required'}), 401
+            if result['payload'].get('role') != 'admin':
+                return jsonify({'error': 'Admin role required'}), 403
+            
+            user = db.session.get(User, user_id)
+            if user is None:
+                return jsonify({'error': 'User not found'}), 404
+            
+            data = request.get_json() or {}
+            reason = None
+            if 'role' in data and data['role'] != user.role:
+                user.role = data['role']
+                reason = 'role_changed'
+            if 'is_active' in data and bool(data['is_active']) != user.is_active:
+                user.is_active = bool(data['is_active'])
+                if not user.is_active:
+                    reason = 'disabled'
+            
+            db.session.commit()
+            
+            cache_entity('user', user.id, user.to_dict(), ttl=86400)
+            
+            # Tokens carry the role, so existing ones must not outlive the change
+            if reason:
+                revoke_user(user.id, Config.JWT_EXPIRY_HOURS * 3600, reason, event_publisher)
+            
+            if event_publisher:
+                event_publisher.publish('user_events', 'updated', user.id, user.to_dict())
+            
+            return jsonify({
+                'message': 'User updated successfully',
+                'user': user.to_dict()
+            }), 200
+            
+        except Exception as e:
+            logger.error(f"User update error: {e}")
+            db.session.rollback()
+            return jsonify({'error': 'User update failed'}), 500
+
 
 def warm_cache(app):
     """Warm cache with all users on startup"""
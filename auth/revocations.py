@@ -0,0 +1,87 @@
+"""
+Token Revocation
+
+Revoked tokens and users are recorded in Redis until the affected
+tokens would have expired anyway, and announced on REVOCATION_CHANNEL
+so gateways drop them from their validated-token caches.
+
+- A single token (logout) is keyed by the SHA-256 of the encoded token.
+- A user (role change, disable) is keyed by id and holds the time
+  before which all of the user's tokens were issued.
+"""
+
+import hashlib
+import logging
+import time
+from typing import Optional
+
+from message_queue.redis_config import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_CHANNEL = 'auth_revocations'
+TOKEN_KEY_PREFIX = 'auth:revoked:token:'
+USER_KEY_PREFIX = 'auth:revoked:user:'
+
+
+def token_hash(token: str) -> str:
+    """Identifier of an encoded token that does not reveal it"""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def revoke_token(token: str, user_id: int, exp: int, publisher=None):
+    """
+    Revoke one token until its expiry.
+
+    Args:
+        token: Encoded JWT
+        user_id: Owner of the token
+        exp: The token's exp claim (epoch seconds)
+        publisher: EventPublisher to announce the revocation with
+    """
+    digest = token_hash(token)
+    ttl = int(exp - time.time())
+    if ttl <= 0:
+        return
+    get_redis_client().setex(f"{TOKEN_KEY_PREFIX}{digest}", ttl, exp)
+    if publisher:
+        publisher.publish(REVOCATION_CHANNEL, 'token_revoked', user_id, {'token_hash': digest, 'exp': exp})
+    logger.info(f"Revoked token of user {user_id}")
+
+
+def revoke_user(user_id: int, lifetime: int, reason: str, publisher=None):
+    """
+    Revoke every token issued to a user so far.
+
+    Args:
+        user_id: User whose tokens are revoked
+        lifetime: Seconds a token lives, the record is kept that long
+        reason: Why, for logs and subscribers ('logout_all', 'role_changed', 'disabled')
+        publisher: EventPublisher to announce the revocation with
+    """
+    # Tokens carry whole-second iat claims, so a token issued later in this
+    # second is revoked too
+    revoked_before = int(time.time()) + 1
+    get_redis_client().setex(f"{USER_KEY_PREFIX}{user_id}", lifetime, revoked_before)
+    if publisher:
+        publisher.publish(REVOCATION_CHANNEL, 'user_revoked', user_id,
+                          {'revoked_before': revoked_before, 'reason': reason})
+    logger.info(f"Revoked all tokens of user {user_id} ({reason})")
+
+
+def is_revoked(token: str, payload: dict) -> Optional[str]:
+    """
+    Check a verified token against the revocation records.
+
+    Returns:
+        The reason it is revoked, or None
+    """
+    user_id = payload.get('sub') or payload.get('user_id')
+    token_revoked, revoked_before = get_redis_client().mget(
+        f"{TOKEN_KEY_PREFIX}{token_hash(token)}", f"{USER_KEY_PREFIX}{user_id}"
+    )
+    if token_revoked is not None:
+        return 'Token has been revoked'
+    if revoked_before is not None and payload.get('iat', 0) < int(revoked_before):
+        return 'Token has been revoked'
+    return None
@@ -12,6 +12,7 @@ from models import Customer
 from message_queue.event_system import EventPublisher, EventConsumerProcess
 from message_queue.cache import warm_cache_sync, cache_entity, delete_cache, invalidate_list_cache
 from message_queue.supervisor import MultiProcessSupervisor
+from message_queue import deadline
 
 logging.basicConfig(
     level=logging.INFO,
@@ -45,6 +46,7 @@ def create_app():
     flask_app = Flask(__name__)
     flask_app.config.from_object(Config)
     db.init_app(flask_app)
+    deadline.init_app(flask_app, db)
     register_routes(flask_app)
     return flask_app
 
@@ -0,0 +1,7 @@
+-- Migration Script: User account status
+-- Description: Allow the auth service to disable user accounts
+-- Author: System
+-- Date: 2026-10-16
+
+ALTER TABLE users
+    ADD COLUMN is_active BOOLEAN NOT NULL DEFAULT TRUE AFTER role;
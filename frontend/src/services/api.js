@@ -114,4 +114,32 @@ export const orderService = {
   getByCustomer: (customerId) => api.get(`/orders/customer/${customerId}`)
 }
 
+// Dashboard KPIs (low stock, recent orders/procurements, catalog counts)
+export const dashboardService = {
+  get: () => api.get('/dashboard')
+}
+
+// Live updates over Server-Sent Events. Topics: storage, alerts, orders, procurements.
+// handlers maps topic -> callback(event); a 'reset' handler is called when missed
+// events could not be replayed and lists should be re-fetched. Returns the EventSource
+// (call .close() to unsubscribe); the browser reconnects and resumes by itself.
+export const streamService = {
+  subscribe: (topics, handlers) => {
+    const params = new URLSearchParams({ topics: topics.join(',') })
+    const token = sessionStorage.getItem('token')
+    if (token) params.set('access_token', token)
+    const source = new EventSource(`${API_BASE_URL}/stream?${params}`)
+    for (const [topic, handler] of Object.entries(handlers)) {
+      source.addEventListener(topic, (message) => handler(JSON.parse(message.data)))
+    }
+    return source
+  }
+}
+
+// Batch: several API calls in one round trip, e.g.
+// batchService.run([{ id: 'products', path: '/api/products', query: { limit: 50 } }])
+export const batchService = {
+  run: (requests) => api.post('/batch', { requests })
+}
+
 export default api
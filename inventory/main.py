@@ -12,10 +12,13 @@ from config import Config
 from db import db
 from models import Storage
 from message_queue.event_system import EventPublisher, EventConsumerProcess
-from message_queue.cache import warm_cache_sync, cache_entity, get_cached_entity
+from message_queue.cache import (warm_cache_sync, get_or_fetch,
+                                  cache_entities, get_cached_entities)
 from message_queue.circuit_breaker import CircuitBreaker
+from message_queue.local_cache import local_cache_stats
 from message_queue.supervisor import MultiProcessSupervisor
 from message_queue.redis_config import get_redis_client
+from message_queue import deadline
 
 logging.basicConfig(
     level=logging.INFO,
@@ -55,6 +58,7 @@ class InventoryEventConsumer(EventConsumerProcess):
             
             with self.flask_app.app_context():
                 storage = Storage.query.filter_by(product_id=product_id).first()
+                event_type = 'updated'
                 
                 if channel == 'procurement_stock_in':
                     if storage:
@@ -63,6 +67,7 @@ class InventoryEventConsumer(EventConsumerProcess):
                     else:
                         storage = Storage(product_id=product_id, quantity=quantity)
                         db.session.add(storage)
+                        event_type = 'created'
                         logger.info(f"Created new storage for product {product_id} with quantity: {quantity}")
                     
                 elif channel == 'order_stock_out':
@@ -91,6 +96,9 @@ class InventoryEventConsumer(EventConsumerProcess):
                 
                 db.session.commit()
                 
+                # Announce the resulting stock level once it is committed
+                EventPublisher().publish('inventory_events', event_type, storage.id, storage.to_dict())
+                
         except Exception as e:
             logger.error(f"Error handling inventory message: {e}")
             db.session.rollback()
@@ -100,30 +108,52 @@ def create_app():
     flask_app = Flask(__name__)
     flask_app.config.from_object(Config)
     db.init_app(flask_app)
+    deadline.init_app(flask_app, db)
     register_routes(flask_app)
     return flask_app
 
 
 def fetch_product_with_breaker(product_id):
-    """Fetch product from cache or service with circuit breaker"""
-    cached = get_cached_entity('product', product_id)
-    if cached:
-        return cached
+    """Fetch product from cache or service with circuit breaker (one refetch per product at a time)"""
+    return get_or_fetch('product', product_id, fetch_product_from_service, ttl=86400)
+
+
+def fetch_products_with_breaker(product_ids):
+    """
+    Fetch many products by ID: one cache round trip for all of them, then the
+    product service once per distinct miss. Returns the products found, by ID.
+    """
+    products, missing = get_cached_entities('product', product_ids)
+    fetched = {}
+    for product_id in missing:
+        product = fetch_product_from_service(product_id)
+        if product:
+            fetched[product_id] = product
+    cache_entities('product', fetched, ttl=86400)
+    products.update(fetched)
+    return products
+
+
+def fetch_product_from_service(product_id):
+    """Fetch product from the product service with circuit breaker, None on failure"""
+    # Not worth calling (or tripping the breaker) once the caller has given up
+    budget = deadline.timeout(5)
+    if budget is None:
+        logger.warning(f"Skipped fetching product {product_id}: request deadline is too close")
+        return None
     
     def fetch_product():
         response = requests.get(
             f"{Config.PRODUCT_SERVICE_URL}/products/{product_id}",
-            timeout=5
+            timeout=budget,
+            headers=deadline.outbound_headers()
         )
         if response.status_code == 200:
             return response.json()
         return None
     
     try:
-        product = product_breaker.call(fetch_product)
-        if product:
-            cache_entity('product', product_id, product, ttl=86400)
-        return product
+        return product_breaker.call(fetch_product)
     except Exception as e:
         logger.error(f"Failed to fetch product {product_id}: {e}")
         return None
@@ -140,7 +170,8 @@ def register_routes(app):
             'service': Config.SERVICE_NAME,
             'cache_warmed': cache_warmed,
             'consumer_running': consumer_running,
-            'product_breaker': product_breaker.get_state()
+            'product_breaker': product_breaker.get_state(),
+            'entity_l1': local_cache_stats()
         }), 200
 
     @app.route('/storages', methods=['GET'])
@@ -151,12 +182,13 @@ def register_routes(app):
             limit = request.args.get('limit', 50, type=int)
             storages = Storage.query.offset(start).limit(limit).all()
             
+            products = fetch_products_with_breaker([s.product_id for s in storages])
+            
             result = []
             for s in storages:
                 storage_dict = s.to_dict()
-                product = fetch_product_with_breaker(s.product_id)
-                if product:
-                    storage_dict['product'] = product
+                if s.product_id in products:
+                    storage_dict['product'] = products[s.product_id]
                 result.append(storage_dict)
             
             return jsonify({
@@ -209,6 +241,9 @@ def register_routes(app):
             db.session.add(storage)
             db.session.commit()
             
+            if event_publisher:
+                event_publisher.publish('inventory_events', 'created', storage.id, storage.to_dict())
+            
             logger.info(f"Storage created for product {storage.product_id}")
             return jsonify(storage.to_dict()), 201
         except Exception as e:
@@ -232,6 +267,9 @@ def register_routes(app):
             
             db.session.commit()
             
+            if event_publisher:
+                event_publisher.publish('inventory_events', 'updated', storage.id, storage.to_dict())
+            
             logger.info(f"Storage updated: product {storage.product_id}, quantity: {storage.quantity}")
             return jsonify(storage.to_dict()), 200
         except Exception as e:
@@ -239,6 +277,36 @@ def register_routes(app):
             db.session.rollback()
             return jsonify({'error': 'Failed to update storage'}), 500
 
+    @app.route('/storages/low-stock', methods=['GET'])
+    @app.route('/inventory/low-stock', methods=['GET'])
+    def get_low_stock():
+        """Storages below the low-stock threshold, lowest quantity first"""
+        try:
+            threshold = request.args.get('threshold', Config.LOW_STOCK_THRESHOLD, type=int)
+            limit = min(request.args.get('limit', 50, type=int), 500)
+            storages = (Storage.query
+                        .filter(Storage.quantity < threshold)
+                        .order_by(Storage.quantity.asc())
+                        .limit(limit).all())
+            
+            products = fetch_products_with_breaker([s.product_id for s in storages])
+            
+            result = []
+            for s in storages:
+                storage_dict = s.to_dict()
+                if s.product_id in products:
+                    storage_dict['product'] = products[s.product_id]
+                result.append(storage_dict)
+            
+            return jsonify({
+                'storages': result,
+                'threshold': threshold,
+                'count': len(result)
+            }), 200
+        except Exception as e:
+            logger.error(f"Error getting low stock storages: {e}")
+            return jsonify({'error': 'Failed to fetch storages'}), 500
+
     @app.route('/storages/product/<int:product_id>', methods=['GET'])
     @app.route('/inventory/product/<int:product_id>', methods=['GET'])
     def get_storage_by_product(product_id):
@@ -0,0 +1,175 @@
+"""
+Cache Benchmarks
+
+Measures the cache layer against a real Redis (REDIS_HOST/REDIS_PORT), using
+scratch entity types so service data is untouched.
+
+    python -m message_queue.benchmark invalidation --pages 100 1000 10000 100000
+
+    python -m message_queue.benchmark codec --redis
+
+invalidation: fills N cached list pages (plus unrelated keys, as a busy
+Redis holds), then times invalidating them with the generation counter
+(invalidate_list_cache) and with the previous SCAN+DELETE approach.
+
+codec: encoded size, encode and decode time of a single entity and of an
+enriched 50-row order page for each codec (see codec.py) whose packages
+are installed; with --redis also the MEMORY USAGE of the stored value.
+"""
+
+import argparse
+import json
+import statistics
+import time
+import timeit
+from typing import Any, Callable, Dict, List
+
+from message_queue.cache import cache_list, get_list_generation_key, invalidate_list_cache
+from message_queue.codec import CacheCodec
+from message_queue.redis_config import get_binary_redis_client, get_redis_client
+
+BENCH_TYPE = 'benchmark'
+
+
+def scan_delete_invalidation(entity_type: str):
+    """The previous invalidate_list_cache, kept for comparison"""
+    redis_client = get_redis_client()
+    for key in redis_client.scan_iter(match=f"cache:{entity_type}:list:*"):
+        redis_client.delete(key)
+
+
+def fill_pages(entity_type: str, pages: int, background: int):
+    redis_client = get_redis_client()
+    page = [{'id': i, 'name': f'item {i}'} for i in range(50)]
+    for n in range(pages):
+        cache_list(entity_type, f'page_{n}_limit_50', page, ttl=600)
+    pipeline = redis_client.pipeline(transaction=False)
+    for n in range(background):
+        pipeline.setex(f'cache:{BENCH_TYPE}_noise:{n}', 600, 'x')
+        if n % 1000 == 999:
+            pipeline.execute()
+    pipeline.execute()
+
+
+def cleanup(entity_type: str):
+    redis_client = get_redis_client()
+    for pattern in (f'cache:{entity_type}:list:*', f'cache:{BENCH_TYPE}_noise:*'):
+        keys = list(redis_client.scan_iter(match=pattern, count=1000))
+        for i in range(0, len(keys), 1000):
+            redis_client.delete(*keys[i:i + 1000])
+    redis_client.delete(get_list_generation_key(entity_type))
+
+
+def time_invalidation(invalidate: Callable[[str], None], entity_type: str, pages: int, background: int,
+                      repeat: int) -> List[float]:
+    timings = []
+    for _ in range(repeat):
+        fill_pages(entity_type, pages, background)
+        started = time.perf_counter()
+        invalidate(entity_type)
+        timings.append(time.perf_counter() - started)
+        cleanup(entity_type)
+    return timings
+
+
+def run_invalidation(page_counts: List[int], background: int, repeat: int) -> List[Dict]:
+    results = []
+    for pages in page_counts:
+        generation = time_invalidation(invalidate_list_cache, BENCH_TYPE, pages, background, repeat)
+        scan_delete = time_invalidation(scan_delete_invalidation, BENCH_TYPE, pages, background, repeat)
+        results.append({
+            'pages': pages,
+            'generation_ms': round(statistics.median(generation) * 1000, 3),
+            'scan_delete_ms': round(statistics.median(scan_delete) * 1000, 3),
+        })
+    return results
+
+
+CODECS = {
+    'json': ('json', 'none'),
+    'msgpack': ('msgpack', 'none'),
+    'msgpack+zstd': ('msgpack', 'zstd'),
+    'msgpack+lz4': ('msgpack', 'lz4'),
+}
+
+
+def sample_product(n: int) -> Dict:
+    return {
+        'id': n, 'code': f'PROD{n:05d}', 'name': f'Product {n}', 'category': 'Electronics',
+        'unit_price': 199.99, 'unit_measure': 'piece', 'supplier_id': n % 40 + 1,
+        'supplier': {'id': n % 40 + 1, 'name': f'Supplier {n % 40 + 1}', 'city': 'Springfield',
+                     'email': f'sales{n % 40 + 1}@supplier.example', 'phone': '+1-555-0100'},
+    }
+
+
+def sample_order_page(rows: int = 50) -> List[Dict]:
+    return [{
+        'id': n, 'product_id': n % 200 + 1, 'customer_id': n % 80 + 1, 'quantity': n % 17 + 1,
+        'unit_price': 199.99, 'total_cost': 199.99 * (n % 17 + 1), 'created_at': '2026-01-15T10:30:00',
+        'customer': {'id': n % 80 + 1, 'name': f'Customer {n % 80 + 1}', 'city': 'Shelbyville',
+                     'email': f'buyer{n % 80 + 1}@customer.example', 'phone': '+1-555-0199'},
+        'product': sample_product(n % 200 + 1),
+    } for n in range(rows)]
+
+
+def measure_codec(codec: CacheCodec, value: Any, number: int, redis_client=None) -> Dict:
+    encoded = codec.encode(value)
+    result = {
+        'bytes': len(encoded),
+        'encode_us': round(min(timeit.repeat(lambda: codec.encode(value), number=number, repeat=5))
+                           / number * 1e6, 2),
+        'decode_us': round(min(timeit.repeat(lambda: codec.decode(encoded), number=number, repeat=5))
+                           / number * 1e6, 2),
+    }
+    if redis_client is not None:
+        key = f'cache:{BENCH_TYPE}:codec'
+        redis_client.set(key, encoded)
+        result['redis_memory_bytes'] = redis_client.memory_usage(key, samples=0)
+        redis_client.delete(key)
+    return result
+
+
+def run_codec(number: int, use_redis: bool, compress_min_bytes: int) -> List[Dict]:
+    redis_client = get_binary_redis_client() if use_redis else None
+    samples = {'entity': sample_product(1), 'order_page': sample_order_page()}
+    results = []
+    for name, (codec_name, compression) in CODECS.items():
+        try:
+            codec = CacheCodec(codec_name, compression, compress_min_bytes)
+        except ValueError as e:
+            results.append({'codec': name, 'skipped': str(e)})
+            continue
+        for sample, value in samples.items():
+            results.append(dict(codec=name, sample=sample,
+                                **measure_codec(codec, value, number, redis_client)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Redis cache layer')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    invalidation = commands.add_parser('invalidation', help='List-cache invalidation cost by number of pages')
+    invalidation.add_argument('--pages', type=int, nargs='+', default=[100, 1000, 10000],
+                              help='Cached page counts to measure')
+    invalidation.add_argument('--background', type=int, default=10000,
+                              help='Unrelated keys in Redis during the measurement')
+    invalidation.add_argument('--repeat', type=int, default=5, help='Runs per page count (median reported)')
+
+    codec = commands.add_parser('codec', help='Size and speed of the cache value codecs')
+    codec.add_argument('--number', type=int, default=2000, help='Encodes/decodes per timing run')
+    codec.add_argument('--compress-min-bytes', type=int, default=1024,
+                       help='Compression threshold, as CACHE_COMPRESS_MIN_BYTES')
+    codec.add_argument('--redis', action='store_true', help='Also measure MEMORY USAGE in Redis')
+
+    args = parser.parse_args()
+    if args.command == 'invalidation':
+        results = run_invalidation(args.pages, args.background, args.repeat)
+    else:
+        results = run_codec(args.number, args.redis, args.compress_min_bytes)
+    for result in results:
+        print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,17 +3,65 @@ Redis Cache Layer for Entity Caching
 
 Provides functions for caching entities with TTL, warming cache on startup,
 and fetching with circuit breaker fallback to source services.
+
+get_or_fetch lets one caller per key refetch a missing entity (the others
+wait for its result) and refreshes hot entities shortly before they expire.
+
+Values are stored in the format chosen by CACHE_CODEC (see codec.py);
+every format is readable whatever the setting.
+
+With ENTITY_L1_ENABLED, entity lookups are served from an in-process cache
+(see local_cache.py) before Redis; writes and deletes publish an
+invalidation so every process drops its stale copy.
 """
 
-import json
 import logging
+import math
+import os
+import random
+import time
+import uuid
 import redis
-from typing import Any, Dict, List, Optional, Callable
-from message_queue.redis_config import get_redis_client
+from typing import Any, Dict, Iterable, List, Optional, Callable, Tuple
+from message_queue.redis_config import get_binary_redis_client
 from message_queue.circuit_breaker import CircuitBreaker
+from message_queue.local_cache import INVALIDATION_CHANNEL, get_local_cache, invalidation_message
+from message_queue import codec, deadline
 
 logger = logging.getLogger(__name__)
 
+# Refetch leases: how long one is held at most, and how long other callers wait for its result
+LOCK_TTL = float(os.environ.get('CACHE_LOCK_TTL', 5))
+LOCK_WAIT = float(os.environ.get('CACHE_LOCK_WAIT', 0.5))
+LOCK_POLL_INTERVAL = 0.02
+
+# XFetch early refresh; 0 disables it, larger values refresh earlier
+EARLY_REFRESH_BETA = float(os.environ.get('CACHE_EARLY_REFRESH_BETA', 1.0))
+DEFAULT_REFETCH_SECONDS = 0.1
+
+# Moving average of refetch durations by entity type, in seconds
+_refetch_seconds: Dict[str, float] = {}
+
+# Delete the lease only if it is still ours (it may have expired and been retaken)
+_RELEASE_LEASE = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+# Lua source -> registered Script, shared by every client of the binary pool. A Script
+# keeps its SHA and runs EVALSHA, sending the body only when Redis does not have it.
+_scripts: Dict[str, Any] = {}
+
+
+def _script(source: str):
+    """Registered Script for a Lua source, created on first use"""
+    script = _scripts.get(source)
+    if script is None:
+        script = _scripts[source] = get_binary_redis_client().register_script(source)
+    return script
+
 
 def get_cache_key(entity_type: str, entity_id: int) -> str:
     """
@@ -40,15 +88,18 @@ def cache_entity(entity_type: str, entity_id: int, data: Dict, ttl: int = 86400)
         ttl: Time to live in seconds (default: 24 hours)
     """
     try:
-        redis_client = get_redis_client()
+        redis_client = get_binary_redis_client()
         cache_key = get_cache_key(entity_type, entity_id)
         
-        # Store as JSON string
-        redis_client.setex(
-            cache_key,
-            ttl,
-            json.dumps(data)
-        )
+        # Store encoded (see codec.py) and tell other processes to drop their L1 copy
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.setex(cache_key, ttl, codec.encode(data))
+        pipeline.publish(INVALIDATION_CHANNEL, invalidation_message(entity_type, entity_id))
+        pipeline.execute()
+
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            local_cache.invalidate(entity_type, entity_id)
         logger.debug(f"Cached {entity_type}:{entity_id} with TTL {ttl}s")
         
     except Exception as e:
@@ -57,30 +108,134 @@ def cache_entity(entity_type: str, entity_id: int, data: Dict, ttl: int = 86400)
 
 def get_cached_entity(entity_type: str, entity_id: int) -> Optional[Dict]:
     """
-    Retrieve entity from cache.
+    Retrieve entity from cache (L1 first, if enabled, then Redis).
     
     Args:
         entity_type: Type of entity
         entity_id: ID of the entity
         
     Returns:
-        Entity data dictionary or None if not found
+        Entity data dictionary or None if not found. With L1 enabled the
+        dictionary may be shared with other callers; do not modify it.
     """
+    return _read_entity(entity_type, entity_id)[0]
+
+
+def _read_entity(entity_type: str, entity_id: int) -> Tuple[Optional[Dict], Optional[float]]:
+    """Cached entity and the seconds its Redis entry has left (None if served by the L1)"""
+    local_cache = get_local_cache()
+    if local_cache is not None:
+        cached = local_cache.get(entity_type, entity_id)
+        if cached is not None:
+            return cached, None
+
     try:
-        redis_client = get_redis_client()
+        redis_client = get_binary_redis_client()
         cache_key = get_cache_key(entity_type, entity_id)
         
-        cached_data = redis_client.get(cache_key)
+        generation = local_cache.generation(entity_type) if local_cache is not None else None
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.get(cache_key)
+        pipeline.pttl(cache_key)
+        cached_data, pttl = pipeline.execute()
         if cached_data:
             logger.debug(f"Cache HIT for {entity_type}:{entity_id}")
-            return json.loads(cached_data)
+            data = codec.decode(cached_data)
+            ttl = pttl / 1000 if pttl and pttl > 0 else None
+            if local_cache is not None and ttl:
+                local_cache.set(entity_type, entity_id, data, len(cached_data), ttl, generation)
+            return data, ttl
         else:
             logger.debug(f"Cache MISS for {entity_type}:{entity_id}")
-            return None
+            return None, None
             
     except Exception as e:
         logger.error(f"Failed to get cached {entity_type}:{entity_id}: {e}")
-        return None
+        return None, None
+
+
+def get_cached_entities(entity_type: str, entity_ids: Iterable[int]) -> Tuple[Dict[int, Dict], List[int]]:
+    """
+    Retrieve many entities from cache in one Redis round trip (MGET), after the L1.
+    
+    Args:
+        entity_type: Type of entity
+        entity_ids: IDs of the entities (duplicates are looked up once)
+        
+    Returns:
+        (entities found by ID, IDs not in cache). A Redis error counts as
+        a miss for every ID not found in the L1.
+    """
+    ids = list(dict.fromkeys(entity_ids))
+    found = {}
+    local_cache = get_local_cache()
+    if local_cache is not None:
+        for entity_id in ids:
+            cached = local_cache.get(entity_type, entity_id)
+            if cached is not None:
+                found[entity_id] = cached
+        ids = [entity_id for entity_id in ids if entity_id not in found]
+    if not ids:
+        return found, []
+
+    try:
+        redis_client = get_binary_redis_client()
+        keys = [get_cache_key(entity_type, entity_id) for entity_id in ids]
+        
+        if local_cache is not None:
+            generation = local_cache.generation(entity_type)
+            pipeline = redis_client.pipeline(transaction=False)
+            pipeline.mget(keys)
+            for key in keys:
+                pipeline.ttl(key)
+            values, *ttls = pipeline.execute()
+        else:
+            values, ttls = redis_client.mget(keys), [None] * len(keys)
+        
+        missing = []
+        for entity_id, value, ttl in zip(ids, values, ttls):
+            if not value:
+                missing.append(entity_id)
+                continue
+            data = codec.decode(value)
+            if local_cache is not None and ttl and ttl > 0:
+                local_cache.set(entity_type, entity_id, data, len(value), ttl, generation)
+            found[entity_id] = data
+        logger.debug(f"Cache multi-get {entity_type}: {len(found)} hits, {len(missing)} misses")
+        return found, missing
+        
+    except Exception as e:
+        logger.error(f"Failed to get cached {entity_type} entities: {e}")
+        return found, ids
+
+
+def cache_entities(entity_type: str, entities: Dict[int, Dict], ttl: int = 86400):
+    """
+    Cache many entities in one Redis round trip (pipelined SETEX).
+    
+    Args:
+        entity_type: Type of entity
+        entities: Entity data dictionaries by ID
+        ttl: Time to live in seconds (default: 24 hours)
+    """
+    if not entities:
+        return
+    try:
+        redis_client = get_binary_redis_client()
+        pipeline = redis_client.pipeline(transaction=False)
+        for entity_id, data in entities.items():
+            pipeline.setex(get_cache_key(entity_type, entity_id), ttl, codec.encode(data))
+            pipeline.publish(INVALIDATION_CHANNEL, invalidation_message(entity_type, entity_id))
+        pipeline.execute()
+
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            for entity_id in entities:
+                local_cache.invalidate(entity_type, entity_id)
+        logger.debug(f"Cached {len(entities)} {entity_type} entities with TTL {ttl}s")
+        
+    except Exception as e:
+        logger.error(f"Failed to cache {entity_type} entities: {e}")
 
 
 def delete_cache(entity_type: str, entity_id: int):
@@ -92,9 +247,16 @@ def delete_cache(entity_type: str, entity_id: int):
         entity_id: ID of the entity
     """
     try:
-        redis_client = get_redis_client()
+        redis_client = get_binary_redis_client()
         cache_key = get_cache_key(entity_type, entity_id)
-        redis_client.delete(cache_key)
+        pipeline = redis_client.pipeline(transaction=False)
+        pipeline.delete(cache_key)
+        pipeline.publish(INVALIDATION_CHANNEL, invalidation_message(entity_type, entity_id))
+        pipeline.execute()
+
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            local_cache.invalidate(entity_type, entity_id)
         logger.info(f"Invalidated cache for {entity_type}:{entity_id}")
         
     except Exception as e:
@@ -111,7 +273,7 @@ def warm_cache_sync(entity_type: str, entities: List[Dict], ttl: int = 86400):
         ttl: Time to live in seconds (default: 24 hours)
     """
     try:
-        redis_client = get_redis_client()
+        redis_client = get_binary_redis_client()
         pipeline = redis_client.pipeline()
         
         for entity in entities:
@@ -124,10 +286,15 @@ def warm_cache_sync(entity_type: str, entities: List[Dict], ttl: int = 86400):
             pipeline.setex(
                 cache_key,
                 ttl,
-                json.dumps(entity)
+                codec.encode(entity)
             )
+        pipeline.publish(INVALIDATION_CHANNEL, invalidation_message(entity_type))
         
         pipeline.execute()
+
+        local_cache = get_local_cache()
+        if local_cache is not None:
+            local_cache.invalidate(entity_type)
         logger.info(f"Warmed cache with {len(entities)} {entity_type} entities")
         
     except Exception as e:
@@ -135,6 +302,80 @@ def warm_cache_sync(entity_type: str, entities: List[Dict], ttl: int = 86400):
         raise
 
 
+def _should_refresh_early(entity_type: str, ttl: Optional[float]) -> bool:
+    """
+    XFetch: refresh before expiry with a probability that rises as the entry
+    ages, scaled by how long a refetch takes, so one caller renews a hot key
+    before the rest of them can miss it together.
+    """
+    if ttl is None or EARLY_REFRESH_BETA <= 0:
+        return False
+    delta = _refetch_seconds.get(entity_type, DEFAULT_REFETCH_SECONDS)
+    return -delta * EARLY_REFRESH_BETA * math.log(1.0 - random.random()) >= ttl
+
+
+def _wait_for_entity(entity_type: str, entity_id: int) -> Optional[Dict]:
+    """Poll for the entity another caller is refetching, None if it does not appear in time"""
+    wait = LOCK_WAIT
+    left = deadline.remaining()
+    if left is not None:
+        wait = min(wait, left - deadline.MIN_BUDGET)
+    give_up_at = time.monotonic() + wait
+    while time.monotonic() < give_up_at:
+        time.sleep(LOCK_POLL_INTERVAL)
+        cached = get_cached_entity(entity_type, entity_id)
+        if cached is not None:
+            return cached
+    return None
+
+
+def _refetch(
+    entity_type: str,
+    entity_id: int,
+    fetch_callback: Callable[[int], Optional[Dict]],
+    ttl: int,
+    stale: Optional[Dict]
+) -> Optional[Dict]:
+    """
+    Refetch an entity under its lease, so only one caller per key hits the source.
+    Callers that lose the race get the stale value, or wait for the winner's result.
+    """
+    redis_client = get_binary_redis_client()
+    lock_key = f"cache:lock:{entity_type}:{entity_id}"
+    token = uuid.uuid4().hex
+    try:
+        leased = bool(redis_client.set(lock_key, token, nx=True, px=int(LOCK_TTL * 1000)))
+    except Exception as e:
+        # Without Redis there is nothing to coordinate on; fetch unprotected
+        logger.warning(f"Could not take lease for {entity_type}:{entity_id}: {e}")
+        leased = None
+
+    if leased is False:
+        if stale is not None:
+            return stale
+        cached = _wait_for_entity(entity_type, entity_id)
+        if cached is not None:
+            return cached
+        logger.warning(f"Lease holder of {entity_type}:{entity_id} is slow, fetching directly")
+
+    try:
+        started = time.monotonic()
+        entity_data = fetch_callback(entity_id)
+        elapsed = time.monotonic() - started
+        previous = _refetch_seconds.get(entity_type, elapsed)
+        _refetch_seconds[entity_type] = 0.8 * previous + 0.2 * elapsed
+        if entity_data:
+            # Cache for future requests (before releasing, so waiters find it)
+            cache_entity(entity_type, entity_id, entity_data, ttl)
+        return entity_data
+    finally:
+        if leased:
+            try:
+                _script(_RELEASE_LEASE)(keys=[lock_key], args=[token], client=redis_client)
+            except Exception as e:
+                logger.warning(f"Could not release lease for {entity_type}:{entity_id}: {e}")
+
+
 def get_or_fetch(
     entity_type: str,
     entity_id: int,
@@ -144,6 +385,9 @@ def get_or_fetch(
     """
     Get entity from cache or fetch from source (cache-aside pattern).
     
+    Concurrent misses on one key share a single fetch (per-key lease), and hot
+    keys are refreshed shortly before they expire (see _should_refresh_early).
+    
     Args:
         entity_type: Type of entity
         entity_id: ID of the entity
@@ -151,24 +395,21 @@ def get_or_fetch(
         ttl: Time to live in seconds
         
     Returns:
-        Entity data dictionary or None if not found
+        Entity data dictionary or None if not found. If an early refresh
+        fails, the cached value is returned.
     """
     # Try cache first
-    cached = get_cached_entity(entity_type, entity_id)
-    if cached is not None:
+    cached, remaining_ttl = _read_entity(entity_type, entity_id)
+    if cached is not None and not _should_refresh_early(entity_type, remaining_ttl):
         return cached
     
     # Fetch from source
     try:
-        entity_data = fetch_callback(entity_id)
-        if entity_data:
-            # Cache for future requests
-            cache_entity(entity_type, entity_id, entity_data, ttl)
-        return entity_data
+        return _refetch(entity_type, entity_id, fetch_callback, ttl, cached) or cached
         
     except Exception as e:
         logger.error(f"Failed to fetch {entity_type}:{entity_id}: {e}")
-        return None
+        return cached
 
 
 def get_or_fetch_with_breaker(
@@ -191,30 +432,59 @@ def get_or_fetch_with_breaker(
     Returns:
         Entity data dictionary or None if not found
     """
-    # Try cache first
-    cached = get_cached_entity(entity_type, entity_id)
-    if cached is not None:
-        return cached
+    def fetch(entity_id):
+        try:
+            return breaker.call(fetch_callback, entity_id)
+        except Exception as e:
+            logger.error(
+                f"Failed to fetch {entity_type}:{entity_id} "
+                f"(Circuit breaker: {breaker.get_state()}): {e}"
+            )
+            return None
     
-    # Fetch from source with circuit breaker
-    try:
-        entity_data = breaker.call(fetch_callback, entity_id)
-        if entity_data:
-            # Cache for future requests
-            cache_entity(entity_type, entity_id, entity_data, ttl)
-        return entity_data
-        
-    except Exception as e:
-        logger.error(
-            f"Failed to fetch {entity_type}:{entity_id} "
-            f"(Circuit breaker: {breaker.get_state()}): {e}"
-        )
-        return None
+    return get_or_fetch(entity_type, entity_id, fetch, ttl)
+
+
+def get_list_generation_key(entity_type: str) -> str:
+    """Key of the entity type's list generation; its list pages live under cache:{type}:list:{generation}:"""
+    return f"cache:{entity_type}:list_generation"
+
+
+# The page key depends on the generation, so these scripts derive it themselves
+# (fine on the single Redis instance the services share; not cluster-safe).
+# A missing generation (never set, or evicted by allkeys-lru) means no page is
+# valid; the next write seeds a new one from the server clock, which is above
+# every generation handed out before, so old pages can never become current again.
+_GET_LIST = """
+local generation = redis.call('get', KEYS[1])
+if not generation then
+    return false
+end
+return redis.call('get', ARGV[1] .. generation .. ':' .. ARGV[2])
+"""
+
+_SET_LIST = """
+local generation = redis.call('get', KEYS[1])
+if not generation then
+    local now = redis.call('time')
+    generation = now[1] .. string.format('%06d', tonumber(now[2]))
+    redis.call('set', KEYS[1], generation)
+end
+redis.call('setex', ARGV[1] .. generation .. ':' .. ARGV[2], ARGV[3], ARGV[4])
+return generation
+"""
+
+_INVALIDATE_LISTS = """
+if redis.call('exists', KEYS[1]) == 1 then
+    return redis.call('incr', KEYS[1])
+end
+return false
+"""
 
 
 def cache_list(entity_type: str, list_key: str, data: List[Dict], ttl: int = 3600):
     """
-    Cache a list of entities (for paginated results).
+    Cache a list of entities (for paginated results) under the current list generation.
     
     Args:
         entity_type: Type of entity
@@ -223,13 +493,11 @@ def cache_list(entity_type: str, list_key: str, data: List[Dict], ttl: int = 360
         ttl: Time to live in seconds (default: 1 hour)
     """
     try:
-        redis_client = get_redis_client()
-        cache_key = f"cache:{entity_type}:list:{list_key}"
-        
-        redis_client.setex(
-            cache_key,
-            ttl,
-            json.dumps(data)
+        redis_client = get_binary_redis_client()
+        _script(_SET_LIST)(
+            keys=[get_list_generation_key(entity_type)],
+            args=[f"cache:{entity_type}:list:", list_key, ttl, codec.encode(data)],
+            client=redis_client
         )
         logger.debug(f"Cached list {entity_type}:{list_key}")
         
@@ -239,7 +507,7 @@ def cache_list(entity_type: str, list_key: str, data: List[Dict], ttl: int = 360
 
 def get_cached_list(entity_type: str, list_key: str) -> Optional[List[Dict]]:
     """
-    Retrieve cached list.
+    Retrieve cached list of the current list generation.
     
     Args:
         entity_type: Type of entity
@@ -249,12 +517,14 @@ def get_cached_list(entity_type: str, list_key: str) -> Optional[List[Dict]]:
         List of entity dictionaries or None if not found
     """
     try:
-        redis_client = get_redis_client()
-        cache_key = f"cache:{entity_type}:list:{list_key}"
-        
-        cached_data = redis_client.get(cache_key)
+        redis_client = get_binary_redis_client()
+        cached_data = _script(_GET_LIST)(
+            keys=[get_list_generation_key(entity_type)],
+            args=[f"cache:{entity_type}:list:", list_key],
+            client=redis_client
+        )
         if cached_data:
-            return json.loads(cached_data)
+            return codec.decode(cached_data)
         return None
         
     except Exception as e:
@@ -266,17 +536,16 @@ def invalidate_list_cache(entity_type: str):
     """
     Invalidate all list caches for an entity type.
     
+    A single INCR of the type's list generation: pages cached under earlier
+    generations are no longer read and expire by their TTL, so the cost does
+    not depend on how many pages (or other keys) Redis holds.
+    
     Args:
         entity_type: Type of entity
     """
     try:
-        redis_client = get_redis_client()
-        pattern = f"cache:{entity_type}:list:*"
-        
-        # Scan and delete matching keys
-        for key in redis_client.scan_iter(match=pattern):
-            redis_client.delete(key)
-            
+        redis_client = get_binary_redis_client()
+        _script(_INVALIDATE_LISTS)(keys=[get_list_generation_key(entity_type)], client=redis_client)
         logger.info(f"Invalidated all list caches for {entity_type}")
         
     except Exception as e:
@@ -0,0 +1,144 @@
+"""
+Cached Value Codecs
+
+Encodes the values cache.py stores in Redis. CACHE_CODEC selects what is
+written:
+
+- json: JSON text, the original format
+- msgpack: a marker byte followed by MessagePack; values of at least
+  CACHE_COMPRESS_MIN_BYTES are compressed with CACHE_COMPRESSION (zstd or lz4)
+
+Markers (JSON text never starts with these bytes):
+
+    0x01  msgpack
+    0x02  msgpack, zstd-compressed
+    0x03  msgpack, lz4-compressed (frame format)
+
+Readers decode every format regardless of the configured codec, so the
+codec can be switched, or rolled back to json, without flushing Redis.
+Every process that reads the cache needs the packages of the formats in
+use before any writer switches to them (the API gateway decodes entity
+keys too, with this module: api_gateway/entity_cache.py).
+"""
+
+import json
+import os
+from typing import Any, Optional
+
+try:
+    import msgpack
+except ImportError:  # optional dependency
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional dependency
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:  # optional dependency
+    lz4 = None
+
+MSGPACK = 0x01
+MSGPACK_ZSTD = 0x02
+MSGPACK_LZ4 = 0x03
+
+ZSTD_LEVEL = 3
+
+
+class CodecConfig:
+    """Codec settings, from the environment"""
+    CODEC = os.environ.get('CACHE_CODEC', 'json').lower()
+    COMPRESSION = os.environ.get('CACHE_COMPRESSION', 'none').lower()
+    COMPRESS_MIN_BYTES = int(os.environ.get('CACHE_COMPRESS_MIN_BYTES', 1024))
+
+
+class CacheCodec:
+    """
+    Encoder for one configuration; decodes all formats.
+
+    Args:
+        codec: 'json' or 'msgpack'
+        compression: 'none', 'zstd' or 'lz4' (msgpack only)
+        compress_min_bytes: Smaller values are stored uncompressed
+
+    Raises:
+        ValueError: Unknown codec or compression, or its package is not installed
+    """
+
+    def __init__(self, codec: str = 'json', compression: str = 'none', compress_min_bytes: int = 1024):
+        if codec not in ('json', 'msgpack'):
+            raise ValueError(f"Unknown cache codec {codec!r}")
+        if compression not in ('none', 'zstd', 'lz4'):
+            raise ValueError(f"Unknown cache compression {compression!r}")
+        if codec == 'msgpack' and msgpack is None:
+            raise ValueError("CACHE_CODEC=msgpack requires the msgpack package")
+        if compression == 'zstd' and zstandard is None:
+            raise ValueError("CACHE_COMPRESSION=zstd requires the zstandard package")
+        if compression == 'lz4' and lz4 is None:
+            raise ValueError("CACHE_COMPRESSION=lz4 requires the lz4 package")
+        self.codec = codec
+        self.compression = compression if codec == 'msgpack' else 'none'
+        self.compress_min_bytes = compress_min_bytes
+
+    def encode(self, value: Any) -> bytes:
+        if self.codec == 'json':
+            return json.dumps(value).encode('utf-8')
+        packed = msgpack.packb(value, use_bin_type=True)
+        if len(packed) >= self.compress_min_bytes:
+            if self.compression == 'zstd':
+                return bytes((MSGPACK_ZSTD,)) + zstandard.compress(packed, ZSTD_LEVEL)
+            if self.compression == 'lz4':
+                return bytes((MSGPACK_LZ4,)) + lz4.frame.compress(packed)
+        return bytes((MSGPACK,)) + packed
+
+    @staticmethod
+    def decode(data) -> Any:
+        """
+        Decode a value in any format (str or bytes).
+
+        Raises:
+            ValueError: Unknown marker, or the format's package is not installed
+        """
+        if isinstance(data, str):
+            return json.loads(data)
+        marker = data[0] if data else None
+        if marker == MSGPACK:
+            return _unpack(data[1:])
+        if marker == MSGPACK_ZSTD:
+            if zstandard is None:
+                raise ValueError("Cached value is zstd-compressed but zstandard is not installed")
+            return _unpack(zstandard.decompress(data[1:]))
+        if marker == MSGPACK_LZ4:
+            if lz4 is None:
+                raise ValueError("Cached value is lz4-compressed but lz4 is not installed")
+            return _unpack(lz4.frame.decompress(data[1:]))
+        if marker is not None and marker < 0x20 and marker not in b'\t\n\r':
+            raise ValueError(f"Unknown cached value format 0x{marker:02x}")
+        return json.loads(data)
+
+
+def _unpack(packed: bytes) -> Any:
+    if msgpack is None:
+        raise ValueError("Cached value is msgpack but msgpack is not installed")
+    return msgpack.unpackb(packed, raw=False)
+
+
+_codec: Optional[CacheCodec] = None
+
+
+def get_codec() -> CacheCodec:
+    """The codec configured by CACHE_CODEC, CACHE_COMPRESSION and CACHE_COMPRESS_MIN_BYTES"""
+    global _codec
+    if _codec is None:
+        _codec = CacheCodec(CodecConfig.CODEC, CodecConfig.COMPRESSION, CodecConfig.COMPRESS_MIN_BYTES)
+    return _codec
+
+
+def encode(value: Any) -> bytes:
+    return get_codec().encode(value)
+
+
+def decode(data) -> Any:
+    return CacheCodec.decode(data)
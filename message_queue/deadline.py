@@ -0,0 +1,125 @@
+"""
+Request Deadlines
+
+The API gateway sends each request with an absolute deadline (epoch
+seconds) in the X-Request-Deadline header: the moment it stops waiting
+for the reply. Services use it to avoid work nobody will receive:
+
+- Requests that arrive past their deadline are answered with 504
+  before touching the database, marked with X-Deadline-Exceeded so the
+  gateway does not take them for an unhealthy service.
+- SELECT statements get a MAX_EXECUTION_TIME hint for the remaining
+  budget, so MySQL aborts queries the client no longer waits for.
+- Outbound calls use the remaining budget as their timeout, pass the
+  deadline on, and are skipped once too little is left.
+
+Outside a request (event consumers, cache warming) there is no
+deadline and everything runs unrestricted.
+"""
+
+import logging
+import os
+import time
+from typing import Dict, Optional
+
+from flask import g, has_request_context, jsonify, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+DEADLINE_HEADER = 'X-Request-Deadline'
+# Set on 504s caused by the deadline, so the gateway does not count them against the service's health
+EXCEEDED_HEADER = 'X-Deadline-Exceeded'
+
+# Below this many seconds an outbound call or query is not worth starting
+MIN_BUDGET = float(os.environ.get('DEADLINE_MIN_BUDGET', 0.05))
+
+
+def get_deadline() -> Optional[float]:
+    """Deadline of the current request, None if it has none"""
+    if not has_request_context():
+        return None
+    return g.get('deadline')
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current request's deadline, None if unbounded"""
+    deadline = get_deadline()
+    if deadline is None:
+        return None
+    return deadline - time.time()
+
+
+def expired(min_budget: float = MIN_BUDGET) -> bool:
+    """True if less than min_budget seconds are left"""
+    left = remaining()
+    return left is not None and left < min_budget
+
+
+def timeout(default: float) -> Optional[float]:
+    """
+    Timeout for an outbound call: the default, capped at the remaining budget.
+
+    Returns:
+        Seconds to wait, or None if the call should be skipped (budget spent);
+        skipping is recorded so the handler can avoid caching a degraded result
+    """
+    left = remaining()
+    if left is None:
+        return default
+    if left < MIN_BUDGET:
+        g.deadline_skipped = True
+        return None
+    return min(default, left)
+
+
+def skipped_work() -> bool:
+    """True if the current request skipped calls because its deadline was near"""
+    return has_request_context() and g.get('deadline_skipped', False)
+
+
+def exceeded_response():
+    """504 for a request whose deadline ran out, marked as such for the gateway"""
+    return jsonify({'error': 'Request deadline exceeded'}), 504, {EXCEEDED_HEADER: '1'}
+
+
+def outbound_headers() -> Dict[str, str]:
+    """Headers that pass the current deadline on to another service"""
+    deadline = get_deadline()
+    return {DEADLINE_HEADER: f"{deadline:.3f}"} if deadline is not None else {}
+
+
+def _add_execution_time_hint(conn, cursor, statement, parameters, context, executemany):
+    left = remaining()
+    if left is None or statement.lstrip()[:6].upper() != 'SELECT':
+        return statement, parameters
+    milliseconds = max(1, int(left * 1000))
+    statement = statement.lstrip()
+    return f"SELECT /*+ MAX_EXECUTION_TIME({milliseconds}) */{statement[6:]}", parameters
+
+
+def init_app(app, db=None):
+    """
+    Read request deadlines in a Flask service.
+
+    Args:
+        app: Flask application
+        db: Flask-SQLAlchemy instance whose SELECTs are bounded by the deadline
+    """
+    @app.before_request
+    def read_deadline():
+        value = request.headers.get(DEADLINE_HEADER)
+        if not value:
+            return None
+        try:
+            g.deadline = float(value)
+        except ValueError:
+            return None
+        if expired():
+            logger.warning(f"Dropping {request.method} {request.path}: deadline passed before it was handled")
+            return exceeded_response()
+        return None
+
+    if db is not None:
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', _add_execution_time_hint, retval=True)
@@ -0,0 +1,229 @@
+"""
+In-Process Entity Cache (L1)
+
+An optional bounded LRU in front of the Redis entity cache, so repeated
+lookups of the same entity are dictionary hits instead of a Redis round
+trip plus decoding.
+
+- Entries expire after ENTITY_L1_TTL seconds (never later than in Redis).
+- Each entity type holds at most ENTITY_L1_MAX_ENTRIES entries
+  (ENTITY_L1_MAX_ENTRIES_<TYPE> overrides it per type), and all types
+  together at most ENTITY_L1_MAX_BYTES of cached values (encoded size).
+- cache_entity/delete_cache announce changes on INVALIDATION_CHANNEL;
+  a listener thread in every process evicts the entry from its own L1.
+  While the listener is not subscribed invalidations would be missed, so
+  the L1 is bypassed (neither read nor filled) and it is cleared again
+  once the listener has resubscribed.
+
+Cached dicts are shared between callers and must be treated as read-only.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from message_queue.event_system import get_pubsub_redis_client
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'cache_invalidation'
+
+
+class LocalCacheConfig:
+    """L1 settings, from the environment"""
+    ENABLED = os.environ.get('ENTITY_L1_ENABLED', 'false').lower() == 'true'
+    TTL = float(os.environ.get('ENTITY_L1_TTL', 30))
+    MAX_BYTES = int(os.environ.get('ENTITY_L1_MAX_BYTES', 32 * 1024 * 1024))
+    MAX_ENTRIES = int(os.environ.get('ENTITY_L1_MAX_ENTRIES', 10000))
+
+    @classmethod
+    def max_entries(cls, entity_type: str) -> int:
+        return int(os.environ.get(f'ENTITY_L1_MAX_ENTRIES_{entity_type.upper()}', cls.MAX_ENTRIES))
+
+
+class LocalCache:
+    """
+    Thread-safe LRU of entity dicts with TTL, per-type entry caps and a byte budget.
+
+    Args:
+        ttl: Seconds an entry lives at most
+        max_bytes: Budget for all entries, measured by their encoded size in Redis
+        max_entries: Callable giving the entry cap of an entity type
+    """
+
+    def __init__(self, ttl: float, max_bytes: int, max_entries=LocalCacheConfig.max_entries):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        # entity type -> OrderedDict(entity id -> (data, size, expires at, last used))
+        self._types: Dict[str, "OrderedDict[Any, Tuple[Dict, int, float, float]]"] = {}
+        self._caps: Dict[str, int] = {}
+        self._bytes = 0
+        # Bumped by invalidations (per type) and clears (epoch), so a value read from Redis
+        # before one is not stored after it
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0
+        # Set by the invalidation listener while it is subscribed
+        self.connected = False
+        self.stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0, 'bypassed': 0}
+
+    def get(self, entity_type: str, entity_id) -> Optional[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            if not self.connected:
+                self.stats['bypassed'] += 1
+                return None
+            entries = self._types.get(entity_type)
+            entry = entries.get(str(entity_id)) if entries is not None else None
+            if entry is None:
+                self.stats['misses'] += 1
+                return None
+            data, size, expires_at, _ = entry
+            if now >= expires_at:
+                self._remove(entity_type, str(entity_id))
+                self.stats['misses'] += 1
+                return None
+            entries[str(entity_id)] = (data, size, expires_at, now)
+            entries.move_to_end(str(entity_id))
+            self.stats['hits'] += 1
+            return data
+
+    def generation(self, entity_type: str) -> Tuple[int, int]:
+        """Take before reading Redis and pass to set()"""
+        with self._lock:
+            return self._epoch, self._generations.get(entity_type, 0)
+
+    def set(self, entity_type: str, entity_id, data: Dict, size: int, ttl: Optional[float] = None,
+            generation: Optional[int] = None):
+        """
+        Store an entity; size is its encoded size, ttl caps the L1 lifetime.
+        Skipped while the invalidation listener is not subscribed, or if the type was
+        invalidated since `generation` was taken.
+        """
+        if size > self.max_bytes:
+            return
+        now = time.monotonic()
+        lifetime = self.ttl if ttl is None else min(self.ttl, ttl)
+        key = str(entity_id)
+        with self._lock:
+            if not self.connected:
+                return
+            if generation is not None and generation != (self._epoch, self._generations.get(entity_type, 0)):
+                return
+            entries = self._types.get(entity_type)
+            if entries is None:
+                entries = self._types[entity_type] = OrderedDict()
+                self._caps[entity_type] = self._max_entries(entity_type)
+            if key in entries:
+                self._remove(entity_type, key)
+            entries[key] = (data, size, now + lifetime, now)
+            self._bytes += size
+            while len(entries) > self._caps[entity_type]:
+                self._evict(entity_type)
+            while self._bytes > self.max_bytes:
+                self._evict(self._least_recent_type())
+
+    def invalidate(self, entity_type: str, entity_id=None):
+        """Drop one entity, or every entity of the type if entity_id is None"""
+        with self._lock:
+            self._generations[entity_type] = self._generations.get(entity_type, 0) + 1
+            if entity_id is None:
+                for key in list(self._types.get(entity_type, ())):
+                    self._remove(entity_type, key)
+            else:
+                self._remove(entity_type, str(entity_id))
+            self.stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._types.clear()
+            self._bytes = 0
+
+    def _remove(self, entity_type: str, key: str):
+        entry = self._types.get(entity_type, {}).pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[1]
+
+    def _evict(self, entity_type: str):
+        key = next(iter(self._types[entity_type]))
+        self._remove(entity_type, key)
+        self.stats['evictions'] += 1
+
+    def _least_recent_type(self) -> str:
+        # Heads of the per-type LRUs are their least recently used entries
+        return min((entries[next(iter(entries))][3], entity_type)
+                   for entity_type, entries in self._types.items() if entries)[1]
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return dict(self.stats, bytes=self._bytes,
+                        entries={t: len(entries) for t, entries in self._types.items()})
+
+
+# Identifies this process's own invalidations, which it has already applied
+ORIGIN = uuid.uuid4().hex
+
+_cache: Optional[LocalCache] = None
+_cache_pid: Optional[int] = None
+_cache_lock = threading.Lock()
+
+
+def _listen(cache: LocalCache):
+    delay = 1
+    while True:
+        try:
+            pubsub = get_pubsub_redis_client().pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            delay = 1
+            # Entries filled before this subscription may have missed invalidations
+            cache.clear()
+            cache.connected = True
+            for message in pubsub.listen():
+                if message['type'] != 'message':
+                    continue
+                event = json.loads(message['data'])
+                if event.get('origin') != ORIGIN:
+                    cache.invalidate(event['type'], event.get('id'))
+        except Exception as e:
+            logger.error(f"L1 invalidation listener error: {e}. Bypassing L1, reconnecting in {delay}s")
+        # Changes made while disconnected are not heard
+        cache.connected = False
+        cache.clear()
+        time.sleep(delay)
+        delay = min(delay * 2, 30)
+
+
+def get_local_cache() -> Optional[LocalCache]:
+    """
+    This process's L1, None if disabled. The first call in a process (including
+    a forked one) starts its invalidation listener.
+    """
+    global _cache, _cache_pid, ORIGIN
+    if not LocalCacheConfig.ENABLED:
+        return None
+    pid = os.getpid()
+    if _cache_pid != pid:
+        with _cache_lock:
+            if _cache_pid != pid:
+                cache = LocalCache(LocalCacheConfig.TTL, LocalCacheConfig.MAX_BYTES)
+                ORIGIN = uuid.uuid4().hex
+                threading.Thread(target=_listen, args=(cache,), name='l1-invalidation', daemon=True).start()
+                _cache, _cache_pid = cache, pid
+    return _cache
+
+
+def invalidation_message(entity_type: str, entity_id=None) -> str:
+    """Payload announcing a changed entity (or, without an id, a whole entity type)"""
+    return json.dumps({'type': entity_type, 'id': entity_id, 'origin': ORIGIN})
+
+
+def local_cache_stats() -> Optional[Dict]:
+    """L1 statistics for health endpoints, None if disabled"""
+    cache = get_local_cache()
+    return cache.get_stats() if cache is not None else None
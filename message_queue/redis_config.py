@@ -35,8 +35,9 @@ class RedisConfig:
         return params
 
 
-# Redis connection pool for efficient connection reuse
+# Redis connection pools for efficient connection reuse
 _redis_pool = None
+_binary_redis_pool = None
 
 
 def get_redis_client() -> redis.Redis:
@@ -56,3 +57,22 @@ def get_redis_client() -> redis.Redis:
             socket_connect_timeout=RedisConfig.SOCKET_CONNECT_TIMEOUT
         )
     return redis.Redis(connection_pool=_redis_pool)
+
+
+def get_binary_redis_client() -> redis.Redis:
+    """
+    Get a Redis client that returns bytes (for encoded cache values).
+    Creates its pool on first call.
+    """
+    global _binary_redis_pool
+    if _binary_redis_pool is None:
+        _binary_redis_pool = redis.ConnectionPool(
+            host=RedisConfig.HOST,
+            port=RedisConfig.PORT,
+            password=RedisConfig.PASSWORD,
+            decode_responses=False,
+            max_connections=RedisConfig.MAX_CONNECTIONS,
+            socket_timeout=RedisConfig.SOCKET_TIMEOUT,
+            socket_connect_timeout=RedisConfig.SOCKET_CONNECT_TIMEOUT
+        )
+    return redis.Redis(connection_pool=_binary_redis_pool)
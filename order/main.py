@@ -13,10 +13,13 @@ from config import Config
 from db import db
 from models import CustomerTransaction
 from message_queue.event_system import EventPublisher, EventConsumerProcess
-from message_queue.cache import (warm_cache_sync, cache_entity, get_cached_entity,
+from message_queue.cache import (warm_cache_sync, cache_entity, get_or_fetch,
+                                  cache_entities, get_cached_entities,
                                   cache_list, get_cached_list)
 from message_queue.circuit_breaker import CircuitBreaker
+from message_queue.local_cache import local_cache_stats
 from message_queue.supervisor import MultiProcessSupervisor
+from message_queue import deadline
 
 logging.basicConfig(
     level=logging.INFO,
@@ -59,6 +62,7 @@ def create_app():
     flask_app = Flask(__name__)
     flask_app.config.from_object(Config)
     db.init_app(flask_app)
+    deadline.init_app(flask_app, db)
     register_routes(flask_app)
     return flask_app
 
@@ -75,7 +79,8 @@ def register_routes(app):
             'cache_warmed': cache_warmed,
             'consumer_running': consumer_running,
             'customer_breaker': customer_breaker.get_state(),
-            'product_breaker': product_breaker.get_state()
+            'product_breaker': product_breaker.get_state(),
+            'entity_l1': local_cache_stats()
         }), 200
 
     @app.route('/orders', methods=['GET'])
@@ -99,33 +104,32 @@ def register_routes(app):
             
             transactions = CustomerTransaction.query.offset(start).limit(limit).all()
             
-            # Enrich with customer and product data
+            # Enrich with customer and product data, one cache round trip per entity type
+            customers = fetch_entities_with_breaker(
+                'customer', [t.customer_id for t in transactions if t.customer_id],
+                Config.CUSTOMER_SERVICE_URL, customer_breaker
+            )
+            products = fetch_entities_with_breaker(
+                'product', [t.product_id for t in transactions if t.product_id],
+                Config.PRODUCT_SERVICE_URL, product_breaker
+            )
+            
             result = []
             for t in transactions:
                 tx_dict = t.to_dict()
-                
-                if t.customer_id:
-                    customer = fetch_entity_with_breaker(
-                        'customer', t.customer_id, 
-                        Config.CUSTOMER_SERVICE_URL, customer_breaker
-                    )
-                    if customer:
-                        tx_dict['customer'] = customer
-                
-                if t.product_id:
-                    product = fetch_entity_with_breaker(
-                        'product', t.product_id,
-                        Config.PRODUCT_SERVICE_URL, product_breaker
-                    )
-                    if product:
-                        tx_dict['product'] = product
-                
-                # Cache individual enriched record
-                cache_entity('order', t.id, tx_dict, ttl=3600)
+                if t.customer_id in customers:
+                    tx_dict['customer'] = customers[t.customer_id]
+                if t.product_id in products:
+                    tx_dict['product'] = products[t.product_id]
                 result.append(tx_dict)
             
+            # Cache individual enriched records (not if enrichment was cut short)
+            if not deadline.skipped_work():
+                cache_entities('order', {tx['id']: tx for tx in result}, ttl=3600)
+            
             # Cache the list
-            cache_list('order', cache_key, result, ttl=3600)
+            if not deadline.skipped_work():
+                cache_list('order', cache_key, result, ttl=3600)
             
             return jsonify({
                 'orders': result,
@@ -156,6 +160,9 @@ def register_routes(app):
                 Config.PRODUCT_SERVICE_URL, product_breaker
             )
             
+            if deadline.skipped_work():
+                return deadline.exceeded_response()
+            
             if not customer or not product:
                 return jsonify({'error': 'Invalid customer_id or product_id'}), 400
             
@@ -206,6 +213,24 @@ def register_routes(app):
             db.session.rollback()
             return jsonify({'error': 'Failed to create order'}), 500
 
+    @app.route('/orders/recent', methods=['GET'])
+    @app.route('/customertransactions/recent', methods=['GET'])
+    def get_recent_orders():
+        """Latest orders, newest first (denormalized rows, no enrichment)"""
+        try:
+            limit = min(request.args.get('limit', 10, type=int), 100)
+            transactions = (CustomerTransaction.query
+                            .order_by(CustomerTransaction.timestamp.desc(), CustomerTransaction.id.desc())
+                            .limit(limit).all())
+            return jsonify({
+                'orders': [t.to_dict() for t in transactions],
+                'limit': limit,
+                'count': len(transactions)
+            }), 200
+        except Exception as e:
+            logger.error(f"Error getting recent orders: {e}")
+            return jsonify({'error': 'Failed to fetch orders'}), 500
+
     @app.route('/orders/product/<int:product_id>', methods=['GET'])
     @app.route('/customertransactions/product/<int:product_id>', methods=['GET'])
     def get_orders_by_product(product_id):
@@ -268,22 +293,47 @@ def warm_cache(app):
 
 
 def fetch_entity_with_breaker(entity_type, entity_id, service_url, breaker):
-    """Fetch entity from cache or service with circuit breaker"""
-    cached = get_cached_entity(entity_type, entity_id)
-    if cached:
-        return cached
+    """Fetch entity from cache or service with circuit breaker (one refetch per entity at a time)"""
+    return get_or_fetch(
+        entity_type, entity_id,
+        lambda entity_id: fetch_from_service(entity_type, entity_id, service_url, breaker),
+        ttl=86400
+    )
+
+
+def fetch_entities_with_breaker(entity_type, entity_ids, service_url, breaker):
+    """
+    Fetch many entities by ID: one cache round trip for all of them, then the
+    service once per distinct miss. Returns the entities found, by ID.
+    """
+    entities, missing = get_cached_entities(entity_type, entity_ids)
+    fetched = {}
+    for entity_id in missing:
+        entity = fetch_from_service(entity_type, entity_id, service_url, breaker)
+        if entity:
+            fetched[entity_id] = entity
+    cache_entities(entity_type, fetched, ttl=86400)
+    entities.update(fetched)
+    return entities
+
+
+def fetch_from_service(entity_type, entity_id, service_url, breaker):
+    """Fetch entity from its service with circuit breaker, None on failure"""
+    # Not worth calling (or tripping the breaker) once the caller has given up
+    budget = deadline.timeout(5)
+    if budget is None:
+        logger.warning(f"Skipped fetching {entity_type} {entity_id}: request deadline is too close")
+        return None
     
     def fetch():
-        response = requests.get(f"{service_url}/{entity_type}s/{entity_id}", timeout=5)
+        response = requests.get(f"{service_url}/{entity_type}s/{entity_id}", timeout=budget,
+                                headers=deadline.outbound_headers())
         if response.status_code == 200:
             return response.json()
         return None
     
     try:
-        entity = breaker.call(fetch)
-        if entity:
-            cache_entity(entity_type, entity_id, entity, ttl=86400)
-        return entity
+        return breaker.call(fetch)
     except Exception as e:
         logger.error(f"Failed to fetch {entity_type} {entity_id}: {e}")
         return None
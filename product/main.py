@@ -12,9 +12,12 @@ from db import db
 from models import Product
 from message_queue.event_system import EventPublisher, EventConsumerProcess
 from message_queue.cache import (warm_cache_sync, cache_entity, delete_cache, 
-                                  invalidate_list_cache, get_cached_entity)
+                                  invalidate_list_cache, get_or_fetch,
+                                  cache_entities, get_cached_entities)
 from message_queue.circuit_breaker import CircuitBreaker
+from message_queue.local_cache import local_cache_stats
 from message_queue.supervisor import MultiProcessSupervisor
+from message_queue import deadline
 
 logging.basicConfig(
     level=logging.INFO,
@@ -66,6 +69,7 @@ def create_app():
     flask_app = Flask(__name__)
     flask_app.config.from_object(Config)
     db.init_app(flask_app)
+    deadline.init_app(flask_app, db)
     register_routes(flask_app)
     return flask_app
 
@@ -81,7 +85,8 @@ def register_routes(app):
             'service': Config.SERVICE_NAME,
             'cache_warmed': cache_warmed,
             'consumer_running': consumer_running,
-            'supplier_breaker': supplier_breaker.get_state()
+            'supplier_breaker': supplier_breaker.get_state(),
+            'entity_l1': local_cache_stats()
         }), 200
 
     @app.route('/products', methods=['GET'])
@@ -91,14 +96,13 @@ def register_routes(app):
             limit = request.args.get('limit', 50, type=int)
             products = Product.query.offset(start).limit(limit).all()
             
-            # Enrich with supplier data
+            # Enrich with supplier data, one cache round trip for the page
+            suppliers = fetch_suppliers_with_breaker([p.supplier_id for p in products if p.supplier_id])
             result = []
             for p in products:
                 product_dict = p.to_dict()
-                if p.supplier_id:
-                    supplier = fetch_supplier_with_breaker(p.supplier_id)
-                    if supplier:
-                        product_dict['supplier'] = supplier
+                if p.supplier_id in suppliers:
+                    product_dict['supplier'] = suppliers[p.supplier_id]
                 result.append(product_dict)
             
             return jsonify({
@@ -111,6 +115,25 @@ def register_routes(app):
             logger.error(f"Error getting products: {e}")
             return jsonify({'error': 'Failed to fetch products'}), 500
 
+    @app.route('/products/stats', methods=['GET'])
+    def get_product_stats():
+        """Catalog counts: total products and products per category"""
+        try:
+            rows = (db.session.query(Product.category, db.func.count(Product.id))
+                    .group_by(Product.category).all())
+            # NULL and '' are separate groups that both count as uncategorized
+            categories = {}
+            for category, count in rows:
+                key = category or 'uncategorized'
+                categories[key] = categories.get(key, 0) + count
+            return jsonify({
+                'count': sum(categories.values()),
+                'categories': categories
+            }), 200
+        except Exception as e:
+            logger.error(f"Error getting product stats: {e}")
+            return jsonify({'error': 'Failed to fetch product stats'}), 500
+
     @app.route('/products/<int:product_id>', methods=['GET'])
     def get_product(product_id):
         try:
@@ -252,27 +275,46 @@ def warm_cache(app):
 
 
 def fetch_supplier_with_breaker(supplier_id):
-    """Fetch supplier from cache or service with circuit breaker"""
-    # Try cache first
-    cached = get_cached_entity('supplier', supplier_id)
-    if cached:
-        return cached
+    """Fetch supplier from cache or service with circuit breaker (one refetch per supplier at a time)"""
+    return get_or_fetch('supplier', supplier_id, fetch_supplier_from_service, ttl=86400)
+
+
+def fetch_suppliers_with_breaker(supplier_ids):
+    """
+    Fetch many suppliers by ID: one cache round trip for all of them, then the
+    supplier service once per distinct miss. Returns the suppliers found, by ID.
+    """
+    suppliers, missing = get_cached_entities('supplier', supplier_ids)
+    fetched = {}
+    for supplier_id in missing:
+        supplier = fetch_supplier_from_service(supplier_id)
+        if supplier:
+            fetched[supplier_id] = supplier
+    cache_entities('supplier', fetched, ttl=86400)
+    suppliers.update(fetched)
+    return suppliers
+
+
+def fetch_supplier_from_service(supplier_id):
+    """Fetch supplier from the supplier service with circuit breaker, None on failure"""
+    # Not worth calling (or tripping the breaker) once the caller has given up
+    budget = deadline.timeout(5)
+    if budget is None:
+        logger.warning(f"Skipped fetching supplier {supplier_id}: request deadline is too close")
+        return None
     
-    # Fetch from supplier service with circuit breaker
     def fetch_supplier():
         response = requests.get(
             f"{Config.SUPPLIER_SERVICE_URL}/suppliers/{supplier_id}",
-            timeout=5
+            timeout=budget,
+            headers=deadline.outbound_headers()
         )
         if response.status_code == 200:
             return response.json()
         return None
     
     try:
-        supplier = supplier_breaker.call(fetch_supplier)
-        if supplier:
-            cache_entity('supplier', supplier_id, supplier, ttl=86400)
-        return supplier
+        return supplier_breaker.call(fetch_supplier)
     except Exception as e:
         logger.error(f"Failed to fetch supplier {supplier_id}: {e}")
         return None
@@ -13,6 +13,7 @@ from models import Supplier
 from message_queue.event_system import EventPublisher, EventConsumerProcess
 from message_queue.cache import warm_cache_sync, cache_entity, delete_cache, invalidate_list_cache
 from message_queue.supervisor import MultiProcessSupervisor
+from message_queue import deadline
 
 # Configure logging
 logging.basicConfig(
@@ -51,6 +52,7 @@ def create_app():
     
     # Initialize database
     db.init_app(flask_app)
+    deadline.init_app(flask_app, db)
     
     # Register routes
     register_routes(flask_app)